@@ -0,0 +1,7 @@
+# Charge l'application Celery au démarrage de Django (pour que @shared_task s'y rattache)
+try:
+    from .celery import app as celery_app
+except ImportError:  # Celery non installé : les tâches s'exécutent en direct (voir inscriptions.tasks)
+    celery_app = None
+
+__all__ = ("celery_app",)
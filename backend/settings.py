@@ -1,7 +1,9 @@
 from pathlib import Path
 import venv
 import os
+import sys
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 print("SENDGRID KEY FROM ENV:", os.getenv("SENDGRID_API_KEY"))
 
@@ -46,13 +48,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        # Loaders explicites : gabarits compilés une fois par processus (voir inscriptions/templating.py)
+        'APP_DIRS': False,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -106,6 +115,8 @@ REST_FRAMEWORK = {
 
 EMAIL_BACKEND = "sendgrid_backend.SendgridBackend"
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+# Point d'entrée de l'API v3 utilisé par l'envoi en masse (connexion keep-alive, voir inscriptions.tasks.BulkMailer)
+SENDGRID_API_URL = os.getenv("SENDGRID_API_URL", "https://api.sendgrid.com")
 DEFAULT_FROM_EMAIL = "inscription@ecofest.app"
 REPLY_TO_EMAIL = "inscription@ecofest.app"
 
@@ -145,3 +156,76 @@ DATABASES = {
         ssl_require=False
     )
 }
+
+# Badges : nombre de gabarits (fonds + polices) gardés en mémoire par worker
+BADGE_TEMPLATE_CACHE_SIZE = int(os.environ.get("BADGE_TEMPLATE_CACHE_SIZE", 16))
+# Largeur (px) des aperçus de badge servis au back-office, et paliers autorisés
+# (une largeur demandée est arrondie au palier supérieur)
+BADGE_PREVIEW_WIDTH = 360
+BADGE_PREVIEW_WIDTHS = (240, 360, 480, 720)
+# Gabarits réduits des aperçus, en cache séparé des gabarits d'impression
+BADGE_PREVIEW_CACHE_SIZE = int(os.environ.get("BADGE_PREVIEW_CACHE_SIZE", 20))
+
+# Lettres d'invitation : nombre de workers WeasyPrint gardés chauds (0 = rendu dans le processus web)
+LETTER_PDF_WORKERS = int(os.environ.get("LETTER_PDF_WORKERS", 0))
+LETTER_PDF_TIMEOUT = int(os.environ.get("LETTER_PDF_TIMEOUT", 30))
+# Moteur de la lettre par défaut : "weasyprint" (gabarit HTML) ou "pydyf" (dessin direct, sans WeasyPrint)
+LETTER_PDF_BACKEND = os.environ.get("LETTER_PDF_BACKEND", "weasyprint")
+
+# Celery : broker obligatoire (voir render.yaml : redis + worker + beat). Le mode eager (tâches
+# exécutées dans la requête) n'est actif que pour les tests ou sur demande explicite
+# (CELERY_TASK_ALWAYS_EAGER=1, développement local sans broker)
+TESTING = sys.argv[1:2] == ["test"]
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "")
+CELERY_TASK_ALWAYS_EAGER = os.environ.get("CELERY_TASK_ALWAYS_EAGER", "1" if TESTING else "0") == "1"
+if not CELERY_BROKER_URL and not CELERY_TASK_ALWAYS_EAGER:
+    raise ImproperlyConfigured(
+        "CELERY_BROKER_URL n'est pas défini : les tâches (package d'accréditation, emails) ne "
+        "seraient jamais exécutées. Configurer un broker, ou CELERY_TASK_ALWAYS_EAGER=1 pour "
+        "les exécuter dans la requête (développement uniquement)."
+    )
+CELERY_TASK_EAGER_PROPAGATES = False
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Validation en masse : inscriptions max par requête, processus de rendu des badges (défaut : nb de CPU),
+# lettres rendues par passe de mise en page
+BULK_ACTION_MAX_ITEMS = int(os.environ.get("BULK_ACTION_MAX_ITEMS", 2000))
+ACCREDITATION_BATCH_WORKERS = int(os.environ.get("ACCREDITATION_BATCH_WORKERS", 0)) or None
+ACCREDITATION_BATCH_LETTER_CHUNK = 50
+
+# Outbox des emails : débit max (envois/s par dispatcher), essais avant dead-letter, backoff (s)
+EMAIL_OUTBOX_RATE = float(os.environ.get("EMAIL_OUTBOX_RATE", 5))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 6))
+EMAIL_OUTBOX_BACKOFF_BASE = 30
+EMAIL_OUTBOX_BACKOFF_MAX = 3600
+EMAIL_OUTBOX_BATCH_SIZE = 50
+# Ligne restée "sending" plus longtemps (dispatcher mort) : reprise par un autre dispatcher
+EMAIL_OUTBOX_LOCK_TIMEOUT = 600
+
+# Pièces jointes communes à tous les emails d'accréditation (ex. programme PDF), chemins séparés par ","
+INVITATION_SHARED_ATTACHMENTS = [p for p in os.environ.get("INVITATION_SHARED_ATTACHMENTS", "").split(",") if p]
+
+# Langue des gabarits de base (emails, lettre) ; variantes : emails/x.en.html, ...
+TEMPLATE_DEFAULT_LANGUAGE = "FR"
+
+# Annonces : destinataires par appel SendGrid (personalizations, 1000 max)
+BROADCAST_BATCH_SIZE = 1000
+
+# Notifications admin : au-delà de ADMIN_DIGEST_THRESHOLD inscriptions par fenêtre, un digest
+# par fenêtre remplace l'email par inscription (0 = toujours en digest)
+ADMIN_DIGEST_THRESHOLD = int(os.environ.get("ADMIN_DIGEST_THRESHOLD", 20))
+ADMIN_DIGEST_WINDOW_MINUTES = int(os.environ.get("ADMIN_DIGEST_WINDOW_MINUTES", 10))
+# Préfixe des liens vers l'admin dans ces emails (vide = chemins relatifs)
+ADMIN_SITE_URL = os.environ.get("ADMIN_SITE_URL", "")
+
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-email-outbox": {
+        "task": "inscriptions.tasks.dispatch_outbox_task",
+        "schedule": 30.0,
+    },
+    "send-admin-digest": {
+        "task": "inscriptions.tasks.send_admin_digest_task",
+        "schedule": ADMIN_DIGEST_WINDOW_MINUTES * 60.0,
+    },
+}
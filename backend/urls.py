@@ -10,6 +10,7 @@ from inscriptions.views import (
     get_badge_url,
     get_pieces_urls,
     download_badges_zip,
+    download_badge_sheets,
     AdminInscriptionListView,
 )
 
@@ -37,6 +38,7 @@ urlpatterns = [
     # Liste admin (tableau back-office)
     path("api/admin/inscriptions/", AdminInscriptionListView.as_view(), name="admin-inscriptions"),
     path("api/admin/badges/download/", download_badges_zip, name="download-badges"),
+    path("api/admin/badges/sheets/", download_badge_sheets, name="download-badge-sheets"),
 ]
 
 if settings.DEBUG:
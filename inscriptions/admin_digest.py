@@ -0,0 +1,119 @@
+"""
+Notifications admin des nouvelles inscriptions publiques.
+
+Tant que le trafic est faible, chaque inscription donne un email immédiat à
+DEFAULT_FROM_EMAIL (comme avant). Dès que ADMIN_DIGEST_THRESHOLD inscriptions
+ou plus arrivent dans la fenêtre glissante de ADMIN_DIGEST_WINDOW_MINUTES, les
+suivantes ne sont plus notifiées une par une : elles restent en attente
+(admin_notified_at NULL) et un digest unique, envoyé à chaque fenêtre par Celery
+beat ou la commande send_admin_digest, les résume (nombre par profil + liens).
+
+ADMIN_DIGEST_THRESHOLD = 0 : digest uniquement, jamais d'email immédiat.
+Les inscriptions saisies au back-office (InscriptionSerializer) sont créées avec
+admin_notified_at renseigné : elles n'entrent jamais dans le digest.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Inscription
+from .outbox import queue_email
+
+logger = logging.getLogger(__name__)
+
+# Liens listés dans un digest ; au-delà, renvoi vers la liste du back-office
+ADMIN_DIGEST_MAX_LINKS = 100
+
+
+def _admin_url(path):
+    return getattr(settings, "ADMIN_SITE_URL", "").rstrip("/") + path
+
+
+def admin_link(inscription_id):
+    return _admin_url(f"/admin/inscriptions/inscription/{inscription_id}/change/")
+
+
+def digest_window():
+    return timedelta(minutes=getattr(settings, "ADMIN_DIGEST_WINDOW_MINUTES", 10))
+
+
+def digest_mode_active(now=None):
+    """Vrai si le volume de la fenêtre en cours atteint le seuil (notifications groupées)."""
+    threshold = getattr(settings, "ADMIN_DIGEST_THRESHOLD", 20)
+    if threshold <= 0:
+        return True
+    now = now or timezone.now()
+    recent = Inscription.objects.filter(created_at__gte=now - digest_window()).count()
+    return recent >= threshold
+
+
+def notify_new_inscription(inscription):
+    """
+    À appeler dans la transaction qui crée l'inscription. Mode immédiat : met
+    l'email admin dans l'outbox et retourne la ligne ; mode digest : ne fait
+    rien (l'inscription attend le prochain digest) et retourne None.
+    """
+    now = timezone.now()
+    if digest_mode_active(now):
+        return None
+    Inscription.objects.filter(pk=inscription.pk).update(admin_notified_at=now)
+    return queue_email(
+        "raw", settings.DEFAULT_FROM_EMAIL, inscription=inscription,
+        subject=f"[ECOFEST] Nouvelle inscription : {inscription.nom} {inscription.prenom}",
+        body_text=f"Voir l'admin : {admin_link(inscription.id)}",
+    )
+
+
+def build_digest(rows, since, now):
+    """Sujet et corps texte du digest pour des lignes (dict issus de values())."""
+    counts = Counter(row["type_profil"] for row in rows)
+    since = timezone.localtime(since)
+    lines = [
+        f"{len(rows)} nouvelle(s) inscription(s) depuis le {since:%d/%m/%Y à %H:%M}.",
+        "",
+        "Par profil :",
+    ]
+    lines += [f"  - {profil} : {n}" for profil, n in counts.most_common()]
+    lines += ["", "Inscriptions :"]
+    lines += [
+        f"  - {row['nom']} {row['prenom']} ({row['type_profil']}) : {admin_link(row['id'])}"
+        for row in rows[:ADMIN_DIGEST_MAX_LINKS]
+    ]
+    if len(rows) > ADMIN_DIGEST_MAX_LINKS:
+        lines.append(
+            f"  ... et {len(rows) - ADMIN_DIGEST_MAX_LINKS} autre(s) : "
+            f"{_admin_url('/admin/inscriptions/inscription/?statut__exact=En_attente')}"
+        )
+    subject = f"[ECOFEST] {len(rows)} nouvelle(s) inscription(s)"
+    return subject, "\n".join(lines)
+
+
+def send_admin_digest():
+    """
+    Regroupe les inscriptions pas encore notifiées dans un seul email (outbox).
+    Les lignes sont réservées avec SKIP LOCKED : deux exécutions simultanées ne
+    se partagent pas les mêmes inscriptions. Retourne (email ou None, nombre).
+    """
+    from .tasks import deliver_outbox_emails, enqueue
+
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Inscription.objects.select_for_update(skip_locked=True)
+            .filter(admin_notified_at__isnull=True, created_at__lte=now)
+            .order_by("created_at", "id")
+            .values("id", "nom", "prenom", "type_profil", "created_at")
+        )
+        if not rows:
+            return None, 0
+        subject, body = build_digest(rows, rows[0]["created_at"], now)
+        Inscription.objects.filter(pk__in=[row["id"] for row in rows]).update(admin_notified_at=now)
+        email = queue_email("raw", settings.DEFAULT_FROM_EMAIL, subject=subject, body_text=body)
+        transaction.on_commit(lambda: enqueue(deliver_outbox_emails, [email.pk]))
+
+    logger.info("Admin digest queued for %s inscriptions (email %s)", len(rows), email.pk)
+    return email, len(rows)
@@ -0,0 +1,182 @@
+"""
+Pièces jointes des emails, sans copies inutiles.
+
+EmailAttachment remplace le tuple (filename, bytes, mime_type) et se déballe
+de la même façon (for name, content, mime in attachments) :
+
+  - le fichier n'est lu qu'au moment de l'envoi (contenu paresseux) ;
+  - l'encodage base64 (SendGrid) est calculé une seule fois, en octets ASCII,
+    et inséré tel quel dans le corps JSON (voir sendgrid_body) ;
+  - une pièce jointe propre au destinataire (badge, lettre) ne garde pas ses
+    octets bruts une fois encodée : seules les pièces jointes partagées les
+    conservent.
+
+Les pièces jointes communes à tous les emails (programme PDF, ...) sont
+partagées dans tout le processus : shared_attachment() les lit une fois et les
+indexe par empreinte SHA-256 du contenu, un même fichier (ou deux copies
+identiques) n'existe donc qu'une fois en mémoire, encodage compris.
+"""
+import base64
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import secrets
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class EmailAttachment:
+    """Pièce jointe lue à la demande : path (fichier) ou content (octets déjà en mémoire)."""
+
+    __slots__ = ("filename", "mime_type", "path", "shared", "_content", "_b64", "_digest")
+
+    def __init__(self, filename, mime_type, path=None, content=None, shared=False):
+        if path is None and content is None:
+            raise ValueError("EmailAttachment : path ou content est requis")
+        self.filename = filename
+        self.mime_type = mime_type
+        self.path = path
+        self.shared = shared
+        self._content = bytes(content) if content is not None else None
+        self._b64 = None
+        self._digest = None
+
+    def __repr__(self):
+        return f"<EmailAttachment {self.filename} ({self.mime_type})>"
+
+    def __iter__(self):
+        # compatibilité avec l'ancien tuple (filename, bytes, mime_type)
+        return iter((self.filename, self.content, self.mime_type))
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    @property
+    def content(self):
+        """Octets bruts. Relus depuis le fichier si non conservés (pièce jointe non partagée)."""
+        if self._content is not None:
+            return self._content
+        content = self._read()
+        if self.shared:
+            self._content = content
+        return content
+
+    @property
+    def b64(self):
+        """Contenu encodé en base64 (octets ASCII), calculé une seule fois."""
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.content)
+            if not self.shared and self.path is not None:
+                # encodé : les octets bruts ne sont plus utiles pour SendGrid
+                self._content = None
+        return self._b64
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.content).hexdigest()
+        return self._digest
+
+
+def as_attachment(item):
+    """EmailAttachment à partir d'un EmailAttachment ou d'un ancien tuple (filename, bytes, mime_type)."""
+    if isinstance(item, EmailAttachment):
+        return item
+    filename, content, mime_type = item
+    return EmailAttachment(filename, mime_type, content=content)
+
+
+def file_attachment(source, filename, mime_type):
+    """Pièce jointe propre à un email : chemin (lu à l'envoi) ou octets déjà rendus ; None si illisible."""
+    if isinstance(source, (bytes, bytearray)):
+        return EmailAttachment(filename, mime_type, content=source)
+    if not os.path.isfile(source):
+        logger.error("Attachment file %s not found", source)
+        return None
+    return EmailAttachment(filename, mime_type, path=source)
+
+
+# ---------------------------------------------------------
+# Pièces jointes partagées (cache du processus, par empreinte)
+# ---------------------------------------------------------
+_shared_by_digest = {}
+_shared_by_file = {}
+_shared_lock = threading.Lock()
+
+
+def shared_attachment(path, filename=None, mime_type=None):
+    """
+    Pièce jointe commune à tous les emails, lue une fois par processus (relue si
+    le fichier change). Deux fichiers au contenu identique partagent la même
+    instance (et donc le même encodage base64). None si le fichier est illisible.
+    """
+    filename = filename or os.path.basename(path)
+    mime_type = mime_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    try:
+        stat = os.stat(path)
+    except OSError:
+        logger.exception("Shared attachment %s not readable", path)
+        return None
+    file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, filename, mime_type)
+
+    with _shared_lock:
+        attachment = _shared_by_file.get(file_key)
+        if attachment is not None:
+            return attachment
+        attachment = EmailAttachment(filename, mime_type, path=path, shared=True)
+        attachment = _shared_by_digest.setdefault((attachment.digest, filename, mime_type), attachment)
+        # une seule entrée par chemin : l'ancienne version d'un fichier modifié est oubliée
+        for key in [k for k in _shared_by_file if k[0] == file_key[0]]:
+            del _shared_by_file[key]
+        _shared_by_file[file_key] = attachment
+        return attachment
+
+
+def shared_attachments_info():
+    """Pièces jointes partagées en mémoire (taille brute et encodée), pour le diagnostic."""
+    with _shared_lock:
+        return [
+            {"filename": a.filename, "digest": digest, "bytes": len(a.content), "b64_bytes": len(a.b64)}
+            for (digest, _, _), a in _shared_by_digest.items()
+        ]
+
+
+def clear_shared_attachments():
+    with _shared_lock:
+        _shared_by_digest.clear()
+        _shared_by_file.clear()
+
+
+# ---------------------------------------------------------
+# Corps JSON SendGrid sans recopier les pièces jointes
+# ---------------------------------------------------------
+def sendgrid_body(payload):
+    """
+    Sérialise un payload /v3/mail/send dont les "content" de pièces jointes sont
+    des EmailAttachment. Retourne (liste de morceaux d'octets, longueur totale) :
+    les octets base64 de chaque pièce jointe sont insérés tels quels entre les
+    morceaux JSON (le base64 n'a rien à échapper), sans passer par json.dumps.
+    """
+    attachments = payload.get("attachments") or []
+    if not attachments:
+        body = json.dumps(payload).encode("utf-8")
+        return [body], len(body)
+
+    token = secrets.token_hex(8)
+    encoded = []
+    placeholders = []
+    for index, item in enumerate(attachments):
+        encoded.append(item["content"].b64)
+        placeholders.append(dict(item, content=f"@@{token}-{index}@@"))
+    text = json.dumps(dict(payload, attachments=placeholders))
+
+    chunks = []
+    for index, b64 in enumerate(encoded):
+        before, text = text.split(f"@@{token}-{index}@@", 1)
+        chunks += [before.encode("utf-8"), b64]
+    chunks.append(text.encode("utf-8"))
+    return chunks, sum(len(chunk) for chunk in chunks)
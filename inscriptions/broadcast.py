@@ -0,0 +1,192 @@
+"""
+Annonces (broadcasts) envoyées à toutes les inscriptions d'une sélection.
+
+Le sujet et le corps sont rendus UNE seule fois, avec des balises de substitution
+(-prenom-, -nom-, ...) à la place des champs du destinataire. Les destinataires
+sont lus par lots d'id croissants (values(), jamais l'objet complet) et envoyés :
+
+  - via SendGrid : un seul appel /v3/mail/send par lot, une "personalization"
+    par destinataire avec ses substitutions (jusqu'à 1000 par appel) ;
+  - sinon, ou si l'appel du lot échoue : message par message avec les
+    substitutions appliquées localement, sur la connexion Django du lot.
+
+Après chaque lot, last_inscription_id et les compteurs sont enregistrés : une
+campagne interrompue reprend au lot suivant (le lot en cours au moment de
+l'interruption peut être renvoyé une seconde fois).
+"""
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.template import Context, Template
+from django.utils import timezone
+from django.utils.html import escape
+
+from .filters import filter_inscriptions
+from .models import Broadcast, Inscription
+from .templating import render
+
+logger = logging.getLogger(__name__)
+
+# Champs du destinataire utilisables dans le message ({{ prenom }}, ...)
+BROADCAST_FIELDS = ("prenom", "nom", "email", "type_profil", "nationalite", "provenance")
+# Limite SendGrid : personalizations par appel à /v3/mail/send
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+BROADCAST_TEXT_TEMPLATE = "emails/broadcast.txt"
+
+
+def _tag(field, html=False):
+    # Deux balises par champ : la valeur est échappée pour la partie HTML seulement
+    return f"-{field}.html-" if html else f"-{field}-"
+
+
+def broadcast_recipients(broadcast):
+    return filter_inscriptions(Inscription.objects.all(), broadcast.filters or {})
+
+
+def render_broadcast(broadcast):
+    """Sujet, texte et HTML de l'annonce, avec balises de substitution."""
+    text_context = Context({f: _tag(f) for f in BROADCAST_FIELDS}, autoescape=False)
+    html_context = Context({f: _tag(f, html=True) for f in BROADCAST_FIELDS})
+    message = Template(broadcast.message)
+    subject = Template(broadcast.subject).render(text_context)
+    site_url = getattr(settings, "SITE_URL", "https://ecofest.app")
+    return {
+        "subject": subject,
+        "text": render(BROADCAST_TEXT_TEMPLATE, {
+            "message": message.render(text_context), "site_url": site_url,
+        }),
+        "html": render(broadcast.template_name, {
+            "message": message.render(html_context), "subject": subject, "site_url": site_url,
+        }),
+    }
+
+
+def substitutions(recipient):
+    """Balise -> valeur pour un destinataire (dict issu de values())."""
+    subs = {}
+    for field in BROADCAST_FIELDS:
+        value = recipient.get(field)
+        value = "" if value is None else str(value)
+        subs[_tag(field)] = value
+        subs[_tag(field, html=True)] = escape(value)
+    return subs
+
+
+_TAG_RE = re.compile(r"-[a-z_]+(?:\.html)?-")
+
+
+def apply_substitutions(text, subs):
+    """Remplacement local des balises (repli sans SendGrid), en une passe."""
+    return _TAG_RE.sub(lambda m: subs.get(m.group(0), m.group(0)), text)
+
+
+def _sendgrid_batch_payload(rendered, recipients):
+    from .tasks import sendgrid_payload
+
+    payload = sendgrid_payload({
+        "to": "", "subject": rendered["subject"], "text": rendered["text"],
+        "html": rendered["html"], "reply_to": getattr(settings, "DEFAULT_FROM_EMAIL", None),
+    })
+    payload["personalizations"] = [
+        {"to": [{"email": r["email"]}], "substitutions": substitutions(r)}
+        for r in recipients
+    ]
+    return payload
+
+
+def _send_batch(rendered, recipients, mailer):
+    """Retourne (envoyés, échecs, dernière erreur) pour un lot de destinataires."""
+    from .tasks import SendGridResponseError
+
+    error = None
+    if mailer.sendgrid is not None:
+        try:
+            status_code, data = mailer.sendgrid.post("/v3/mail/send", _sendgrid_batch_payload(rendered, recipients))
+            if 200 <= status_code < 300:
+                return len(recipients), 0, None
+            error = f"SendGrid HTTP {status_code}: {data[:300].decode('utf-8', 'replace')}"
+        except SendGridResponseError as exc:
+            # lot peut-être déjà accepté par SendGrid : pas de repli message par message (doublons)
+            logger.error("Broadcast batch of %s: no SendGrid response, not resent: %s", len(recipients), exc)
+            return 0, len(recipients), f"SendGrid: {exc}"
+        except Exception as exc:
+            error = f"SendGrid: {exc}"
+        logger.warning("Broadcast batch via SendGrid failed (%s), falling back per message", error)
+
+    sent = failed = 0
+    for recipient in recipients:
+        subs = substitutions(recipient)
+        result = mailer.send({
+            "to": recipient["email"],
+            "subject": apply_substitutions(rendered["subject"], subs),
+            "text": apply_substitutions(rendered["text"], subs),
+            "html": apply_substitutions(rendered["html"], subs),
+            "attachments": [],
+            "reply_to": getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        }, providers=("django",))
+        if result["ok"]:
+            sent += 1
+        else:
+            failed += 1
+            error = result["error"]
+    return sent, failed, error
+
+
+def run_broadcast(broadcast, queryset=None, batch_size=None, progress=None):
+    """
+    Envoie (ou reprend) une annonce. queryset : destinataires (défaut : broadcast.filters).
+    Reprend après last_inscription_id ; s'arrête proprement si le statut passe à "paused".
+    Retourne l'annonce à jour.
+    """
+    from .tasks import BulkMailer
+
+    queryset = broadcast_recipients(broadcast) if queryset is None else queryset
+    batch_size = min(batch_size or getattr(settings, "BROADCAST_BATCH_SIZE", SENDGRID_MAX_PERSONALIZATIONS),
+                     SENDGRID_MAX_PERSONALIZATIONS)
+    rendered = render_broadcast(broadcast)
+
+    updates = {"status": "running"}
+    if broadcast.started_at is None:
+        updates["started_at"] = timezone.now()
+    if not broadcast.total:
+        updates["total"] = queryset.count()
+    Broadcast.objects.filter(pk=broadcast.pk).update(**updates)
+    broadcast.refresh_from_db()
+
+    start = time.perf_counter()
+    try:
+        with BulkMailer() as mailer:
+            while True:
+                recipients = list(
+                    queryset.filter(id__gt=broadcast.last_inscription_id).order_by("id").values("id", *BROADCAST_FIELDS)[:batch_size]
+                )
+                if not recipients:
+                    break
+                sent, failed, error = _send_batch(rendered, recipients, mailer)
+                # Point de reprise : enregistré après chaque lot
+                checkpoint = {
+                    "last_inscription_id": recipients[-1]["id"],
+                    "sent_count": F("sent_count") + sent,
+                    "failed_count": F("failed_count") + failed,
+                }
+                if error:
+                    checkpoint["last_error"] = error
+                Broadcast.objects.filter(pk=broadcast.pk).update(**checkpoint)
+                broadcast.refresh_from_db()
+                if progress is not None:
+                    progress(broadcast, time.perf_counter() - start)
+                if broadcast.status == "paused":
+                    logger.info("Broadcast %s paused at inscription %s", broadcast.pk, broadcast.last_inscription_id)
+                    return broadcast
+    except Exception as exc:
+        logger.exception("Broadcast %s interrupted: %s", broadcast.pk, exc)
+        Broadcast.objects.filter(pk=broadcast.pk).update(status="failed", last_error=str(exc)[:1000])
+        raise
+
+    Broadcast.objects.filter(pk=broadcast.pk).update(status="done", finished_at=timezone.now())
+    broadcast.refresh_from_db()
+    logger.info("Broadcast %s done: %s sent, %s failed", broadcast.pk, broadcast.sent_count, broadcast.failed_count)
+    return broadcast
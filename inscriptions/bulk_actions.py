@@ -0,0 +1,251 @@
+"""
+Validation / refus en masse depuis le back-office.
+
+Dans la requête (apply_bulk_action) :
+  - un seul UPDATE du statut pour toutes les inscriptions sélectionnées (celles
+    qui ont déjà ce statut sont laissées de côté) ;
+  - validation : un AccreditationBatch, puis un AccreditationJob et une ligne
+    d'outbox par inscription (bulk_create), dans la même transaction ; un seul
+    job Celery pour tout le lot, mis en file après commit.
+
+Dans le worker (run_accreditation_batch) :
+  - badges rendus sur un pool de processus (utils_badges.render_badges_bulk)
+    pendant que les lettres sont rendues par lots dans un thread
+    (utils_letters.generate_invitation_letters_pdf : une mise en page par lot) ;
+  - puis les emails du lot partent par le dispatcher de l'outbox, sur des
+    connexions réutilisées (tasks.BulkMailer), au débit EMAIL_OUTBOX_RATE ;
+  - chaque étape est enregistrée au fil de l'eau sur l'AccreditationJob de
+    l'inscription : c'est l'avancement par inscription du lot.
+
+Les lignes d'outbox du lot sont créées avec une date d'envoi différée : si le job
+ne tourne jamais (broker indisponible), le dispatcher périodique les envoie
+quand même, badge et lettre étant alors rendus à la demande.
+"""
+import logging
+import multiprocessing
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .filters import filter_inscriptions
+from .models import AccreditationBatch, AccreditationJob, Inscription, OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+BULK_STATUTS = {"validate": "Validé", "refuse": "Refusé"}
+STAGE_FIELDS = ("state", "badge_state", "letter_state", "email_state")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------------------------------------
+# Requête : sélection, UPDATE, création du lot
+# ---------------------------------------------------------
+def select_inscriptions(ids=None, filters=None):
+    """Inscriptions visées : liste d'ids et/ou filtres du back-office (voir filters.py)."""
+    queryset = Inscription.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if filters:
+        queryset = filter_inscriptions(queryset, filters)
+    return queryset
+
+
+def apply_bulk_action(action, queryset, user=None):
+    """
+    Applique l'action ("validate" ou "refuse") aux inscriptions du queryset.
+    Retourne (lot ou None, nombre d'inscriptions modifiées, nombre laissées telles quelles).
+    """
+    statut = BULK_STATUTS[action]
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            queryset.exclude(statut=statut).select_for_update().order_by("id").values_list("id", flat=True)
+        )
+        unchanged = queryset.filter(statut=statut).count()
+        if ids:
+            Inscription.objects.filter(pk__in=ids).update(statut=statut, updated_at=now)
+        if action != "validate" or not ids:
+            logger.info("Bulk %s: %s inscriptions updated", action, len(ids))
+            return None, len(ids), unchanged
+
+        batch = AccreditationBatch.objects.create(
+            action=action, total=len(ids), created_by=user if getattr(user, "is_authenticated", False) else None,
+        )
+        jobs = AccreditationJob.objects.bulk_create(
+            [AccreditationJob(inscription_id=pk, batch=batch, kind="invitation_package") for pk in ids],
+            batch_size=500,
+        )
+        emails = dict(Inscription.objects.filter(pk__in=ids).values_list("id", "email"))
+        hold_until = now + timedelta(seconds=_setting("EMAIL_OUTBOX_LOCK_TIMEOUT", 600))
+        OutboundEmail.objects.bulk_create(
+            [
+                OutboundEmail(kind="invitation_package", to_email=emails[job.inscription_id],
+                              inscription_id=job.inscription_id, job=job, next_attempt_at=hold_until)
+                for job in jobs
+            ],
+            batch_size=500,
+        )
+        transaction.on_commit(lambda: _enqueue_batch(batch))
+
+    logger.info("Bulk validation: %s inscriptions, batch %s queued", len(ids), batch.pk)
+    return batch, len(ids), unchanged
+
+
+def _enqueue_batch(batch):
+    from .tasks import enqueue, send_invitation_packages_batch
+
+    task_id = enqueue(send_invitation_packages_batch, str(batch.pk))
+    if task_id is None:
+        AccreditationBatch.objects.filter(pk=batch.pk).update(
+            state="failed", error="enqueue failed: emails left to the outbox dispatcher", finished_at=timezone.now(),
+        )
+    else:
+        # filtre sur task_id vide : en mode eager le lot peut déjà être terminé
+        AccreditationBatch.objects.filter(pk=batch.pk, task_id__isnull=True).update(task_id=task_id)
+
+
+def batch_progress(batch):
+    """Compteurs par étape et par état, et l'état de chaque inscription du lot."""
+    jobs = AccreditationJob.objects.filter(batch=batch)
+    progress = {}
+    for field in STAGE_FIELDS:
+        counts = dict(jobs.values_list(field).annotate(n=Count("id")).values_list(field, "n"))
+        progress[field.replace("_state", "") if field != "state" else "jobs"] = counts
+    items = list(
+        jobs.order_by("inscription_id").values("inscription_id", "id", *STAGE_FIELDS, "error", "finished_at")
+    )
+    for item in items:
+        item["job_id"] = str(item.pop("id"))
+    return {"progress": progress, "items": items}
+
+
+# ---------------------------------------------------------
+# Worker : badges ‖ lettres, puis emails
+# ---------------------------------------------------------
+class _StageProgress:
+    """États d'une étape enregistrés par paquets (un UPDATE par état et par paquet)."""
+
+    def __init__(self, batch_id, field, flush_every=25):
+        self.batch_id = batch_id
+        self.field = field
+        self.flush_every = flush_every
+        self.pending = {"done": [], "failed": []}
+        self.recorded = set()
+
+    def record(self, inscription_id, ok):
+        self.recorded.add(inscription_id)
+        self.pending["done" if ok else "failed"].append(inscription_id)
+        if sum(len(ids) for ids in self.pending.values()) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        for state, ids in self.pending.items():
+            if ids:
+                AccreditationJob.objects.filter(batch_id=self.batch_id, inscription_id__in=ids).update(
+                    **{self.field: state}
+                )
+        self.pending = {"done": [], "failed": []}
+
+
+def _render_badges(batch_id, ids, workers=None):
+    try:
+        from .utils_badges import get_or_generate_badge, render_badges_bulk
+    except Exception as exc:
+        logger.warning("Badge generator not available: %s", exc)
+        AccreditationJob.objects.filter(batch_id=batch_id).update(badge_state="skipped")
+        return
+
+    progress = _StageProgress(batch_id, "badge_state")
+    try:
+        # "spawn" : le thread des lettres tourne pendant la création du pool
+        render_badges_bulk(
+            Inscription.objects.filter(pk__in=ids),
+            workers=workers or _setting("ACCREDITATION_BATCH_WORKERS", None),
+            on_result=lambda pk, path, error: progress.record(pk, bool(path) and not error),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    except Exception as exc:
+        # pool indisponible (ex. worker Celery démon) : rendu dans le processus courant
+        logger.warning("Badge process pool unavailable for batch %s (%s), rendering in process", batch_id, exc)
+        for inscription in Inscription.objects.filter(pk__in=ids).exclude(pk__in=progress.recorded):
+            try:
+                progress.record(inscription.pk, bool(get_or_generate_badge(inscription)))
+            except Exception:
+                logger.exception("Badge generation failed for inscription %s", inscription.pk)
+                progress.record(inscription.pk, False)
+    finally:
+        progress.flush()
+
+
+def _render_letters(batch_id, inscriptions, chunk_size):
+    try:
+        from .utils_letters import generate_invitation_letters_pdf
+    except Exception as exc:
+        logger.warning("Invitation letter generator not available: %s", exc)
+        AccreditationJob.objects.filter(batch_id=batch_id).update(letter_state="skipped")
+        connection.close()
+        return
+
+    progress = _StageProgress(batch_id, "letter_state", flush_every=chunk_size)
+    try:
+        for start in range(0, len(inscriptions), chunk_size):
+            chunk = inscriptions[start:start + chunk_size]
+            # lettres déjà en cache non re-rendues ; un seul rendu pour les autres
+            paths = generate_invitation_letters_pdf(chunk, combined=False, chunk_size=chunk_size) or {}
+            for inscription in chunk:
+                progress.record(inscription.pk, inscription.pk in paths)
+            progress.flush()
+    except Exception:
+        logger.exception("Letter rendering failed for batch %s", batch_id)
+        for inscription in inscriptions:
+            if inscription.pk not in progress.recorded:
+                progress.record(inscription.pk, False)
+    finally:
+        progress.flush()
+        # connexion DB propre à ce thread
+        connection.close()
+
+
+def run_accreditation_batch(batch, workers=None, letter_chunk_size=None):
+    """
+    Rend les badges et les lettres du lot en parallèle puis envoie les emails.
+    Relançable : badges et lettres déjà en cache sont réutilisés, les emails déjà
+    partis ne sont pas renvoyés. Retourne l'avancement (batch_progress).
+    """
+    from .outbox import dispatch_outbox
+
+    now = timezone.now()
+    jobs = AccreditationJob.objects.filter(batch=batch)
+    AccreditationBatch.objects.filter(pk=batch.pk).update(state="running", started_at=now, error=None)
+    jobs.exclude(state="done").update(state="running", started_at=now, badge_state="running", letter_state="running")
+
+    ids = list(jobs.values_list("inscription_id", flat=True))
+    inscriptions = list(Inscription.objects.filter(pk__in=ids).order_by("id"))
+    letter_chunk_size = letter_chunk_size or _setting("ACCREDITATION_BATCH_LETTER_CHUNK", 50)
+
+    letters = threading.Thread(
+        target=_render_letters, args=(batch.pk, inscriptions, letter_chunk_size), name=f"letters-{batch.pk}",
+    )
+    letters.start()
+    try:
+        _render_badges(batch.pk, ids, workers)
+    finally:
+        letters.join()
+
+    # Emails : les lignes du lot deviennent dues maintenant, envoyées sur des connexions réutilisées
+    rows = OutboundEmail.objects.filter(job__batch=batch, status="pending")
+    row_ids = list(rows.values_list("id", flat=True))
+    rows.update(next_attempt_at=timezone.now())
+    jobs.filter(email_state="pending").update(email_state="running")
+    stats = dispatch_outbox(ids=row_ids)
+
+    AccreditationBatch.objects.filter(pk=batch.pk).update(state="done", finished_at=timezone.now())
+    logger.info("Accreditation batch %s done: %s inscriptions, emails %s", batch.pk, len(ids), stats)
+    return batch_progress(batch)
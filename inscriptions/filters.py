@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import Inscription
+
+# ?ordering= des listes back-office -> clé de tri de la pagination par curseur.
+# Chaque clé se termine par id (ordre total) et ne contient que des colonnes non
+# NULL ; chacune a son index (voir Inscription.Meta.indexes).
+ORDERINGS = {
+    "-created_at": ("-created_at", "-id"),
+    "created_at": ("created_at", "id"),
+    "nom": ("nom", "prenom", "id"),
+    "-nom": ("-nom", "-prenom", "-id"),
+}
+DEFAULT_ORDERING = "-created_at"
+
+
+def _day_start(day):
+    """Début du jour `day` (fuseau courant), comparable à created_at."""
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def filter_inscriptions(queryset, params):
+    """
+    Filtres communs aux listes / exports back-office.
+    params : QueryDict (request.GET / request.query_params) ou dict.
+      - evenement   : id de l'événement
+      - type_profil : une des valeurs de Inscription.PROFILE_CHOICES
+      - statut      : une des valeurs de Inscription.STATUS_CHOICES
+      - nationalite : valeur exacte
+      - date_from / date_to : bornes incluses sur created_at (AAAA-MM-JJ)
+    Chaque filtre est une égalité ou un intervalle sur la colonne elle-même, pour
+    que les index composites de Inscription s'appliquent.
+    """
+    evenement = params.get("evenement")
+    if evenement:
+        if not str(evenement).isdecimal():
+            raise ValidationError({"evenement": "Identifiant d'événement invalide."})
+        queryset = queryset.filter(evenement_id=int(evenement))
+
+    type_profil = params.get("type_profil")
+    if type_profil:
+        if type_profil not in dict(Inscription.PROFILE_CHOICES):
+            raise ValidationError({"type_profil": "Profil inconnu."})
+        queryset = queryset.filter(type_profil=type_profil)
+
+    statut = params.get("statut")
+    if statut:
+        if statut not in dict(Inscription.STATUS_CHOICES):
+            raise ValidationError({"statut": "Statut inconnu."})
+        queryset = queryset.filter(statut=statut)
+
+    nationalite = (params.get("nationalite") or "").strip()
+    if nationalite:
+        queryset = queryset.filter(nationalite=nationalite)
+
+    # Jours convertis en bornes sur created_at (pas de created_at__date : la
+    # fonction appliquée à la colonne empêcherait l'usage des index)
+    for param, lookup, shift in (("date_from", "created_at__gte", 0), ("date_to", "created_at__lt", 1)):
+        value = params.get(param)
+        if value:
+            try:
+                # ValueError : date bien formée mais impossible (2025-02-30)
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValidationError({param: "Date invalide (format AAAA-MM-JJ)."})
+            queryset = queryset.filter(**{lookup: _day_start(day + timedelta(days=shift))})
+
+    return queryset
+
+
+def ordering_for(params):
+    """Clé de tri demandée (?ordering=, voir ORDERINGS)."""
+    value = params.get("ordering") or DEFAULT_ORDERING
+    if value not in ORDERINGS:
+        raise ValidationError({"ordering": f"Tri inconnu (valeurs possibles : {', '.join(ORDERINGS)})."})
+    return ORDERINGS[value]
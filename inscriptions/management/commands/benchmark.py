@@ -0,0 +1,715 @@
+import random
+import time
+
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management.base import BaseCommand, CommandError
+
+
+SAMPLE_FIRST_NAMES = [
+    "Awa", "Mamadou", "Fatou", "Jean-Baptiste", "Aïssatou", "Cheikh Ahmadou", "Maria da Conceição",
+    "João", "Ndèye Coumba", "Ousmane", "Mariama", "Kouadio Yao", "Adjoa", "Émilie", "Sékou",
+]
+SAMPLE_LAST_NAMES = [
+    "Diop", "Ndiaye", "Traoré", "Konaté", "Ouédraogo", "Gonçalves Pereira", "Sow Ba", "Coulibaly",
+    "Diallo Sylla Camara", "Kaboré", "N'Guessan", "Mendes da Silva Cabral", "Fall", "Touré Keïta",
+]
+
+
+def _timeit(func, repeat):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / repeat
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return sum(ordered) / len(ordered), p95
+
+
+def _split_name_by_pixels_legacy(prenom, nom, font, draw, max_width_px):
+    """Implémentation d'origine (référence pour le benchmark et la non-régression)."""
+    full = (prenom or "").strip() + " " + (nom or "").strip()
+    words = full.split()
+    line1 = ""
+    line2 = ""
+    for w in words:
+        test = (line1 + " " + w).strip()
+        bbox = draw.textbbox((0, 0), test, font=font)
+        if bbox[2] - bbox[0] <= max_width_px:
+            line1 = test
+        else:
+            line2 = " ".join(words[words.index(w):])
+            break
+    return [line1] if not line2 else [line1, line2]
+
+
+LETTER_SAMPLE_CONTEXT = {
+    "nom": "Diop", "prenom": "Awa", "nationalite": "Sénégalaise",
+    "provenance": "Dakar", "role": "Festivaliers",
+}
+
+
+def _measure_letter_backend(backend, repeat):
+    """
+    Exécuté dans un processus neuf (spawn) pour que la mémoire mesurée ne
+    concerne qu'un seul moteur : import + 1er rendu, rendus chauds, pic
+    tracemalloc d'un rendu chaud et RSS maximal du processus.
+    """
+    import resource
+    import tracemalloc
+
+    import django
+    django.setup()
+    from django.conf import settings
+
+    start = time.perf_counter()
+    if backend == "pydyf":
+        from inscriptions.utils_letters_pydyf import render_letter_pdf
+
+        def render():
+            return render_letter_pdf(LETTER_SAMPLE_CONTEXT)
+    else:
+        from django.template.loader import render_to_string
+        from weasyprint import CSS, HTML
+        from inscriptions.utils_letters import DEFAULT_LETTER_TEMPLATE, LETTER_STYLESHEETS
+
+        def render():
+            html = render_to_string(DEFAULT_LETTER_TEMPLATE, LETTER_SAMPLE_CONTEXT)
+            return HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf(
+                stylesheets=[CSS(filename=p) for p in LETTER_STYLESHEETS[DEFAULT_LETTER_TEMPLATE]])
+    size = len(render())
+    cold = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        warm.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    render()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # ru_maxrss est en Ko sous Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {"cold": cold, "warm": warm, "peak": peak, "rss": rss, "size": size}
+
+
+def _sendgrid_payload_legacy(message):
+    """Ancien corps SendGrid : chaque pièce jointe (tuple d'octets) réencodée en base64 à chaque message."""
+    import base64
+
+    return {
+        "personalizations": [{"to": [{"email": message["to"]}]}],
+        "subject": message["subject"],
+        "content": [{"type": "text/plain", "value": message["text"]}],
+        "attachments": [
+            {"content": base64.b64encode(content).decode(), "filename": filename, "type": mime_type}
+            for filename, content, mime_type in message["attachments"]
+        ],
+    }
+
+
+class _NullHTTPConnection:
+    """Connexion HTTP factice : consomme le corps envoyé (octets ou morceaux) et répond 202."""
+
+    status = 202
+    will_close = False
+
+    def request(self, method, path, body, headers):
+        for chunk in [body] if isinstance(body, bytes) else body:
+            len(chunk)
+
+    def getresponse(self):
+        return self
+
+    def read(self):
+        return b""
+
+    def close(self):
+        pass
+
+
+class SlowEmailBackend(BaseEmailBackend):
+    """Backend email de test : simule la latence d'un fournisseur (SLOW_EMAIL_DELAY secondes par message)."""
+
+    delay = 0.2
+
+    def send_messages(self, email_messages):
+        for _ in email_messages:
+            time.sleep(self.delay)
+        return len(email_messages)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks des chemins de rendu (badges, PDF, emails)."
+
+    targets = ("name-wrap", "qr", "letters", "letter-backends", "registration", "attachments", "templates", "pagination", "search", "export")
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=self.targets)
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=2025)
+        parser.add_argument("--email-delay", type=float, default=0.2,
+                            help="registration : latence simulée du fournisseur email, par message (s).")
+        parser.add_argument("--rows", type=int, default=100_000,
+                            help="search, export : nombre d'inscriptions en base pendant la mesure (complété puis annulé).")
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        self.options = options
+        handler = getattr(self, "bench_" + options["target"].replace("-", "_"))
+        handler(options["repeat"])
+
+    def report(self, label, seconds):
+        self.stdout.write(f"{label:<40} {seconds * 1000:10.3f} ms")
+
+    # ------------------------------------------------------------------
+    def bench_name_wrap(self, repeat):
+        from PIL import Image, ImageDraw
+        from inscriptions.utils_badges import (
+            FONT_BOLD, FONT_BOLD_SIZE, MAX_NAME_WIDTH, get_font, split_name_by_pixels,
+        )
+
+        font = get_font(FONT_BOLD, FONT_BOLD_SIZE)
+        draw = ImageDraw.Draw(Image.new("RGBA", (10, 10)))
+        names = [
+            (random.choice(SAMPLE_FIRST_NAMES), " ".join(random.sample(SAMPLE_LAST_NAMES, random.randint(1, 6))))
+            for _ in range(repeat)
+        ]
+
+        # On compare le point de coupure (1re ligne) : l'ancienne version recopiait
+        # des mots en 2e ligne quand un mot apparaît deux fois (words.index).
+        mismatches = [
+            (p, n) for p, n in names
+            if split_name_by_pixels(p, n, font, draw, MAX_NAME_WIDTH)[0]
+            != _split_name_by_pixels_legacy(p, n, font, draw, MAX_NAME_WIDTH)[0]
+        ]
+        if mismatches:
+            raise CommandError(f"Découpage différent de la référence pour : {mismatches[:5]}")
+
+        legacy = _timeit(lambda: [_split_name_by_pixels_legacy(p, n, font, draw, MAX_NAME_WIDTH) for p, n in names], 1)
+        current = _timeit(lambda: [split_name_by_pixels(p, n, font, draw, MAX_NAME_WIDTH) for p, n in names], 1)
+        self.report(f"legacy ({len(names)} noms)", legacy)
+        self.report(f"mémorisé ({len(names)} noms)", current)
+        self.stdout.write(f"accélération x{legacy / current:.1f}, coupures identiques")
+
+    # ------------------------------------------------------------------
+    def bench_qr(self, repeat):
+        import qrcode
+        from PIL import Image
+        from inscriptions.utils_badges import (
+            QR_BORDER, QR_ERROR_CORRECTION, QR_POSITION, QR_SIZE, QR_VERSION, render_qr,
+        )
+
+        payloads = [f"ECOFEST2025-{i}-participant.{i}@example.com" for i in range(repeat)]
+        base = Image.new("RGBA", (1200, 1800), "white")
+
+        # Fidélité : le centre de chaque module de l'image doit redonner la matrice
+        # calculée par qrcode (même version / niveau de correction).
+        for data in payloads[:50]:
+            qr = qrcode.QRCode(
+                version=QR_VERSION,
+                error_correction=QR_ERROR_CORRECTION,
+                box_size=1,
+                border=QR_BORDER,
+            )
+            qr.add_data(data)
+            qr.make(fit=False)
+            matrix = qr.get_matrix()
+            tile = render_qr(data)
+            modules = len(matrix)
+            scale = QR_SIZE // modules
+            offset = (QR_SIZE - modules * scale) // 2
+            for y, row in enumerate(matrix):
+                for x, cell in enumerate(row):
+                    pixel = tile.getpixel((offset + x * scale + scale // 2, offset + y * scale + scale // 2))
+                    if bool(cell) != (pixel == 0):
+                        raise CommandError(f"QR code incohérent pour {data!r} au module ({x}, {y})")
+
+        def legacy():
+            for data in payloads:
+                qr = qrcode.make(data).resize((QR_SIZE, QR_SIZE))
+                base.paste(qr, QR_POSITION)
+
+        def current():
+            for data in payloads:
+                base.paste(render_qr(data), QR_POSITION)
+
+        legacy_time = _timeit(legacy, 1)
+        current_time = _timeit(current, 1)
+        self.report(f"qrcode.make + resize ({repeat})", legacy_time)
+        self.report(f"matrice + échelle entière ({repeat})", current_time)
+        self.stdout.write(f"accélération x{legacy_time / current_time:.1f}")
+
+    # ------------------------------------------------------------------
+    def bench_letters(self, repeat):
+        from django.conf import settings
+        from django.template.loader import render_to_string
+        from inscriptions.pdf_workers import PDFRenderService
+        from inscriptions.utils_letters import LETTER_STYLESHEETS, weasy_available
+
+        if not weasy_available():
+            raise CommandError("WeasyPrint n'est pas disponible dans cet environnement.")
+        from weasyprint import CSS, HTML
+
+        template = "letters/invitation.html"
+        stylesheets = LETTER_STYLESHEETS[template]
+        base_url = str(settings.BASE_DIR)
+        html = render_to_string(template, {
+            "nom": "Diop", "prenom": "Awa", "nationalite": "Sénégalaise",
+            "provenance": "Dakar", "role": "Festivaliers",
+        })
+        repeat = min(repeat, 50)
+
+        # Froid : nouveau processus (import WeasyPrint + polices) puis premier rendu
+        cold = []
+        for _ in range(3):
+            start = time.perf_counter()
+            service = PDFRenderService(workers=1, timeout=120)
+            if service.render(html, base_url, stylesheets) is None:
+                raise CommandError("Échec du rendu dans le worker.")
+            cold.append(time.perf_counter() - start)
+            service.shutdown()
+
+        # Ancien chemin : HTML(...) complet à chaque appel, dans le processus courant
+        per_call = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            HTML(string=html, base_url=base_url).write_pdf(stylesheets=[CSS(filename=p) for p in stylesheets])
+            per_call.append(time.perf_counter() - start)
+
+        # Chaud : worker démarré, polices et CSS déjà chargées
+        service = PDFRenderService(workers=1, timeout=120)
+        service.warm_up()
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            service.render(html, base_url, stylesheets)
+            warm.append(time.perf_counter() - start)
+        service.shutdown()
+
+        for label, samples in (("froid (nouveau worker)", cold), ("HTML() à chaque appel", per_call), ("worker chaud", warm)):
+            mean, p95 = _percentiles(samples)
+            self.stdout.write(f"{label:<40} moy {mean * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+
+    # ------------------------------------------------------------------
+    def bench_letter_backends(self, repeat):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from inscriptions.utils_letters import weasy_available
+
+        backends = ["pydyf"]
+        if weasy_available():
+            backends.append("weasyprint")
+        else:
+            self.stdout.write("WeasyPrint indisponible : seul le moteur pydyf est mesuré.")
+
+        repeat = min(repeat, 100)
+        results = {}
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results[backend] = pool.submit(_measure_letter_backend, backend, repeat).result()
+
+        for backend, result in results.items():
+            mean, p95 = _percentiles(result["warm"])
+            self.stdout.write(
+                f"{backend:<12} import + 1er rendu {result['cold'] * 1000:8.1f} ms   "
+                f"chaud moy {mean * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms   "
+                f"pic Python {result['peak'] / 1024:8.0f} Ko   RSS max {result['rss'] / 2 ** 20:6.1f} Mo   "
+                f"PDF {result['size'] / 1024:5.1f} Ko"
+            )
+        if len(results) == 2:
+            fast = _percentiles(results["pydyf"]["warm"])[0]
+            slow = _percentiles(results["weasyprint"]["warm"])[0]
+            self.stdout.write(f"accélération x{slow / fast:.1f} (rendu chaud)")
+
+    # ------------------------------------------------------------------
+    def bench_registration(self, repeat):
+        """
+        Test de charge local de POST /api/inscriptions/ : emails envoyés dans la
+        requête (Celery en mode eager, équivalent aux anciens send_mail) puis
+        mis en file (broker mémoire) et envoyés ensuite par le dispatcher.
+        """
+        from django.test.utils import override_settings
+        from rest_framework.test import APIClient
+        from backend.celery import app
+        from inscriptions.models import Inscription, OutboundEmail, Participant
+        from inscriptions.outbox import dispatch_outbox
+
+        repeat = min(repeat, 100)
+        SlowEmailBackend.delay = self.options["email_delay"]
+        client = APIClient()
+        prefix = f"bench-registration-{int(time.time())}"
+        counter = iter(range(10 ** 6))
+
+        def post():
+            n = next(counter)
+            start = time.perf_counter()
+            response = client.post("/api/inscriptions/", {
+                "nom": random.choice(SAMPLE_LAST_NAMES), "prenom": random.choice(SAMPLE_FIRST_NAMES),
+                "email": f"{prefix}-{n}@example.com", "nationalite": "Sénégalaise",
+                "provenance": "Dakar", "type_profil": "Festivaliers",
+            }, format="multipart")
+            elapsed = time.perf_counter() - start
+            if response.status_code != 201:
+                raise CommandError(f"POST /api/inscriptions/ : HTTP {response.status_code} {response.content[:200]!r}")
+            return elapsed
+
+        previous = {"CELERY_TASK_ALWAYS_EAGER": app.conf.task_always_eager, "CELERY_BROKER_URL": app.conf.broker_url}
+        results = {}
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=["*"], SENDGRID_API_KEY="", EMAIL_OUTBOX_RATE=0,
+                EMAIL_BACKEND=f"{__name__}.SlowEmailBackend",
+                # un email admin par inscription (pas de digest) : 2 emails par requête
+                ADMIN_DIGEST_THRESHOLD=10 ** 6,
+            ):
+                # Mode file d'abord : un premier .delay() en mode eager fige la connexion
+                # au broker par défaut pour le reste du processus.
+                app.conf.update(CELERY_TASK_ALWAYS_EAGER=False, CELERY_BROKER_URL="memory://")
+                queued = [post() for _ in range(repeat)]
+
+                # Le dispatcher envoie ensuite les emails laissés dans l'outbox
+                ids = list(OutboundEmail.objects.filter(
+                    inscription__email__startswith=prefix, status="pending",
+                ).values_list("id", flat=True))
+                stats = dispatch_outbox(ids=ids)
+
+                app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+                results["emails dans la requête"] = [post() for _ in range(repeat)]
+                results["emails en file (on_commit)"] = queued
+        finally:
+            app.conf.update(**previous)
+            participants = list(
+                Inscription.objects.filter(email__startswith=prefix).values_list("participant_id", flat=True)
+            )
+            Inscription.objects.filter(email__startswith=prefix).delete()
+            Participant.objects.filter(pk__in=participants).delete()
+
+        for label, samples in results.items():
+            mean, p95 = _percentiles(samples)
+            self.stdout.write(f"{label:<40} moy {mean * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+        self.stdout.write(
+            f"dispatcher : {stats['sent']}/{len(ids)} emails envoyés après coup en {stats['elapsed']:.1f}s "
+            f"(latence fournisseur simulée {SlowEmailBackend.delay * 1000:.0f} ms par message)"
+        )
+        if stats["sent"] != 2 * repeat:
+            raise CommandError(f"{2 * repeat} emails attendus, {stats['sent']} envoyés.")
+
+    # ------------------------------------------------------------------
+    def bench_attachments(self, repeat):
+        """
+        Lot de 500 emails de package (badge + lettre propres au destinataire,
+        programme PDF commun) envoyés un par un à une connexion SendGrid factice :
+        pic mémoire (tracemalloc) et temps de l'ancien chemin (tuples d'octets,
+        base64 + json.dumps + encode par message, programme relu à chaque fois)
+        et de EmailAttachment (base64 une fois inséré tel quel, programme partagé).
+        """
+        import json
+        import os
+        import tempfile
+        import tracemalloc
+        from inscriptions.attachments import clear_shared_attachments, file_attachment, shared_attachment
+        from inscriptions.tasks import SendGridSession
+
+        messages_count = 500
+        sizes = {"badge": 120 * 1024, "letter": 40 * 1024, "programme": 400 * 1024}
+
+        class NullSession(SendGridSession):
+            def _connection(self):
+                return _NullHTTPConnection(), True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            def write(name, size):
+                path = os.path.join(tmp, name)
+                with open(path, "wb") as f:
+                    f.write(os.urandom(size))
+                return path
+
+            badges = [write(f"badge_{i}.png", sizes["badge"]) for i in range(20)]
+            letters = [write(f"invitation_{i}.pdf", sizes["letter"]) for i in range(20)]
+            programme = write("programme.pdf", sizes["programme"])
+
+            def base_message(i):
+                return {"to": f"participant.{i}@example.com", "subject": "Accréditation", "text": "Bonjour",
+                        "html": None, "reply_to": None}
+
+            def read(path):
+                with open(path, "rb") as f:
+                    return f.read()
+
+            def legacy():
+                conn = _NullHTTPConnection()
+                for i in range(messages_count):
+                    message = dict(base_message(i), attachments=[
+                        ("badge.png", read(badges[i % 20]), "image/png"),
+                        ("invitation.pdf", read(letters[i % 20]), "application/pdf"),
+                        ("programme.pdf", read(programme), "application/pdf"),
+                    ])
+                    conn.request("POST", "/v3/mail/send", json.dumps(_sendgrid_payload_legacy(message)).encode("utf-8"), {})
+
+            def current():
+                clear_shared_attachments()
+                session = NullSession("benchmark", base_url="http://localhost")
+                for i in range(messages_count):
+                    session.send(dict(base_message(i), attachments=[
+                        file_attachment(badges[i % 20], "badge.png", "image/png"),
+                        file_attachment(letters[i % 20], "invitation.pdf", "application/pdf"),
+                        shared_attachment(programme),
+                    ]))
+
+            results = {}
+            for label, func in (("tuples d'octets + json.dumps", legacy), ("EmailAttachment", current)):
+                tracemalloc.start()
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results[label] = peak
+                self.stdout.write(f"{label:<40} pic {peak / 2 ** 20:8.1f} Mo   {elapsed * 1000:8.1f} ms")
+
+        legacy_peak, current_peak = results.values()
+        self.stdout.write(
+            f"{messages_count} messages (badge {sizes['badge'] // 1024} Ko, lettre {sizes['letter'] // 1024} Ko, "
+            f"programme commun {sizes['programme'] // 1024} Ko) : pic mémoire / {legacy_peak / current_peak:.1f}"
+        )
+
+    # ------------------------------------------------------------------
+    def bench_templates(self, repeat):
+        """
+        Emails de confirmation (HTML + texte) pour `repeat` inscriptions :
+        render_to_string à chaque envoi, moteur sans loader cached (référence :
+        lecture + compilation à chaque appel), templating.render (variante
+        résolue une fois) et templating.render_many (lot, Context réutilisé).
+        """
+        from django.conf import settings
+        from django.template import Context, Engine
+        from django.template.loader import render_to_string
+        from inscriptions.models import Inscription
+        from inscriptions.templating import inscription_language, render, render_many
+
+        names = ("emails/confirmation_full.html", "emails/confirmation_full.txt")
+        inscriptions = list(
+            Inscription.objects.select_related("evenement", "participant__user").order_by("id")[:repeat]
+        )
+        if not inscriptions:
+            raise CommandError("Aucune inscription en base.")
+        site_url = getattr(settings, "SITE_URL", "https://ecofest.app")
+        contexts = [
+            {"inscription": i, "participant": i.participant, "event": i.evenement, "site_url": site_url}
+            for i in inscriptions
+        ]
+        languages = [inscription_language(i) for i in inscriptions]
+        uncached = Engine(
+            libraries={"static": "django.templatetags.static"},
+            loaders=["django.template.loaders.app_directories.Loader"],
+        )
+
+        def per_call():
+            return [render_to_string(name, c) for c in contexts for name in names]
+
+        def without_cache():
+            return [uncached.get_template(name).render(Context(c)) for c in contexts for name in names]
+
+        def layer():
+            return [render(name, c, lang=lang) for c, lang in zip(contexts, languages) for name in names]
+
+        def batch():
+            rendered = [render_many(name, contexts, languages) for name in names]
+            return [out for pair in zip(*rendered) for out in pair]
+
+        # Mêmes emails (langue par défaut) avec les quatre méthodes
+        default_batch = [out for pair in zip(*[render_many(name, contexts) for name in names]) for out in pair]
+        if per_call() != default_batch or layer() != batch():
+            raise CommandError("Rendus différents entre render_to_string et templating.")
+
+        for label, func in (
+            ("sans loader cached", without_cache),
+            ("render_to_string par appel", per_call),
+            ("templating.render", layer),
+            ("templating.render_many (lot)", batch),
+        ):
+            self.report(f"{label} ({len(contexts)} x 2)", _timeit(func, 1))
+
+    # ------------------------------------------------------------------
+    def bench_pagination(self, repeat):
+        """
+        GET /api/admin/inscriptions/ : ancienne liste complète (sérialisée),
+        requête de la dernière page par OFFSET et par curseur, puis l'endpoint
+        paginé (KeysetPagination), avec et sans fields=.
+        """
+        from django.test.utils import override_settings
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+        from inscriptions.models import Inscription
+        from inscriptions.pagination import KeysetPagination
+        from inscriptions.serializers import InscriptionSerializer
+
+        staff = get_user_model().objects.filter(is_staff=True).first()
+        total = Inscription.objects.count()
+        if staff is None or total < 2 * KeysetPagination.page_size:
+            raise CommandError("Il faut un compte staff et au moins 100 inscriptions en base.")
+        client = APIClient()
+        client.force_authenticate(staff)
+        page_size = KeysetPagination.page_size
+        repeat = max(1, min(repeat, 20))
+
+        ordered = Inscription.objects.order_by("-created_at", "-id")
+        anchor = ordered[total - page_size - 1]
+        cursor_url = KeysetPagination()
+        cursor_url.base_url = "/api/admin/inscriptions/"
+        deep = cursor_url.encode_cursor(anchor, reverse=False, ordering=KeysetPagination.ordering)
+
+        def full_list():
+            return InscriptionSerializer(ordered, many=True).data
+
+        def offset_page():
+            return list(ordered.all()[total - page_size:total])
+
+        def keyset_page():
+            values = [getattr(anchor, f) for f in KeysetPagination.key_fields(KeysetPagination.ordering)]
+            return list(ordered.all().filter(KeysetPagination.after(KeysetPagination.ordering, values))[:page_size + 1])
+
+        def get(url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} : HTTP {response.status_code}")
+            return response
+
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            last = get(deep).data["results"]
+            if [row["id"] for row in last] != [i.pk for i in offset_page()]:
+                raise CommandError("La page par curseur diffère de la page par OFFSET.")
+            self.report(f"liste complète sérialisée ({total})", _timeit(full_list, 1))
+            self.report(f"requête dernière page, OFFSET ({page_size})", _timeit(offset_page, repeat))
+            self.report(f"requête dernière page, curseur ({page_size})", _timeit(keyset_page, repeat))
+            self.report("GET dernière page par curseur", _timeit(lambda: get(deep), repeat))
+            self.report("idem, fields=id,nom,prenom,statut", _timeit(lambda: get(deep + "&fields=id,nom,prenom,statut"), repeat))
+
+    # ------------------------------------------------------------------
+    def _top_up_inscriptions(self, rows):
+        """Complète la base jusqu'à `rows` inscriptions fictives (à appeler dans une transaction annulée)."""
+        from inscriptions.models import Inscription, Participant
+
+        cities = ["Dakar", "Thiès", "Abidjan", "Ouagadougou", "Bamako", "Lisboa", "Praia", "Bissau"]
+        missing = rows - Inscription.objects.count()
+        if missing <= 0:
+            return
+        participant = Participant.objects.create()
+        prefix = f"bench-rows-{int(time.time())}"
+        for start in range(0, missing, 5000):
+            Inscription.objects.bulk_create([
+                Inscription(
+                    participant=participant, type_profil="Festivaliers",
+                    nom=random.choice(SAMPLE_LAST_NAMES), prenom=random.choice(SAMPLE_FIRST_NAMES),
+                    email=f"{prefix}-{n}@example.com", provenance=random.choice(cities),
+                    telephone=f"+221 77 {random.randint(0, 999):03d} {random.randint(0, 99):02d} "
+                              f"{random.randint(0, 99):02d}",
+                )
+                for n in range(start, min(start + 5000, missing))
+            ])
+
+    # ------------------------------------------------------------------
+    def bench_search(self, repeat):
+        """
+        Recherche back-office (search.py) sur --rows inscriptions : la base est
+        complétée par des inscriptions fictives dans une transaction annulée à
+        la fin. Comparée à un icontains sur les cinq champs (sans index).
+        """
+        from django.db import connection, transaction
+        from inscriptions.models import Inscription
+        from inscriptions.search import _search_fallback, query_terms, search_ids
+
+        queries = ["ndeye", "diop awa", "goncalves", "joão", "77 12", "example.com", "ouagadougou", "keita"]
+
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                self._top_up_inscriptions(self.options["rows"])
+                total = Inscription.objects.count()
+                self.stdout.write(f"{total} inscriptions ({connection.vendor})")
+
+                for query in queries:
+                    samples = []
+                    for _ in range(max(1, min(repeat, 50))):
+                        start = time.perf_counter()
+                        found = search_ids(query, limit=20)
+                        samples.append(time.perf_counter() - start)
+                    mean, p95 = _percentiles(samples)
+                    start = time.perf_counter()
+                    _search_fallback(query_terms(query), 20)
+                    baseline = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{query!r:<16} {len(found):3d} résultats   moy {mean * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+                        f"   (icontains {baseline * 1000:7.1f} ms)"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    # ------------------------------------------------------------------
+    def bench_export(self, repeat):
+        """
+        Export tableur de --rows inscriptions (base complétée dans une transaction
+        annulée) : liste API sérialisée en entier (export à la main, référence),
+        puis CSV et XLSX en streaming. Premier octet, durée totale, pic mémoire.
+        """
+        import tracemalloc
+        from django.db import transaction
+        from inscriptions.models import Inscription
+        from inscriptions.serializers import InscriptionSerializer
+        from inscriptions.utils_export import EXPORT_FORMATS, export_columns, export_rows
+
+        columns = export_columns()
+
+        def serialized_list():
+            queryset = Inscription.objects.select_related("evenement").order_by("-created_at", "-id")
+            yield str(InscriptionSerializer(queryset, many=True).data).encode("utf-8")
+
+        def streamed(kind):
+            def run():
+                queryset = Inscription.objects.order_by("-created_at", "-id")
+                return EXPORT_FORMATS[kind][0](export_rows(queryset, columns), columns)
+            return run
+
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                self._top_up_inscriptions(self.options["rows"])
+                self.stdout.write(f"{Inscription.objects.count()} inscriptions")
+                for label, make in (
+                    ("liste API sérialisée", lambda: serialized_list()),
+                    ("CSV en streaming", streamed("csv")),
+                    ("XLSX en streaming", streamed("xlsx")),
+                ):
+                    # durées sans tracemalloc (qui ralentit beaucoup), pic mémoire dans un second passage
+                    start = time.perf_counter()
+                    chunks = make()
+                    size = len(next(chunks))
+                    first = time.perf_counter() - start
+                    for chunk in chunks:
+                        size += len(chunk)
+                    elapsed = time.perf_counter() - start
+                    tracemalloc.start()
+                    for chunk in make():
+                        pass
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    self.stdout.write(
+                        f"{label:<24} 1er octet {first * 1000:8.1f} ms   total {elapsed:6.2f} s   "
+                        f"pic {peak / 2 ** 20:7.1f} Mo   {size / 2 ** 20:6.1f} Mo"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,38 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from inscriptions.outbox import dispatch_outbox, outbox_metrics
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails dus de l'outbox (retries avec backoff, dead-letter, débit limité)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Lignes réservées par lot (défaut : EMAIL_OUTBOX_BATCH_SIZE).")
+        parser.add_argument("--max-batches", type=int, default=None, help="Nombre maximum de lots par passage.")
+        parser.add_argument("--rate", type=float, default=None, help="Envois par seconde (défaut : EMAIL_OUTBOX_RATE, 0 = illimité).")
+        parser.add_argument("--loop", action="store_true", help="Tourner en continu (dispatcher sans Celery beat).")
+        parser.add_argument("--interval", type=float, default=10, help="Pause entre deux passages en mode --loop (s).")
+        parser.add_argument("--metrics", action="store_true", help="Afficher l'état de l'outbox et quitter.")
+
+    def handle(self, *args, **options):
+        if options["metrics"]:
+            self.stdout.write(json.dumps(outbox_metrics(), indent=2))
+            return
+
+        while True:
+            stats = dispatch_outbox(
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+                rate=options["rate"],
+            )
+            if stats["claimed"] or not options["loop"]:
+                self.stdout.write(
+                    f"{stats['claimed']} réservés — {stats['sent']} envoyés, {stats['pending']} à réessayer, "
+                    f"{stats['dead']} en dead-letter — {stats['elapsed']:.1f}s"
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inscriptions.filters import filter_inscriptions
+from inscriptions.models import Inscription
+from inscriptions.utils_badges import BULK_FIELDS
+from inscriptions.utils_sheets import SheetLayout, iter_badge_sheets_pdf
+
+
+class Command(BaseCommand):
+    help = "Exporte les badges imposés N-up (A4/A3, traits de coupe) dans un PDF multi-pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Chemin du PDF à écrire.")
+        parser.add_argument("--statut", default="Validé")
+        parser.add_argument("--evenement")
+        parser.add_argument("--type-profil")
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+        parser.add_argument("--page-size", default="A4", choices=["A4", "A3"])
+        parser.add_argument("--landscape", action="store_true")
+        parser.add_argument("--cols", type=int)
+        parser.add_argument("--rows", type=int)
+        parser.add_argument("--badge-width-mm", type=float, default=95)
+        parser.add_argument("--badge-height-mm", type=float)
+        parser.add_argument("--margin-mm", type=float, default=5)
+        parser.add_argument("--gutter-mm", type=float, default=4)
+        parser.add_argument("--no-crop-marks", action="store_true")
+        parser.add_argument("--jpeg-quality", type=int, default=92, help="0 = images sans perte.")
+        parser.add_argument("--skip-missing", action="store_true", help="Ignorer les badges non encore générés.")
+
+    def handle(self, *args, **options):
+        try:
+            layout = SheetLayout(
+                page_size=options["page_size"],
+                landscape=options["landscape"],
+                badge_width_mm=options["badge_width_mm"],
+                badge_height_mm=options["badge_height_mm"],
+                cols=options["cols"],
+                rows=options["rows"],
+                margin_mm=options["margin_mm"],
+                gutter_mm=options["gutter_mm"],
+                crop_marks=not options["no_crop_marks"],
+                jpeg_quality=options["jpeg_quality"] or None,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        qs = filter_inscriptions(Inscription.objects.all(), {
+            "statut": options["statut"],
+            "evenement": options["evenement"],
+            "type_profil": options["type_profil"],
+            "date_from": options["date_from"],
+            "date_to": options["date_to"],
+        })
+        inscriptions = qs.order_by("id").only(*BULK_FIELDS).iterator(chunk_size=200)
+
+        with open(options["output"], "wb") as out:
+            for chunk in iter_badge_sheets_pdf(inscriptions, layout, render_missing=not options["skip_missing"]):
+                out.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['output']} écrit ({layout.cols}x{layout.rows} badges par page {options['page_size']})."
+        ))
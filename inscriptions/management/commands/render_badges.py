@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from inscriptions.models import Inscription
+from inscriptions.utils_badges import render_badges_bulk
+
+
+class Command(BaseCommand):
+    help = "Génère en masse les badges des inscriptions (par défaut : statut Validé)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--statut", default="Validé", help="Statut des inscriptions à traiter ('all' pour tout).")
+        parser.add_argument("--ids", nargs="*", type=int, help="Limiter à ces identifiants d'inscription.")
+        parser.add_argument("--workers", type=int, default=None, help="Taille du pool de processus (défaut : nb de CPU).")
+        parser.add_argument("--chunk-size", type=int, default=200, help="Taille des lots lus en base.")
+        parser.add_argument("--force", action="store_true", help="Regénérer même les badges déjà à jour.")
+
+    def handle(self, *args, **options):
+        qs = Inscription.objects.all()
+        if options["statut"] != "all":
+            qs = qs.filter(statut=options["statut"])
+        if options["ids"]:
+            qs = qs.filter(id__in=options["ids"])
+
+        def progress(stats):
+            done = stats["rendered"] + stats["skipped"] + stats["failed"]
+            self.stdout.write(
+                f"{done}/{stats['total']} traités — {stats['rendered']} générés, "
+                f"{stats['skipped']} à jour, {stats['failed']} échecs — {stats['rate']:.1f} badges/s"
+            )
+
+        stats = render_badges_bulk(
+            qs,
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            force=options["force"],
+            progress=progress,
+        )
+
+        for inscription_id, error in stats["errors"].items():
+            self.stderr.write(f"Inscription {inscription_id} : {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé en {stats['elapsed']:.1f}s : {stats['rendered']} générés, "
+            f"{stats['skipped']} à jour, {stats['failed']} échecs."
+        ))
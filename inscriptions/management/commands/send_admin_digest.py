@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inscriptions.admin_digest import send_admin_digest
+
+
+class Command(BaseCommand):
+    help = "Envoie le digest admin des inscriptions pas encore notifiées (à lancer toutes les ADMIN_DIGEST_WINDOW_MINUTES sans Celery beat)."
+
+    def handle(self, *args, **options):
+        email, count = send_admin_digest()
+        if email is None:
+            self.stdout.write("Aucune inscription en attente de notification.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Digest de {count} inscription(s) mis en file (email {email.pk})."))
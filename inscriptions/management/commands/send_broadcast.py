@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inscriptions.broadcast import broadcast_recipients, run_broadcast
+from inscriptions.models import Broadcast
+
+
+class Command(BaseCommand):
+    help = "Envoie une annonce à une sélection d'inscriptions (par défaut : statut Validé), ou reprend une annonce interrompue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--resume", type=int, help="Reprendre l'annonce portant cet identifiant.")
+        parser.add_argument("--subject", help="Sujet (gabarit Django : {{ prenom }}, {{ nom }}...).")
+        parser.add_argument("--message-file", help="Fichier texte du message (gabarit Django).")
+        parser.add_argument("--template", default="emails/broadcast.html", help="Gabarit HTML de l'email.")
+        parser.add_argument("--statut", default="Validé", help="Statut des destinataires ('all' pour tous).")
+        parser.add_argument("--evenement", help="Limiter à un événement (id).")
+        parser.add_argument("--type-profil", help="Limiter à un profil.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Destinataires par appel (1000 max).")
+        parser.add_argument("--dry-run", action="store_true", help="Compter les destinataires sans rien envoyer.")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            try:
+                broadcast = Broadcast.objects.get(pk=options["resume"])
+            except Broadcast.DoesNotExist:
+                raise CommandError(f"Annonce {options['resume']} introuvable.")
+            if broadcast.status == "done":
+                raise CommandError(f"L'annonce {broadcast.pk} est déjà terminée.")
+        else:
+            if not options["subject"] or not options["message_file"]:
+                raise CommandError("--subject et --message-file sont requis (ou --resume).")
+            with open(options["message_file"], encoding="utf-8") as f:
+                message = f.read()
+            filters = {}
+            if options["statut"] != "all":
+                filters["statut"] = options["statut"]
+            if options["evenement"]:
+                filters["evenement"] = options["evenement"]
+            if options["type_profil"]:
+                filters["type_profil"] = options["type_profil"]
+            broadcast = Broadcast(
+                subject=options["subject"],
+                message=message,
+                template_name=options["template"],
+                filters=filters,
+            )
+
+        recipients = broadcast_recipients(broadcast)
+        if options["dry_run"]:
+            self.stdout.write(f"{recipients.count()} destinataires.")
+            return
+
+        if broadcast.pk is None:
+            broadcast.save()
+            self.stdout.write(f"Annonce {broadcast.pk} créée.")
+
+        def progress(b, elapsed):
+            self.stdout.write(
+                f"{b.sent_count + b.failed_count}/{b.total} — {b.sent_count} envoyés, {b.failed_count} échecs "
+                f"(reprise après l'inscription {b.last_inscription_id}) — {elapsed:.1f}s"
+            )
+
+        broadcast = run_broadcast(broadcast, queryset=recipients, batch_size=options["batch_size"], progress=progress)
+        style = self.style.SUCCESS if broadcast.status == "done" else self.style.WARNING
+        self.stdout.write(style(
+            f"Annonce {broadcast.pk} : {broadcast.status}, {broadcast.sent_count} envoyés, {broadcast.failed_count} échecs."
+        ))
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_notified(apps, schema_editor):
+    # Les inscriptions existantes ont déjà eu leur email admin : pas de digest rétroactif
+    Inscription = apps.get_model('inscriptions', 'Inscription')
+    Inscription.objects.filter(admin_notified_at__isnull=True).update(admin_notified_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscriptions', '0006_broadcast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inscription',
+            name='admin_notified_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_notified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscriptions', '0008_accreditationbatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['-created_at', '-id'], name='inscription_created_id_idx'),
+        ),
+    ]
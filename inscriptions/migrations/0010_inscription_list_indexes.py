@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscriptions', '0009_inscription_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['statut', '-created_at', '-id'], name='inscription_statut_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['type_profil', '-created_at', '-id'], name='inscription_profil_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['evenement', 'statut', '-created_at', '-id'], name='inscription_event_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['nationalite', '-created_at', '-id'], name='inscription_nation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['nom', 'prenom', 'id'], name='inscription_nom_prenom_idx'),
+        ),
+    ]
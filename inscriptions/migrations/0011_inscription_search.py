@@ -0,0 +1,92 @@
+from django.db import migrations
+
+# Index de recherche des inscriptions (voir inscriptions/search.py), selon la base :
+# PostgreSQL : pg_trgm + unaccent, index GIN trigrammes sur une expression ;
+# SQLite : table FTS5 alimentée par triggers. Rien pour les autres bases.
+
+FTS_TABLE = 'inscriptions_inscription_fts'
+SEARCH_FIELDS = ('nom', 'prenom', 'email', 'telephone', 'provenance')
+
+
+def sqlite_phone(column):
+    """Chiffres du téléphone, complets puis les 9 derniers (numéro sans indicatif)."""
+    digits = column
+    for char in (' ', '-', '.', '+', '(', ')', '/'):
+        digits = f"replace({digits}, '{char}', '')"
+    return f"{digits} || ' ' || substr({digits}, -9)"
+
+
+def sqlite_insert(alias):
+    return (
+        f"INSERT INTO {FTS_TABLE}(rowid, nom, prenom, email, telephone, provenance) "
+        f"VALUES ({alias}.id, {alias}.nom, {alias}.prenom, {alias}.email, "
+        f"{sqlite_phone(f'{alias}.telephone')}, {alias}.provenance);"
+    )
+
+
+SQL = {
+    'sqlite': {
+        'forwards': [
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "nom, prenom, email, telephone, provenance, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+            f"INSERT INTO {FTS_TABLE}(rowid, nom, prenom, email, telephone, provenance) "
+            f"SELECT id, nom, prenom, email, {sqlite_phone('telephone')}, provenance FROM inscriptions_inscription",
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON inscriptions_inscription BEGIN "
+            f"{sqlite_insert('new')} END",
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON inscriptions_inscription BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {', '.join(SEARCH_FIELDS)} "
+            f"ON inscriptions_inscription BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; {sqlite_insert('new')} END",
+        ],
+        'backwards': [
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+            f"DROP TABLE IF EXISTS {FTS_TABLE}",
+        ],
+    },
+    'postgresql': {
+        'forwards': [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE EXTENSION IF NOT EXISTS unaccent",
+            # unaccent() n'est pas IMMUTABLE : fonction enveloppe (dictionnaire explicite) pour l'index
+            """
+            CREATE OR REPLACE FUNCTION inscriptions_search_text(
+                nom text, prenom text, email text, telephone text, provenance text
+            ) RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+                SELECT lower(public.unaccent('public.unaccent'::regdictionary, concat_ws(' ',
+                    nom, prenom, email,
+                    regexp_replace(coalesce(telephone, ''), '\\D', '', 'g'),
+                    right(regexp_replace(coalesce(telephone, ''), '\\D', '', 'g'), 9),
+                    provenance)))
+            $$
+            """,
+            "CREATE INDEX inscription_search_trgm_idx ON inscriptions_inscription USING gin ("
+            "inscriptions_search_text(nom, prenom, email, telephone, provenance) gin_trgm_ops)",
+        ],
+        'backwards': [
+            "DROP INDEX IF EXISTS inscription_search_trgm_idx",
+            "DROP FUNCTION IF EXISTS inscriptions_search_text(text, text, text, text, text)",
+        ],
+    },
+}
+
+
+def run_sql(direction):
+    def run(apps, schema_editor):
+        for statement in SQL.get(schema_editor.connection.vendor, {}).get(direction, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inscriptions', '0010_inscription_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql('forwards'), run_sql('backwards')),
+    ]
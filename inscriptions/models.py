@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 import uuid
 import os
 
@@ -84,10 +85,66 @@ class Inscription(models.Model):
     invitation_file = models.FileField(upload_to='invitations/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Notification admin envoyée (email immédiat ou digest, voir admin_digest.py) ; NULL = en attente
+    admin_notified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # clé de la pagination par curseur des listes back-office (pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='inscription_created_id_idx'),
+            # filtres de la liste (filters.filter_inscriptions) suivis du tri par défaut
+            models.Index(fields=['statut', '-created_at', '-id'], name='inscription_statut_created_idx'),
+            models.Index(fields=['type_profil', '-created_at', '-id'], name='inscription_profil_created_idx'),
+            models.Index(fields=['evenement', 'statut', '-created_at', '-id'], name='inscription_event_statut_idx'),
+            models.Index(fields=['nationalite', '-created_at', '-id'], name='inscription_nation_created_idx'),
+            # ?ordering=nom (filters.ORDERINGS)
+            models.Index(fields=['nom', 'prenom', 'id'], name='inscription_nom_prenom_idx'),
+        ]
+
+    # Champs affichés dans la lettre d'invitation (voir utils_letters.letter_context)
+    LETTER_FIELDS = ('nom', 'prenom', 'nationalite', 'provenance', 'type_profil')
 
     def __str__(self):
         return f"{self.nom} {self.prenom} ({self.type_profil})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # valeurs chargées, pour détecter les champs modifiés au save()
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self, fields):
+        """Champs (parmi `fields`) modifiés depuis le chargement depuis la base."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set()
+        deferred = self.get_deferred_fields()
+        return {
+            f for f in fields
+            if f in loaded and f not in deferred and getattr(self, f) != loaded[f]
+        }
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        written = self._meta.concrete_fields
+        if update_fields is not None:
+            # save partiel : seuls ces champs sont en base, les autres restent « modifiés »
+            written = [self._meta.get_field(name) for name in update_fields]
+        letter_changed = self.changed_fields(
+            [f.attname for f in written if f.attname in self.LETTER_FIELDS]
+        )
+        super().save(*args, **kwargs)
+        loaded = getattr(self, '_loaded_values', None) if update_fields is not None else None
+        self._loaded_values = dict(loaded or {})
+        deferred = self.get_deferred_fields()
+        self._loaded_values.update(
+            (f.attname, getattr(self, f.attname)) for f in written if f.attname not in deferred
+        )
+        if letter_changed:
+            from .utils_letters import invalidate_letter_cache
+            invalidate_letter_cache(self)
+
     def mark_validated(self, admin_user=None, remarque=None):
         """
         Helper: mark as Validé and trigger badge/invitation generation.
@@ -138,3 +195,150 @@ class Badge(models.Model):
 
     def __str__(self):
         return f"Badge {self.inscription} - {self.token}"
+
+
+# ---------- AccreditationBatch ----------
+class AccreditationBatch(models.Model):
+    """
+    Validation en masse : un seul job Celery pour toutes les inscriptions du lot.
+    L'avancement par inscription est porté par les AccreditationJob du lot (jobs).
+    """
+    STATE_CHOICES = [
+        ('pending', 'pending'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    action = models.CharField(max_length=20, default='validate')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    task_id = models.CharField(max_length=255, blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Lot {self.action} de {self.total} inscriptions ({self.state})"
+
+
+# ---------- AccreditationJob ----------
+class AccreditationJob(models.Model):
+    """
+    Suivi d'une tâche asynchrone (badge + lettre + email) lancée par la validation.
+    Chaque étape a son propre état, lisible via l'endpoint de statut du job.
+    """
+    KIND_CHOICES = [
+        ('invitation_package', 'invitation_package'),
+        ('confirmation', 'confirmation'),
+    ]
+    STATE_CHOICES = [
+        ('pending', 'pending'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+        ('skipped', 'skipped'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    inscription = models.ForeignKey(Inscription, on_delete=models.CASCADE, related_name='accreditation_jobs')
+    batch = models.ForeignKey(AccreditationBatch, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='invitation_package')
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    badge_state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    letter_state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    email_state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    task_id = models.CharField(max_length=255, blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.kind} {self.inscription_id} ({self.state})"
+
+
+# ---------- OutboundEmail (outbox) ----------
+class OutboundEmail(models.Model):
+    """
+    Email à envoyer, écrit dans la même transaction que le changement de statut
+    et drainé par le dispatcher (inscriptions.outbox) avec retries et backoff.
+    """
+    KIND_CHOICES = [
+        ('invitation_package', 'invitation_package'),
+        ('confirmation', 'confirmation'),
+        ('raw', 'raw'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'pending'),
+        ('sending', 'sending'),
+        ('sent', 'sent'),
+        ('dead', 'dead'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    inscription = models.ForeignKey(Inscription, on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    job = models.ForeignKey(AccreditationJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255, blank=True)
+    body_text = models.TextField(blank=True)
+    body_html = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    provider = models.CharField(max_length=20, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} -> {self.to_email} ({self.status})"
+
+
+# ---------- Broadcast ----------
+def default_broadcast_filters():
+    return {'statut': 'Validé'}
+
+
+class Broadcast(models.Model):
+    """
+    Annonce envoyée à toutes les inscriptions correspondant à `filters`
+    (mêmes paramètres que les listes back-office, voir filters.py).
+    last_inscription_id sert de point de reprise : les destinataires sont parcourus
+    par id croissant et le compteur est enregistré après chaque lot.
+    """
+    STATUS_CHOICES = [
+        ('draft', 'draft'),
+        ('running', 'running'),
+        ('paused', 'paused'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    # Gabarit Django : {{ prenom }}, {{ nom }}, {{ email }}, {{ type_profil }}, ...
+    message = models.TextField()
+    template_name = models.CharField(max_length=255, default='emails/broadcast.html')
+    filters = models.JSONField(default=default_broadcast_filters, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    last_inscription_id = models.BigIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status}, {self.sent_count}/{self.total})"
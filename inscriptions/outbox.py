@@ -0,0 +1,228 @@
+"""
+Outbox des emails transactionnels.
+
+Les emails ne partent plus "une seule fois" depuis la requête ou la tâche : une
+ligne OutboundEmail est écrite dans la même transaction que le changement de
+statut, puis un dispatcher la draine par lots :
+
+  - réservation des lignes dues avec SELECT ... FOR UPDATE SKIP LOCKED (plusieurs
+    dispatchers peuvent tourner en parallèle sans envoyer deux fois) ;
+  - envoi SendGrid puis repli sur le backend email Django, message par message,
+    sur des connexions gardées ouvertes pendant tout le passage (tasks.BulkMailer) ;
+  - en cas d'échec : nouvel essai avec backoff exponentiel (+ gigue), puis
+    dead-letter (statut "dead") après EMAIL_OUTBOX_MAX_ATTEMPTS essais ;
+  - débit limité à EMAIL_OUTBOX_RATE envois par seconde et par dispatcher.
+
+Le contenu des emails "invitation_package" et "confirmation" est reconstruit à
+l'envoi à partir de l'inscription (badge et lettre viennent du cache d'artefacts),
+les emails "raw" portent leur sujet / corps dans la ligne.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------------------------------------
+# Métriques (compteurs du processus + état de la table)
+# ---------------------------------------------------------
+_metrics = {"sent": 0, "retried": 0, "dead": 0, "claimed": 0}
+_metrics_lock = threading.Lock()
+
+
+def _count(name, value=1):
+    with _metrics_lock:
+        _metrics[name] += value
+
+
+def outbox_metrics():
+    """Compteurs du processus courant + nombre de lignes par statut et âge du plus vieux email en attente."""
+    by_status = dict(
+        OutboundEmail.objects.values_list("status").annotate(n=Count("id")).values_list("status", "n")
+    )
+    oldest = OutboundEmail.objects.filter(status="pending").aggregate(oldest=Min("created_at"))["oldest"]
+    with _metrics_lock:
+        counters = dict(_metrics)
+    return {
+        "counters": counters,
+        "by_status": {status: by_status.get(status, 0) for status, _ in OutboundEmail.STATUS_CHOICES},
+        "oldest_pending_seconds": round((timezone.now() - oldest).total_seconds(), 1) if oldest else None,
+    }
+
+
+# ---------------------------------------------------------
+# Écriture (dans la transaction de l'appelant)
+# ---------------------------------------------------------
+def queue_email(kind, to_email, inscription=None, job=None, subject="", body_text="", body_html=""):
+    """
+    Crée la ligne d'outbox. À appeler dans la transaction qui change le statut.
+    job : AccreditationJob (ou son id) dont l'étape email suivra cette ligne.
+    """
+    return OutboundEmail.objects.create(
+        kind=kind,
+        to_email=to_email,
+        inscription=inscription,
+        job_id=getattr(job, "pk", job),
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html,
+    )
+
+
+# ---------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------
+def backoff_delay(attempts):
+    """Délai avant l'essai suivant : base * 2^(essais-1), plafonné, avec ±10 % de gigue."""
+    base = _setting("EMAIL_OUTBOX_BACKOFF_BASE", 30)
+    delay = min(base * 2 ** max(attempts - 1, 0), _setting("EMAIL_OUTBOX_BACKOFF_MAX", 3600))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def claim_batch(batch_size, ids=None):
+    """
+    Réserve jusqu'à batch_size emails dus (statut "sending"). Les lignes restées
+    en "sending" au-delà de EMAIL_OUTBOX_LOCK_TIMEOUT (dispatcher mort) sont reprises.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting("EMAIL_OUTBOX_LOCK_TIMEOUT", 600))
+    due = Q(status="pending", next_attempt_at__lte=now) | Q(status="sending", locked_at__lt=stale)
+    with transaction.atomic():
+        queryset = (
+            OutboundEmail.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("inscription__participant__user")
+            .filter(due)
+        )
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        rows = list(queryset.order_by("next_attempt_at", "id")[:batch_size])
+        if rows:
+            OutboundEmail.objects.filter(pk__in=[row.pk for row in rows]).update(status="sending", locked_at=now)
+    _count("claimed", len(rows))
+    return rows
+
+
+def build_message(row):
+    """Dictionnaire (to, subject, text, html, attachments, reply_to) prêt pour tasks.BulkMailer."""
+    from .tasks import build_confirmation_message, build_invitation_package_message
+
+    if row.kind == "invitation_package":
+        return build_invitation_package_message(row.inscription)
+    if row.kind == "confirmation":
+        return build_confirmation_message(row.inscription)
+    return {
+        "to": row.to_email,
+        "subject": row.subject,
+        "text": row.body_text,
+        "html": row.body_html or None,
+        "attachments": [],
+        "reply_to": getattr(settings, "DEFAULT_FROM_EMAIL", None),
+    }
+
+
+def _update_job(row, **fields):
+    if row.job_id:
+        from .models import AccreditationJob
+        AccreditationJob.objects.filter(pk=row.job_id).update(**fields)
+
+
+def deliver(row, mailer=None):
+    """
+    Envoie une ligne réservée et enregistre le résultat. Retourne le nouveau statut.
+    mailer : tasks.BulkMailer partagé par le lot (connexions SendGrid / SMTP réutilisées).
+    """
+    from .tasks import BulkMailer
+
+    now = timezone.now()
+    attempts = row.attempts + 1
+    provider, error = None, None
+    try:
+        message = build_message(row)
+        if mailer is None:
+            with BulkMailer() as single:
+                result = single.send(message)
+        else:
+            result = mailer.send(message)
+        provider, error = result["provider"], result["error"]
+    except Exception as exc:
+        logger.exception("Outbox email %s could not be built/sent: %s", row.pk, exc)
+        error = str(exc)[:1000]
+
+    if provider:
+        OutboundEmail.objects.filter(pk=row.pk).update(
+            status="sent", attempts=attempts, provider=provider, sent_at=now, locked_at=None, last_error=None,
+        )
+        _update_job(row, state="done", email_state="done", finished_at=now)
+        _count("sent")
+        return "sent"
+
+    if attempts >= _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 6):
+        OutboundEmail.objects.filter(pk=row.pk).update(
+            status="dead", attempts=attempts, locked_at=None, last_error=error,
+        )
+        _update_job(row, state="failed", email_state="failed", error=error, finished_at=now)
+        _count("dead")
+        logger.error("Outbox email %s (%s to %s) dead-lettered after %s attempts: %s",
+                     row.pk, row.kind, row.to_email, attempts, error)
+        return "dead"
+
+    retry_at = now + timedelta(seconds=backoff_delay(attempts))
+    OutboundEmail.objects.filter(pk=row.pk).update(
+        status="pending", attempts=attempts, next_attempt_at=retry_at, locked_at=None, last_error=error,
+    )
+    _update_job(row, email_state="pending", error=error)
+    _count("retried")
+    logger.warning("Outbox email %s failed (attempt %s), retry at %s: %s", row.pk, attempts, retry_at, error)
+    return "pending"
+
+
+def dispatch_outbox(batch_size=None, max_batches=None, ids=None, rate=None):
+    """
+    Draine l'outbox par lots jusqu'à ce qu'il n'y ait plus d'email dû (ou max_batches).
+    ids : se limiter à ces lignes (envoi immédiat après la génération d'un package).
+    Retourne les statistiques du passage.
+    """
+    batch_size = batch_size or _setting("EMAIL_OUTBOX_BATCH_SIZE", 50)
+    rate = rate if rate is not None else _setting("EMAIL_OUTBOX_RATE", 5)
+    interval = 1.0 / rate if rate else 0.0
+    stats = {"claimed": 0, "sent": 0, "pending": 0, "dead": 0}
+    start = time.perf_counter()
+    next_send = time.monotonic()
+    batches = 0
+
+    from .tasks import BulkMailer
+
+    # Connexions ouvertes une fois pour tout le passage, pas une fois par email
+    with BulkMailer() as mailer:
+        while max_batches is None or batches < max_batches:
+            rows = claim_batch(batch_size, ids=ids)
+            if not rows:
+                break
+            batches += 1
+            stats["claimed"] += len(rows)
+            for row in rows:
+                # Limitation du débit : au plus `rate` envois par seconde
+                wait = next_send - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                next_send = max(next_send, time.monotonic()) + interval
+                stats[deliver(row, mailer)] += 1
+
+    stats["elapsed"] = round(time.perf_counter() - start, 3)
+    if stats["claimed"]:
+        logger.info("Outbox dispatch: %s", stats)
+    return stats
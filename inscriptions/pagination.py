@@ -0,0 +1,159 @@
+"""
+Pagination par curseur (keyset) des listes back-office.
+
+Chaque page est lue par un WHERE sur la clé de tri au lieu d'un OFFSET :
+
+  ORDER BY created_at DESC, id DESC
+  WHERE created_at <= :c AND (created_at < :c OR (created_at = :c AND id < :i))
+  LIMIT page_size + 1
+
+Le coût d'une page ne dépend que de sa taille (index inscription_created_id_idx),
+quelle que soit sa position dans la liste, et les pages restent stables quand de
+nouvelles inscriptions arrivent en tête. Le curseur (paramètre ?cursor=) est
+opaque : position (valeurs de la clé du dernier / premier élément) et sens.
+
+La vue peut choisir la clé de tri (get_ordering(), ex. ?ordering=nom, voir
+filters.ORDERINGS) ; un curseur n'est valable que pour la clé qui l'a produit.
+
+Réponse : {"next": url | null, "previous": url | null, "results": [...]},
+comme la CursorPagination de DRF.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Clé de tri unique : le dernier champ doit départager les égalités (id)
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Curseur invalide."
+
+    def get_ordering(self, view=None):
+        """Clé de tri : celle de la vue (view.get_ordering()) ou self.ordering."""
+        get_ordering = getattr(view, "get_ordering", None)
+        return tuple(get_ordering()) if get_ordering else self.ordering
+
+    @staticmethod
+    def key_fields(ordering):
+        """Champs de la clé de tri (à inclure dans tout only())."""
+        return tuple(field.lstrip("-") for field in ordering)
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        try:
+            size = int(value) if value else self.page_size
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # ---------------------------------------------------------
+    # Curseur
+    # ---------------------------------------------------------
+    def encode_cursor(self, instance, reverse, ordering=None):
+        ordering = ordering or self.current_ordering
+        values = [getattr(instance, field) for field in self.key_fields(ordering)]
+        payload = {
+            "o": ",".join(ordering),
+            "r": int(reverse),
+            "v": [v.isoformat() if hasattr(v, "isoformat") else v for v in values],
+        }
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("ascii"))
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode("ascii").rstrip("="))
+
+    def decode_cursor(self, request, model, ordering):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values = payload["v"]
+            if payload.get("o") != ",".join(ordering) or len(values) != len(ordering):
+                raise ValueError(token)
+            fields = self.key_fields(ordering)
+            values = [model._meta.get_field(f).to_python(v) for f, v in zip(fields, values)]
+            return values, bool(payload.get("r"))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(ordering, values):
+        """
+        Lignes situées après `values` dans l'ordre `ordering` (comparaison
+        lexicographique). La borne large sur le premier champ (<= / >=) permet
+        au planificateur de parcourir l'index à partir de la position au lieu
+        de le filtrer en entier.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        first = ordering[0]
+        return Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]}) & condition
+
+    # ---------------------------------------------------------
+    # Page
+    # ---------------------------------------------------------
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        page_size = self.get_page_size(request)
+        ordering = self.current_ordering = self.get_ordering(view)
+        values, reverse = self.decode_cursor(request, queryset.model, ordering)
+
+        if reverse:
+            # page précédente : même requête dans l'ordre inverse, puis remise à l'endroit
+            ordering = tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(ordering, values))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = values is not None if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
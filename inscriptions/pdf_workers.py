@@ -0,0 +1,216 @@
+# inscriptions/pdf_workers.py
+"""
+Pool de workers WeasyPrint "chauds" pour les lettres d'invitation.
+
+Chaque worker est un processus longue durée qui importe WeasyPrint une seule fois,
+garde sa FontConfiguration, les feuilles de style déjà analysées et le cache
+d'images, puis traite les rendus envoyés par la file du ProcessPoolExecutor.
+Le processus web ne fait que rendre le gabarit Django (HTML) et attendre le PDF,
+avec un délai maximum : un rendu bloqué ou un worker qui plante ne bloque pas
+la requête (None est retourné ; après un délai dépassé ou un worker mort, les
+processus du pool sont arrêtés et le pool est recréé à la demande suivante).
+
+Ce module ne dépend pas de Django côté worker (processus lancés en "spawn").
+"""
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# État propre à chaque processus worker
+_worker_state = {}
+
+
+def _init_worker(stylesheet_paths=()):
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    _worker_state["font_config"] = font_config
+    _worker_state["stylesheets"] = {}
+    _worker_state["cache"] = {}
+    _worker_state["CSS"] = CSS
+    _worker_state["HTML"] = HTML
+    for path in stylesheet_paths:
+        _stylesheet(path)
+    # Rendu à blanc : fontconfig / pango / DejaVu sont chargés avant le premier vrai job
+    HTML(string='<p style="font-family: \'DejaVu Sans\'">ECOFEST</p>').write_pdf(font_config=font_config)
+
+
+def _stylesheet(path):
+    """Feuille de style analysée une seule fois par processus."""
+    sheets = _worker_state["stylesheets"]
+    if path not in sheets:
+        sheets[path] = _worker_state["CSS"](filename=path, font_config=_worker_state["font_config"])
+    return sheets[path]
+
+
+def _render_job(html_string, base_url, stylesheets=()):
+    HTML = _worker_state["HTML"]
+    return HTML(string=html_string, base_url=base_url).write_pdf(
+        font_config=_worker_state["font_config"],
+        stylesheets=[_stylesheet(path) for path in stylesheets],
+        cache=_worker_state["cache"],
+    )
+
+
+def _render_batch_job(html_string, base_url, stylesheets, anchors, combined=False):
+    """
+    Une seule mise en page pour plusieurs lettres (séparées par des sauts de page).
+    combined=True : un seul PDF imprimable ; sinon une liste de PDF, un par ancre,
+    découpée d'après la page où apparaît l'ancre de début de chaque lettre.
+    """
+    HTML = _worker_state["HTML"]
+    document = HTML(string=html_string, base_url=base_url).render(
+        font_config=_worker_state["font_config"],
+        stylesheets=[_stylesheet(path) for path in stylesheets],
+        cache=_worker_state["cache"],
+    )
+    if combined:
+        return document.write_pdf()
+
+    wanted = set(anchors)
+    starts = {}
+    for index, page in enumerate(document.pages):
+        for anchor in page.anchors:
+            if anchor in wanted and anchor not in starts:
+                starts[anchor] = index
+    bounds = [starts[anchor] for anchor in anchors] + [len(document.pages)]
+    return [
+        document.copy(document.pages[bounds[i]:bounds[i + 1]]).write_pdf()
+        for i in range(len(anchors))
+    ]
+
+
+_inprocess_lock = threading.Lock()
+
+
+def run_in_process(func, *args):
+    """
+    Exécute un job de rendu dans le processus courant (LETTER_PDF_WORKERS = 0) :
+    polices et feuilles de style restent tout de même chaudes d'un appel à l'autre.
+    """
+    with _inprocess_lock:
+        if not _worker_state:
+            _init_worker()
+        return func(*args)
+
+
+def render_in_process(html_string, base_url, stylesheets=()):
+    return run_in_process(_render_job, html_string, base_url, stylesheets)
+
+
+def render_batch(html_string, base_url, stylesheets, anchors, combined=False):
+    """Rendu en lot via le pool s'il est actif, sinon dans le processus courant (None si échec du pool)."""
+    service = get_pdf_service()
+    args = (html_string, base_url, tuple(stylesheets), list(anchors), combined)
+    if service is not None:
+        return service.run(_render_batch_job, *args)
+    return run_in_process(_render_batch_job, *args)
+
+
+class PDFRenderService:
+    """
+    Façade côté processus web. Le pool est créé à la première demande et
+    recréé si un worker meurt. render() retourne les octets du PDF, ou None
+    en cas d'échec / dépassement du délai.
+    """
+
+    def __init__(self, workers=2, timeout=30, stylesheet_paths=()):
+        self.workers = workers
+        self.timeout = timeout
+        self.stylesheet_paths = tuple(stylesheet_paths)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.stylesheet_paths,),
+                )
+            return self._executor
+
+    def _reset(self, executor, terminate=False):
+        """
+        Abandonne `executor` ; le pool sera recréé à la prochaine demande.
+        terminate=True : tue aussi ses processus (un worker bloqué sur un rendu
+        ne rendrait jamais sa place dans le pool).
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # shutdown() oublie la liste des processus : la relever avant
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        if terminate:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    def submit(self, func, *args):
+        """Soumet un job arbitraire (fonction de module, picklable) ; retourne un Future."""
+        return self._get_executor().submit(func, *args)
+
+    def run(self, func, *args):
+        executor = self._get_executor()
+        try:
+            return executor.submit(func, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            logger.error("PDF render timed out after %ss, restarting the worker pool", self.timeout)
+            self._reset(executor, terminate=True)
+        except BrokenProcessPool as exc:
+            logger.error("PDF worker pool broken, restarting it: %s", exc)
+            self._reset(executor)
+        except Exception as exc:
+            logger.exception("PDF render failed in worker: %s", exc)
+        return None
+
+    def render(self, html_string, base_url, stylesheets=()):
+        return self.run(_render_job, html_string, base_url, tuple(stylesheets))
+
+    def warm_up(self):
+        """Démarre tous les workers maintenant (ex. au démarrage du serveur)."""
+        executor = self._get_executor()
+        futures = [executor.submit(time.sleep, 0) for _ in range(self.workers)]
+        for fut in futures:
+            fut.result(timeout=self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_pdf_service():
+    """
+    Service partagé du processus, configuré par LETTER_PDF_WORKERS (0 = désactivé :
+    rendu dans le processus web comme avant) et LETTER_PDF_TIMEOUT.
+    """
+    global _service
+    from django.conf import settings
+
+    workers = getattr(settings, "LETTER_PDF_WORKERS", 0)
+    if not workers:
+        return None
+    with _service_lock:
+        if _service is None:
+            _service = PDFRenderService(
+                workers=workers,
+                timeout=getattr(settings, "LETTER_PDF_TIMEOUT", 30),
+            )
+            atexit.register(_service.shutdown)
+        return _service
@@ -0,0 +1,127 @@
+"""
+Recherche plein texte des inscriptions (nom, prénom, email, téléphone, provenance)
+pour le back-office : partielle, classée par pertinence, insensible aux accents
+(Ndèye = ndeye, João = joao).
+
+  - PostgreSQL : index GIN trigrammes (pg_trgm) sur une expression
+    inscriptions_search_text(...) = lower(unaccent(nom prenom email chiffres du
+    téléphone provenance)) ; filtre LIKE '%mot%' pour chaque mot (ou proximité
+    <% si faute de frappe), classement par word_similarity.
+  - SQLite : table FTS5 inscriptions_inscription_fts (tokenizer unicode61 sans
+    diacritiques, index de préfixes), tenue à jour par des triggers sur
+    INSERT / UPDATE / DELETE de inscriptions_inscription ; requête par préfixes
+    ("dio"* "awa"*), classement bm25 (nom et prénom pèsent plus).
+  - Autres bases : icontains sur chaque champ, sans classement.
+
+Le schéma (extensions, fonction, index, table FTS5 et triggers) est créé par la
+migration 0011_inscription_search selon la base ; les triggers gardent la table
+FTS5 à jour pour save(), bulk_create() comme QuerySet.update().
+
+Le téléphone est indexé en chiffres seuls, complet et sur ses 9 derniers
+chiffres : "+221 77 123 45 67" est trouvé par "77 123" comme par "22177".
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import Inscription
+
+SEARCH_FIELDS = ("nom", "prenom", "email", "telephone", "provenance")
+FTS_TABLE = "inscriptions_inscription_fts"
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 100
+
+_PHONE_RE = re.compile(r"^[\d\s+().\-/]+$")
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Minuscules sans accents (é -> e, ç -> c) : même forme que l'index."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def query_terms(query):
+    """
+    Mots de la recherche, normalisés. Un numéro de téléphone saisi avec des
+    séparateurs ("77 123 45") donne un seul terme en chiffres.
+    """
+    query = (query or "").strip()
+    if _PHONE_RE.match(query) and sum(c.isdecimal() for c in query) >= MIN_QUERY_LENGTH:
+        return ["".join(c for c in query if c.isdecimal())]
+    return _WORD_RE.findall(normalize(query))
+
+
+# ---------------------------------------------------------
+# Requêtes
+# ---------------------------------------------------------
+def _search_sqlite(cursor, terms, limit):
+    match = " ".join('"{}"*'.format(term.replace('"', "")) for term in terms)
+    # bm25 : plus petit = plus pertinent ; poids nom, prenom, email, telephone, provenance
+    cursor.execute(
+        f"SELECT rowid, -bm25({FTS_TABLE}, 4.0, 4.0, 2.0, 2.0, 1.0) AS rank FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank DESC, rowid DESC LIMIT %s",
+        [match, limit],
+    )
+    return cursor.fetchall()
+
+
+def _search_postgresql(cursor, terms, limit):
+    document = "inscriptions_search_text(nom, prenom, email, telephone, provenance)"
+    text = " ".join(terms)
+    likes = " AND ".join([f"{document} LIKE %s"] * len(terms))
+    patterns = ["%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for term in terms]
+    cursor.execute(
+        f"SELECT id, word_similarity(%s, {document}) AS rank FROM inscriptions_inscription "
+        f"WHERE ({likes}) OR %s <%% {document} "
+        f"ORDER BY rank DESC, id DESC LIMIT %s",
+        [text, *patterns, text, limit],
+    )
+    return cursor.fetchall()
+
+
+def _search_fallback(terms, limit):
+    queryset = Inscription.objects.all()
+    for term in terms:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f"{field}__icontains": term})
+        queryset = queryset.filter(condition)
+    return [(pk, None) for pk in queryset.order_by("nom", "prenom", "id").values_list("id", flat=True)[:limit]]
+
+
+def search_ids(query, limit=20, using="default"):
+    """[(id d'inscription, score)] du plus au moins pertinent ; [] si la recherche est trop courte."""
+    terms = query_terms(query)
+    if any(len(term) > 1 for term in terms):
+        # initiales ("N'Guessan" -> n, guessan) : trop peu sélectives, ignorées
+        terms = [term for term in terms if len(term) > 1]
+    if not terms or sum(len(term) for term in terms) < MIN_QUERY_LENGTH:
+        return []
+    limit = max(1, min(int(limit), MAX_RESULTS))
+
+    connection = connections[using]
+    searcher = {"sqlite": _search_sqlite, "postgresql": _search_postgresql}.get(connection.vendor)
+    if searcher is None:
+        return _search_fallback(terms, limit)
+    with connection.cursor() as cursor:
+        return searcher(cursor, terms, limit)
+
+
+def search_inscriptions(query, limit=20, queryset=None):
+    """
+    Inscriptions correspondant à `query`, classées ; chacune porte son score
+    (search_rank). queryset permet de restreindre les colonnes lues (only()).
+    """
+    ranked = search_ids(query, limit)
+    queryset = Inscription.objects.all() if queryset is None else queryset
+    found = queryset.in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, rank in ranked:
+        inscription = found.get(pk)
+        if inscription is not None:
+            inscription.search_rank = rank
+            results.append(inscription)
+    return results
@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
-from inscriptions.tasks import send_confirmation_email
-from .models import Participant, Inscription, Badge, Evenement
-from django.core.mail import send_mail
-from django.conf import settings
+from inscriptions.tasks import deliver_outbox_emails, enqueue
+from .models import Participant, Inscription, Badge, Evenement, AccreditationBatch, AccreditationJob
+from .admin_digest import notify_new_inscription
+from .outbox import queue_email
+from django.db import transaction
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -66,7 +68,21 @@ class EvenementSerializer(serializers.ModelSerializer):
 # ------------------------
 # INSCRIPTION (ADMIN)
 # ------------------------
-class InscriptionSerializer(serializers.ModelSerializer):
+class SparseFieldsetsMixin:
+    """
+    Serializer(..., fields=[...]) : ne garde que ces champs (paramètre fields=
+    des listes back-office, voir views.SparseFieldsetsViewMixin).
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class InscriptionSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     passeport_file = serializers.FileField(required=False, allow_null=True)
     badge_file = serializers.FileField(read_only=True)
     invitation_file = serializers.FileField(read_only=True)
@@ -86,6 +102,8 @@ class InscriptionSerializer(serializers.ModelSerializer):
         )
 
     def create(self, validated_data):
+        # saisie back-office : pas une inscription publique, jamais dans le digest admin
+        validated_data['admin_notified_at'] = timezone.now()
         return super().create(validated_data)
 
 
@@ -94,6 +112,38 @@ class AdminStatusSerializer(serializers.Serializer):
     admin_remarque = serializers.CharField(allow_blank=True, required=False)
 
 
+class BulkActionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=[('validate', 'validate'), ('refuse', 'refuse')])
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    # mêmes paramètres que les listes back-office : evenement, type_profil, statut, date_from, date_to
+    filters = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('ids') and not attrs.get('filters'):
+            raise serializers.ValidationError("Indiquer des ids ou au moins un filtre.")
+        return attrs
+
+
+class AccreditationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccreditationJob
+        fields = [
+            'id', 'inscription', 'batch', 'kind', 'state', 'badge_state', 'letter_state', 'email_state',
+            'error', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class AccreditationBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccreditationBatch
+        fields = [
+            'id', 'action', 'state', 'total', 'error', 'created_by',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
 class BadgeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Badge
@@ -117,49 +167,38 @@ class PublicInscriptionSerializer(serializers.ModelSerializer):
         read_only_fields = ('statut', 'admin_remarque', 'created_at')
 
     def create(self, validated_data):
-        # 1) Création participant simple
-        participant = Participant.objects.create(user=None, organisation=None)
+        with transaction.atomic():
+            # 1) Création participant simple
+            participant = Participant.objects.create(user=None, organisation=None)
 
-        # 2) Forcer statut
-        validated_data['statut'] = 'En_attente'
+            # 2) Forcer statut
+            validated_data['statut'] = 'En_attente'
 
-        # 3) Créer inscription
-        inscription = Inscription.objects.create(
-            participant=participant,
-            **validated_data
-        )
+            # 3) Créer inscription
+            inscription = Inscription.objects.create(
+                participant=participant,
+                **validated_data
+            )
 
-        # 4) Email confirmation utilisateur
-        try:
-            subject = "Réception de votre inscription – ECOFEST"
-            message = (
+            # 4) Emails (utilisateur + admin) écrits dans l'outbox avec l'inscription :
+            #    envoyés en tâche de fond une fois la transaction validée, pas dans la requête
+            user_message = (
                 f"Bonjour {inscription.prenom},\n\n"
                 "Votre inscription est reçue et en attente de validation.\n"
                 "Vous recevrez un email dès validation.\n\n"
                 "Cordialement,\nL'équipe ECOFEST"
             )
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [inscription.email],
-                fail_silently=True,
-            )
-        except:
-            pass
-
-        # 5) Email admin
-        try:
-            admin_subject = f"[ECOFEST] Nouvelle inscription : {inscription.nom} {inscription.prenom}"
-            admin_message = f"Voir l'admin : /admin/inscriptions/inscription/{inscription.id}/change/"
-            send_mail(
-                admin_subject,
-                admin_message,
-                settings.DEFAULT_FROM_EMAIL,
-                [settings.DEFAULT_FROM_EMAIL],
-                fail_silently=True,
-            )
-        except:
-            pass
+            emails = [queue_email(
+                "raw", inscription.email, inscription=inscription,
+                subject="Réception de votre inscription – ECOFEST", body_text=user_message,
+            )]
+
+            # Email admin immédiat, ou rien si le trafic impose le digest (admin_digest.py)
+            admin_email = notify_new_inscription(inscription)
+            if admin_email is not None:
+                emails.append(admin_email)
 
+            ids = [email.pk for email in emails]
+            transaction.on_commit(lambda: enqueue(deliver_outbox_emails, ids))
 
+        return inscription
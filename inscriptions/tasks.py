@@ -129,21 +129,90 @@
 #     return {"ok": True}
 
 # inscriptions/tasks.py
-import base64
 import logging
 import os
 
 from django.core.mail import EmailMultiAlternatives, EmailMessage
-from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+
+from .attachments import EmailAttachment, as_attachment, file_attachment, sendgrid_body, shared_attachment
+from .templating import inscription_language, render
 
 logger = logging.getLogger(__name__)
 
 
+# ---------------------------------------------------------
+# Tâches asynchrones (Celery si installé, sinon exécution directe)
+# ---------------------------------------------------------
+class _InlineTask:
+    """Remplaçant minimal d'une tâche Celery : .delay() exécute la fonction tout de suite."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        self.func(*args, **kwargs)
+        return None
+
+    def apply_async(self, args=(), kwargs=None, **options):
+        return self.delay(*args, **(kwargs or {}))
+
+
+try:
+    from celery import shared_task
+except Exception as exc:  # Celery absent : les tâches tournent dans le processus appelant
+    logger.warning("Celery not available (%s): tasks will run inline.", exc)
+
+    def shared_task(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return _InlineTask(args[0])
+        return _InlineTask
+
+
+def enqueue(task, *args, job_id=None):
+    """
+    Envoie la tâche dans la file (ou l'exécute directement en mode eager / sans Celery).
+    Si le broker est injoignable, le job est marqué en échec au lieu de faire
+    échouer la requête HTTP.
+    """
+    try:
+        result = task.delay(*args)
+    except Exception as exc:
+        logger.exception("Failed to enqueue %s%s: %s", getattr(task, "name", task), args, exc)
+        if job_id:
+            _update_job(job_id, state="failed", error=f"enqueue failed: {exc}", finished_at=timezone.now())
+        return None
+    task_id = getattr(result, "id", None)
+    if job_id and task_id:
+        # filtre sur task_id vide : en mode eager le job peut déjà être terminé
+        from .models import AccreditationJob
+        AccreditationJob.objects.filter(pk=job_id, task_id__isnull=True).update(task_id=task_id)
+    return task_id
+
+
+def _update_job(job_id, **fields):
+    """Mise à jour atomique (UPDATE) de l'état d'un AccreditationJob ; sans effet si job_id est None."""
+    if not job_id:
+        return
+    from .models import AccreditationJob
+    AccreditationJob.objects.filter(pk=job_id).update(**fields)
+
+
+def _sendgrid_api_key():
+    return getattr(settings, "SENDGRID_API_KEY", None) or os.environ.get("SENDGRID_API_KEY") or os.environ.get("SENDGRID_KEY")
+
+
 def _send_via_sendgrid(to_email, subject, plain_text, html_body, attachments=None, reply_to=None):
     """
     Try to send email via SendGrid if available.
-    attachments: list of tuples (filename, bytes, mime_type)
+    attachments: list of EmailAttachment (or tuples (filename, bytes, mime_type))
     Returns True on success, False otherwise.
     """
     try:
@@ -154,7 +223,7 @@ def _send_via_sendgrid(to_email, subject, plain_text, html_body, attachments=Non
         logger.info("SendGrid client not available: %s", exc)
         return False
 
-    api_key = getattr(settings, "SENDGRID_API_KEY", None) or os.environ.get("SENDGRID_API_KEY") or os.environ.get("SENDGRID_KEY")
+    api_key = _sendgrid_api_key()
     if not api_key:
         logger.info("SendGrid API key not configured, skipping SendGrid send.")
         return False
@@ -176,18 +245,18 @@ def _send_via_sendgrid(to_email, subject, plain_text, html_body, attachments=Non
 
         # Attach files if provided
         if attachments:
-            for filename, content_bytes, mime_type in attachments:
+            for item in attachments:
+                item = as_attachment(item)
                 try:
-                    encoded = base64.b64encode(content_bytes).decode()
                     attachment = Attachment(
-                        FileContent(encoded),
-                        FileName(filename),
-                        FileType(mime_type),
+                        FileContent(item.b64.decode("ascii")),
+                        FileName(item.filename),
+                        FileType(item.mime_type),
                         Disposition("attachment")
                     )
                     message.add_attachment(attachment)
                 except Exception:
-                    logger.exception("Failed to add attachment %s for SendGrid", filename)
+                    logger.exception("Failed to add attachment %s for SendGrid", item.filename)
 
         client = SendGridAPIClient(api_key)
         resp = client.send(message)
@@ -204,28 +273,7 @@ def _send_via_django_backend(to_email, subject, plain_text, html_body, attachmen
     Returns True on success, False otherwise.
     """
     try:
-        msg = EmailMultiAlternatives(
-            subject,
-            plain_text,
-            getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com"),
-            [to_email]
-        )
-        if html_body:
-            msg.attach_alternative(html_body, "text/html")
-        if attachments:
-            for filename, content_bytes, mime_type in attachments:
-                try:
-                    msg.attach(filename, content_bytes, mime_type)
-                except Exception:
-                    logger.exception("Failed to attach %s to django email", filename)
-        if reply_to:
-            try:
-                msg.extra_headers = msg.extra_headers or {}
-                # Some email backends respect 'Reply-To' header
-                msg.extra_headers["Reply-To"] = reply_to
-            except Exception:
-                pass
-
+        msg = _build_django_email(to_email, subject, plain_text, html_body, attachments, reply_to)
         msg.send(fail_silently=False)
         return True
     except Exception as exc:
@@ -233,153 +281,540 @@ def _send_via_django_backend(to_email, subject, plain_text, html_body, attachmen
         return False
 
 
-def send_invitation_package(inscription_id):
+def _build_django_email(to_email, subject, plain_text, html_body, attachments=None, reply_to=None, connection=None):
+    msg = EmailMultiAlternatives(
+        subject,
+        plain_text,
+        getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com"),
+        [to_email],
+        connection=connection,
+    )
+    if html_body:
+        msg.attach_alternative(html_body, "text/html")
+    if attachments:
+        for filename, content_bytes, mime_type in attachments:
+            try:
+                msg.attach(filename, content_bytes, mime_type)
+            except Exception:
+                logger.exception("Failed to attach %s to django email", filename)
+    if reply_to:
+        try:
+            msg.extra_headers = msg.extra_headers or {}
+            # Some email backends respect 'Reply-To' header
+            msg.extra_headers["Reply-To"] = reply_to
+        except Exception:
+            pass
+    return msg
+
+
+# ---------------------------------------------------------
+# Envoi en masse : une connexion par lot, repli par message
+# ---------------------------------------------------------
+class SendGridResponseError(Exception):
     """
-    Generate badge + letter + email package for an inscription.
-    Safe: lazy imports and fallbacks are used so this function does not raise at module import.
+    La requête est partie mais la réponse n'a pas pu être lue (délai, connexion
+    coupée) : SendGrid a pu accepter l'envoi, il ne faut pas le rejouer.
     """
+
+
+def _connection_dropped(conn):
+    """Connexion gardée fermée par le serveur pendant l'inactivité (socket lisible = EOF)."""
+    import select
+
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        return False
     try:
-        # lazy model import
-        from .models import Inscription
-        inscription = Inscription.objects.select_related("participant").get(id=inscription_id)
-    except Exception as exc:
-        logger.exception("Failed to load inscription %s: %s", inscription_id, exc)
-        return {"ok": False, "reason": "missing"}
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class SendGridSession:
+    """
+    Connexion HTTPS keep-alive vers l'API v3 de SendGrid (POST /v3/mail/send),
+    réutilisée pour tous les messages d'un lot : une seule poignée de main TLS
+    au lieu d'une par message (SendGridAPIClient ouvre une connexion par appel).
+    """
+
+    def __init__(self, api_key, base_url=None, timeout=30):
+        from urllib.parse import urlsplit
+
+        url = urlsplit(base_url or getattr(settings, "SENDGRID_API_URL", "https://api.sendgrid.com"))
+        self.scheme, self.host, self.port = url.scheme, url.hostname, url.port
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._conn = None
+
+    def _connection(self):
+        import http.client
+
+        if self._conn is not None and _connection_dropped(self._conn):
+            self.close()
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+            self.connections_opened += 1
+            return self._conn, False
+        return self._conn, True
+
+    def post(self, path, payload):
+        """
+        POST JSON ; retourne (statut HTTP, corps). /v3/mail/send n'est pas idempotent :
+        la requête n'est rejouée (une fois) que si la connexion gardée était déjà fermée
+        avant l'écriture de la requête. Une erreur en lisant la réponse lève
+        SendGridResponseError, sans nouvel essai.
+        """
+        import http.client
+
+        # pièces jointes : octets base64 insérés tels quels, sans recopie par json.dumps
+        chunks, length = sendgrid_body(payload)
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Content-Length": str(length),
+        }
+        while True:
+            conn, reused = self._connection()
+            try:
+                conn.request("POST", path, chunks, headers)
+            except (http.client.RemoteDisconnected, BrokenPipeError):
+                self.close()
+                # connexion keep-alive fermée par le serveur entre deux messages : rien n'a été traité
+                if reused:
+                    continue
+                raise
+            except (http.client.HTTPException, OSError):
+                self.close()
+                raise
+            break
+        try:
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError) as exc:
+            self.close()
+            raise SendGridResponseError(f"no response from SendGrid after the request was sent: {exc!r}") from exc
+        if response.will_close:
+            self.close()
+        return response.status, data
+
+    def send(self, message):
+        status_code, data = self.post("/v3/mail/send", sendgrid_payload(message))
+        if 200 <= status_code < 300:
+            return None
+        return f"SendGrid HTTP {status_code}: {data[:300].decode('utf-8', 'replace')}"
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def sendgrid_payload(message):
+    """Corps JSON de /v3/mail/send pour un message (to, subject, text, html, attachments, reply_to)."""
+    content = [{"type": "text/plain", "value": message.get("text") or " "}]
+    if message.get("html"):
+        content.append({"type": "text/html", "value": message["html"]})
+    payload = {
+        "personalizations": [{"to": [{"email": message["to"]}]}],
+        "from": {"email": getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com")},
+        "subject": message["subject"],
+        "content": content,
+    }
+    if message.get("reply_to"):
+        payload["reply_to"] = {"email": message["reply_to"]}
+    if message.get("attachments"):
+        # "content" reste un EmailAttachment : encodé une fois, sérialisé par attachments.sendgrid_body
+        payload["attachments"] = [
+            {
+                "content": attachment,
+                "filename": attachment.filename,
+                "type": attachment.mime_type,
+                "disposition": "attachment",
+            }
+            for attachment in map(as_attachment, message["attachments"])
+        ]
+    return payload
+
+
+class BulkMailer:
+    """
+    Envoie une série de messages en gardant les connexions ouvertes :
+    une session SendGrid (si une clé est configurée) et une connexion du backend
+    email Django (get_connection), ouverte au premier besoin. Chaque message
+    essaie les fournisseurs dans l'ordre ; le repli se fait message par message.
+    À utiliser comme gestionnaire de contexte (fermeture des connexions).
+    """
+
+    def __init__(self, providers=("sendgrid", "django")):
+        api_key = _sendgrid_api_key()
+        self.providers = [p for p in providers if p != "sendgrid" or api_key]
+        self.sendgrid = SendGridSession(api_key) if api_key and "sendgrid" in providers else None
+        self._django = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _django_connection(self):
+        from django.core.mail import get_connection
+
+        if self._django is None:
+            self._django = get_connection(fail_silently=False)
+            self._django.open()
+        return self._django
+
+    def _send_django(self, message):
+        connection = self._django_connection()
+        try:
+            _build_django_email(
+                message["to"], message["subject"], message["text"], message.get("html"),
+                message.get("attachments"), message.get("reply_to"), connection=connection,
+            ).send(fail_silently=False)
+        except Exception:
+            # connexion SMTP peut-être cassée : la suivante sera rouverte
+            self._close_django()
+            raise
+
+    def send(self, message, providers=None):
+        """
+        Retourne {"to", "ok", "provider", "error"} pour un message.
+        providers : restreindre les fournisseurs pour cet envoi (ex. ("django",) en repli).
+        """
+        errors = []
+        for provider in self.providers:
+            if providers is not None and provider not in providers:
+                continue
+            try:
+                if provider == "sendgrid":
+                    error = self.sendgrid.send(message)
+                    if error:
+                        raise RuntimeError(error)
+                else:
+                    self._send_django(message)
+                return {"to": message["to"], "ok": True, "provider": provider, "error": None}
+            except Exception as exc:
+                logger.warning("Bulk send via %s failed for %s: %s", provider, message.get("to"), exc)
+                errors.append(f"{provider}: {exc}")
+        return {"to": message["to"], "ok": False, "provider": None, "error": "; ".join(errors) or "no provider"}
+
+    def _close_django(self):
+        if self._django is not None:
+            try:
+                self._django.close()
+            except Exception:
+                pass
+            self._django = None
+
+    def close(self):
+        if self.sendgrid is not None:
+            self.sendgrid.close()
+        self._close_django()
+
+
+def send_messages_bulk(messages, providers=("sendgrid", "django"), before_send=None):
+    """
+    Envoie de nombreux messages sur des connexions réutilisées (voir BulkMailer).
+    messages : itérable de dicts (to, subject, text, html, attachments, reply_to).
+    before_send : appelé avant chaque message (ex. limitation de débit).
+    Retourne la liste des résultats par message, dans l'ordre.
+    """
+    results = []
+    with BulkMailer(providers) as mailer:
+        for message in messages:
+            if before_send is not None:
+                before_send()
+            results.append(mailer.send(message))
+    return results
+
+
+def _job_guard(func):
+    """Toute exception imprévue termine le job en échec (au lieu de le laisser "running")."""
+    def wrapper(inscription_id, job_id=None):
+        try:
+            return func(inscription_id, job_id)
+        except Exception as exc:
+            logger.exception("%s failed for inscription %s: %s", func.__name__, inscription_id, exc)
+            _update_job(job_id, state="failed", error=str(exc)[:1000], finished_at=timezone.now())
+            return {"ok": False, "reason": "error"}
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__module__ = func.__module__
+    return wrapper
+
 
-    # Lazy import helpers that may rely on heavy libs
+def _package_generators():
+    """Générateurs badge / lettre, importés à la demande (bibliothèques lourdes, optionnelles)."""
     try:
-        from .utils_badges import generate_badge
+        from .utils_badges import get_or_generate_badge
     except Exception as exc:
         logger.warning("Badge generator not available: %s", exc)
-        generate_badge = None
+        get_or_generate_badge = None
 
     try:
         # import PDF generator lazily
-        from .utils_letters import generate_invitation_letter_pdf
+        from .utils_letters import get_or_generate_letter
     except Exception as exc:
         logger.warning("Invitation letter generator not available: %s", exc)
-        generate_invitation_letter_pdf = None
+        get_or_generate_letter = None
+    return get_or_generate_badge, get_or_generate_letter
 
-    # 1) Generate badge (if possible)
-    badge_path = None
-    if generate_badge:
-        try:
-            badge_path = generate_badge(inscription)
-        except Exception as exc:
-            logger.exception("Badge generation failed for inscription %s: %s", inscription_id, exc)
-            badge_path = None
 
-    # 2) Generate letter PDF (if possible)
-    letter_path = None
-    if generate_invitation_letter_pdf:
-        try:
-            # attempt to save to MEDIA_ROOT/letters as before
-            letter_path = generate_invitation_letter_pdf(inscription)
-        except Exception as exc:
-            logger.exception("Invitation PDF generation failed for inscription %s: %s", inscription_id, exc)
-            letter_path = None
+def _shared_package_attachments():
+    """Pièces jointes communes à tous les packages (INVITATION_SHARED_ATTACHMENTS), lues une fois par processus."""
+    attachments = []
+    for path in getattr(settings, "INVITATION_SHARED_ATTACHMENTS", []):
+        attachment = shared_attachment(path)
+        if attachment is not None:
+            attachments.append(attachment)
+    return attachments
 
-    # Prepare attachments list (filename, bytes, mime_type)
+
+def build_invitation_package_message(inscription):
+    """
+    Email du package d'accréditation. Badge et lettre sont relus depuis le cache
+    d'artefacts (déjà rendus par send_invitation_package) : un nouvel essai
+    d'envoi ne refait aucun rendu. Les fichiers ne sont lus qu'à l'envoi.
+    Un artefact qui ne peut pas être produit (ex. fond de badge manquant) est
+    journalisé et omis : l'email part avec les autres pièces jointes.
+    """
+    get_or_generate_badge, get_or_generate_letter = _package_generators()
     attachments = []
-    if badge_path:
+    artifacts = (
+        (get_or_generate_badge, f"badge_{inscription.id}.png", "image/png"),
+        (get_or_generate_letter, f"invitation_{inscription.id}.pdf", "application/pdf"),
+    )
+    for generate, filename, mime_type in artifacts:
+        if not generate:
+            continue
         try:
-            with open(badge_path, "rb") as f:
-                attachments.append((os.path.basename(badge_path), f.read(), "image/png"))
-        except Exception:
-            logger.exception("Failed to read badge file %s", badge_path)
+            path = generate(inscription)
+        except Exception as exc:
+            logger.exception("Could not generate %s for inscription %s, sending without it: %s",
+                             filename, inscription.id, exc)
+            continue
+        if path:
+            attachments.append(file_attachment(path, filename, mime_type))
+    attachments += _shared_package_attachments()
+
+    return {
+        "to": inscription.email,
+        "subject": "ECOFEST 2025 — Votre accréditation est confirmée !",
+        "text": (
+            f"Bonjour {inscription.prenom},\n\n"
+            "Veuillez trouver ci-joint votre badge et votre lettre d'invitation."
+        ),
+        "html": render("emails/confirmation_full.html", {"inscription": inscription}, lang=inscription_language(inscription)),
+        "attachments": [a for a in attachments if a],
+        "reply_to": getattr(settings, "DEFAULT_FROM_EMAIL", None),
+    }
 
-    if letter_path:
+
+def build_confirmation_message(inscription):
+    lang = inscription_language(inscription)
+    ctx = {
+        "inscription": inscription,
+        "participant": getattr(inscription, "participant", None),
+        "event": getattr(inscription, "evenement", None),
+        "site_url": getattr(settings, "SITE_URL", "https://ecofest.app"),
+    }
+
+    # If invitation_file present, attach it (read at send time when stored on disk)
+    attachments = []
+    invitation_file = getattr(inscription, "invitation_file", None)
+    if invitation_file:
+        filename = f"invitation_{inscription.id}.pdf"
         try:
-            # letter_path may be bytes or a filepath
-            if isinstance(letter_path, (bytes, bytearray)):
-                attachments.append((f"invitation_{inscription.id}.pdf", letter_path, "application/pdf"))
-            else:
-                with open(letter_path, "rb") as f:
-                    attachments.append((os.path.basename(letter_path), f.read(), "application/pdf"))
-        except Exception:
-            logger.exception("Failed to read letter file %s", letter_path)
+            attachments.append(file_attachment(invitation_file.path, filename, "application/pdf"))
+        except NotImplementedError:
+            # stockage distant : pas de chemin local, lecture immédiate
+            try:
+                with invitation_file.open("rb") as f:
+                    attachments.append(EmailAttachment(filename, "application/pdf", content=f.read()))
+            except Exception:
+                logger.exception("Failed to read invitation_file for inscription %s", inscription.id)
+
+    return {
+        "to": inscription.email,
+        "subject": "Réception de votre inscription – ECOFEST",
+        "text": render("emails/confirmation_full.txt", ctx, lang=lang),
+        "html": render("emails/confirmation_full.html", ctx, lang=lang),
+        "attachments": [a for a in attachments if a],
+        "reply_to": getattr(settings, "DEFAULT_FROM_EMAIL", None),
+    }
 
-    # 3) Try to send via SendGrid first (if available), else Django backend
-    subject = "ECOFEST 2025 — Votre accréditation est confirmée !"
-    plain_text = (
-        f"Bonjour {inscription.prenom},\n\n"
-        "Veuillez trouver ci-joint votre badge et votre lettre d'invitation."
-    )
-    html_body = render_to_string("emails/confirmation_full.html", {"inscription": inscription})
 
-    reply_to = getattr(settings, "DEFAULT_FROM_EMAIL", None)
+def _send_through_outbox(kind, inscription, job_id=None):
+    """
+    Envoie tout de suite l'email de l'outbox rattaché au job (créé ici s'il n'existe
+    pas, ex. appel direct sans job) ; en cas d'échec la ligne reste dans l'outbox
+    et le dispatcher la réessaiera.
+    La ligne du job est reprise quel que soit son statut : si le dispatcher périodique
+    l'a déjà envoyée (ou est en train de le faire), ou si la tâche est relivrée
+    (acks_late) après un envoi réussi, l'email ne part pas une deuxième fois.
+    """
+    from .models import OutboundEmail
+    from .outbox import dispatch_outbox, queue_email
+
+    row = None
+    if job_id:
+        row = OutboundEmail.objects.filter(kind=kind, inscription=inscription, job_id=job_id).order_by("pk").first()
+    if row is None:
+        row = queue_email(kind, inscription.email, inscription=inscription, job=job_id)
+    elif row.status == "sent":
+        # déjà envoyé hors de cette tâche : le job a pu repasser en "running" entre-temps
+        _update_job(job_id, state="done", email_state="done", finished_at=row.sent_at or timezone.now())
+        return {"ok": True}
+    elif row.status == "dead":
+        _update_job(job_id, state="failed", email_state="failed", error=row.last_error, finished_at=timezone.now())
+        return {"ok": False, "reason": "send_failed"}
 
-    sent = False
+    if row.status == "pending":
+        dispatch_outbox(ids=[row.pk])
+        row.refresh_from_db(fields=["status"])
+    if row.status == "sent":
+        return {"ok": True}
+    if row.status == "sending":
+        # un autre dispatcher est en train de l'envoyer : il mettra le job à jour
+        return {"ok": False, "reason": "in_progress", "retry": True}
+    if row.status == "pending":
+        return {"ok": False, "reason": "send_failed", "retry": True}
+    return {"ok": False, "reason": "send_failed"}
+
+
+@shared_task(acks_late=True)
+@_job_guard
+def send_invitation_package(inscription_id, job_id=None):
+    """
+    Generate badge + letter + email package for an inscription.
+    Safe: lazy imports and fallbacks are used so this function does not raise at module import.
+    job_id: optional AccreditationJob updated stage by stage (badge, letter, email).
+    The email itself goes through the outbox (retries with backoff, see outbox.py).
+    """
+    _update_job(job_id, state="running", started_at=timezone.now())
     try:
-        sent = _send_via_sendgrid(inscription.email, subject, plain_text, html_body, attachments=attachments, reply_to=reply_to)
-    except Exception:
-        sent = False
+        # lazy model import
+        from .models import Inscription
+        inscription = Inscription.objects.select_related("participant").get(id=inscription_id)
+    except Exception as exc:
+        logger.exception("Failed to load inscription %s: %s", inscription_id, exc)
+        _update_job(job_id, state="failed", badge_state="skipped", letter_state="skipped",
+                    email_state="skipped", error="missing", finished_at=timezone.now())
+        return {"ok": False, "reason": "missing"}
+
+    get_or_generate_badge, get_or_generate_letter = _package_generators()
 
-    if not sent:
-        # Fallback to Django email backend
+    # 1) Generate badge (if possible)
+    badge_path = None
+    if get_or_generate_badge:
+        _update_job(job_id, badge_state="running")
         try:
-            sent = _send_via_django_backend(inscription.email, subject, plain_text, html_body, attachments=attachments, reply_to=reply_to)
-        except Exception:
-            sent = False
+            badge_path = get_or_generate_badge(inscription)
+        except Exception as exc:
+            logger.exception("Badge generation failed for inscription %s: %s", inscription_id, exc)
+            badge_path = None
+    _update_job(job_id, badge_state="done" if badge_path else ("failed" if get_or_generate_badge else "skipped"))
 
-    if not sent:
-        logger.warning("Failed to send invitation package for inscription %s (both SendGrid and Django backend failed or unavailable).", inscription_id)
-        return {"ok": False, "reason": "send_failed"}
+    # 2) Generate letter PDF (if possible)
+    letter_path = None
+    if get_or_generate_letter:
+        _update_job(job_id, letter_state="running")
+        try:
+            # cached PDF reused unless a letter field or the template changed
+            letter_path = get_or_generate_letter(inscription)
+        except Exception as exc:
+            logger.exception("Invitation PDF generation failed for inscription %s: %s", inscription_id, exc)
+            letter_path = None
+    _update_job(job_id, letter_state="done" if letter_path else ("failed" if get_or_generate_letter else "skipped"))
 
-    logger.info("Invitation package sent for inscription %s", inscription_id)
-    return {"ok": True}
+    # 3) Email via the outbox (SendGrid, then Django backend; retried later on failure)
+    _update_job(job_id, email_state="running")
+    result = _send_through_outbox("invitation_package", inscription, job_id=job_id)
+    if result["ok"]:
+        logger.info("Invitation package sent for inscription %s", inscription_id)
+    else:
+        logger.warning("Invitation package for inscription %s not sent yet (left in the outbox).", inscription_id)
+    return result
 
 
-def send_confirmation_email(inscription_id):
+@shared_task(acks_late=True)
+@_job_guard
+def send_confirmation_email(inscription_id, job_id=None):
     """
     Send confirmation email for an inscription without necessarily attachments.
     Safe: lazy imports and fallbacks are used.
     """
+    _update_job(job_id, state="running", badge_state="skipped", letter_state="skipped",
+                email_state="running", started_at=timezone.now())
     try:
         from .models import Inscription
         ins = Inscription.objects.select_related("participant").get(pk=inscription_id)
     except Exception as exc:
         logger.exception("Inscription not found: %s", exc)
+        _update_job(job_id, state="failed", email_state="skipped", error="missing", finished_at=timezone.now())
         return {"ok": False, "reason": "missing"}
 
-    ctx = {
-        "inscription": ins,
-        "participant": getattr(ins, "participant", None),
-        "event": getattr(ins, "evenement", None),
-        "site_url": getattr(settings, "SITE_URL", "https://ecofest.app"),
-    }
+    result = _send_through_outbox("confirmation", ins, job_id=job_id)
+    if not result["ok"]:
+        logger.warning("Confirmation email for inscription %s not sent yet (left in the outbox).", inscription_id)
+    return result
 
-    subject = "Réception de votre inscription – ECOFEST"
-    text_body = render_to_string("emails/confirmation_full.txt", ctx)
-    html_body = render_to_string("emails/confirmation_full.html", ctx)
 
-    # If invitation_file present, attach its bytes
-    attachments = []
-    invitation_file = getattr(ins, "invitation_file", None)
-    if invitation_file:
-        try:
-            with invitation_file.open("rb") as f:
-                attachments.append((f"invitation_{ins.id}.pdf", f.read(), "application/pdf"))
-        except Exception:
-            logger.exception("Failed to read invitation_file for inscription %s", inscription_id)
+@shared_task(acks_late=True)
+def deliver_outbox_emails(ids):
+    """Envoi immédiat de lignes d'outbox précises (ex. emails d'inscription, après commit)."""
+    from .outbox import dispatch_outbox
+    return dispatch_outbox(ids=list(ids))
+
 
-    reply_to = getattr(settings, "DEFAULT_FROM_EMAIL", None)
+@shared_task(acks_late=True)
+def send_invitation_packages_batch(batch_id):
+    """Validation en masse : badges ‖ lettres puis emails du lot (voir bulk_actions.py)."""
+    from .bulk_actions import run_accreditation_batch
+    from .models import AccreditationBatch
 
-    # Try SendGrid first
-    sent = False
     try:
-        sent = _send_via_sendgrid(ins.email, subject, text_body, html_body, attachments=attachments, reply_to=reply_to)
-    except Exception:
-        sent = False
+        batch = AccreditationBatch.objects.get(pk=batch_id)
+    except AccreditationBatch.DoesNotExist:
+        logger.error("Accreditation batch %s not found", batch_id)
+        return {"ok": False, "reason": "missing"}
+    try:
+        progress = run_accreditation_batch(batch)
+    except Exception as exc:
+        logger.exception("Accreditation batch %s failed: %s", batch_id, exc)
+        AccreditationBatch.objects.filter(pk=batch_id).update(
+            state="failed", error=str(exc)[:1000], finished_at=timezone.now(),
+        )
+        return {"ok": False, "reason": "error"}
+    return {"ok": True, "progress": progress["progress"]}
 
-    if not sent:
-        try:
-            sent = _send_via_django_backend(ins.email, subject, text_body, html_body, attachments=attachments, reply_to=reply_to)
-        except Exception:
-            sent = False
 
-    if not sent:
-        logger.warning("Failed to send confirmation email for inscription %s", inscription_id)
-        return {"ok": False, "reason": "send_failed"}
+@shared_task
+def dispatch_outbox_task(batch_size=None, max_batches=None):
+    """Passage périodique du dispatcher (Celery beat, voir CELERY_BEAT_SCHEDULE)."""
+    from .outbox import dispatch_outbox
+    return dispatch_outbox(batch_size=batch_size, max_batches=max_batches)
+
+
+@shared_task
+def send_admin_digest_task():
+    """Digest des inscriptions non notifiées (Celery beat, toutes les ADMIN_DIGEST_WINDOW_MINUTES)."""
+    from .admin_digest import send_admin_digest
+    email, count = send_admin_digest()
+    return {"inscriptions": count, "email_id": email.pk if email else None}
+
+
+@shared_task(acks_late=True)
+def send_broadcast_task(broadcast_id):
+    """Envoie (ou reprend au dernier point de reprise) une annonce, voir broadcast.py."""
+    from .broadcast import run_broadcast
+    from .models import Broadcast
 
-    return {"ok": True}
+    broadcast = Broadcast.objects.get(pk=broadcast_id)
+    if broadcast.status == "done":
+        return {"ok": True, "sent": broadcast.sent_count}
+    broadcast = run_broadcast(broadcast)
+    return {"ok": broadcast.status == "done", "sent": broadcast.sent_count, "failed": broadcast.failed_count}
@@ -0,0 +1,113 @@
+"""
+Rendu des gabarits transactionnels (emails, lettre d'invitation).
+
+Les gabarits passent par le loader "cached" déclaré explicitement dans TEMPLATES
+(APP_DIRS désactivé) : chaque fichier est lu et compilé une fois par processus.
+Par-dessus, ce module retient pour chaque (gabarit, langue) la variante choisie,
+sans refaire la recherche des fichiers à chaque envoi :
+
+  emails/confirmation_full.html en EN -> emails/confirmation_full.en.html si elle
+  existe, sinon emails/confirmation_full.html (les gabarits de base sont en
+  TEMPLATE_DEFAULT_LANGUAGE, FR).
+
+La langue d'une inscription est le langue_pref de son compte (participant.user) ;
+une inscription publique sans compte reçoit la langue par défaut.
+
+render_many() rend un gabarit pour une liste de contextes (campagnes, lots)
+avec un seul Context réutilisé (push / pop) au lieu d'un par appel.
+
+En développement, le cache est vidé quand un gabarit change (autoreload) ou
+quand TEMPLATES est modifié (tests).
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context
+from django.template.loader import select_template
+from django.utils.autoreload import file_changed
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def default_language():
+    return getattr(settings, "TEMPLATE_DEFAULT_LANGUAGE", "FR")
+
+
+def normalize_language(lang):
+    return (lang or "").strip().upper()[:2] or default_language()
+
+
+def variant_names(name, lang=None):
+    """Noms essayés, du plus spécifique au gabarit de base."""
+    lang = normalize_language(lang)
+    if lang == default_language():
+        return [name]
+    base, ext = os.path.splitext(name)
+    return [f"{base}.{lang.lower()}{ext}", name]
+
+
+def get_template(name, lang=None):
+    """Gabarit compilé (variante de langue résolue une fois par processus)."""
+    key = (name, normalize_language(lang))
+    template = _resolved.get(key)
+    if template is None:
+        template = select_template(variant_names(name, lang))
+        with _lock:
+            template = _resolved.setdefault(key, template)
+    return template
+
+
+def render(name, context=None, lang=None):
+    """Équivalent de render_to_string(name, context) pour la langue lang."""
+    return get_template(name, lang).render(context)
+
+
+def render_many(name, contexts, languages=None):
+    """
+    Rend name pour chaque contexte, dans l'ordre. languages : langue de chaque
+    contexte (même longueur) ou None pour la langue par défaut.
+    """
+    contexts = list(contexts)
+    languages = [None] * len(contexts) if languages is None else [normalize_language(lang) for lang in languages]
+    output = [None] * len(contexts)
+
+    by_language = {}
+    for index, lang in enumerate(languages):
+        by_language.setdefault(lang, []).append(index)
+
+    for lang, indexes in by_language.items():
+        template = get_template(name, lang).template
+        context = Context(autoescape=template.engine.autoescape)
+        for index in indexes:
+            with context.push(contexts[index] or {}):
+                output[index] = template.render(context)
+    return output
+
+
+def inscription_language(inscription):
+    """Langue des emails d'une inscription : langue_pref du compte, sinon langue par défaut."""
+    participant = getattr(inscription, "participant", None)
+    user = getattr(participant, "user", None)
+    return normalize_language(getattr(user, "langue_pref", None))
+
+
+def clear_template_cache():
+    with _lock:
+        _resolved.clear()
+
+
+@receiver(setting_changed, dispatch_uid="inscriptions.templating.setting_changed")
+def _reset_on_setting_change(setting, **kwargs):
+    if setting in ("TEMPLATES", "TEMPLATE_DEFAULT_LANGUAGE"):
+        clear_template_cache()
+
+
+@receiver(file_changed, dispatch_uid="inscriptions.templating.file_changed")
+def _reset_on_template_change(sender, file_path, **kwargs):
+    # ne retourne rien : laisse Django décider du redémarrage
+    if file_path.suffix != ".py":
+        clear_template_cache()
@@ -1,3 +1,682 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import re
+import socket
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from smtplib import SMTPException
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import qrcode
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageDraw
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from . import admin_digest, broadcast, outbox, tasks, utils_badges, utils_export, utils_letters
+from .filters import ORDERINGS, filter_inscriptions, ordering_for
+from .management.commands.benchmark import (
+    SAMPLE_FIRST_NAMES, SAMPLE_LAST_NAMES, _split_name_by_pixels_legacy,
+)
+from .models import AccreditationJob, Evenement, Inscription, OutboundEmail, Participant
+from .pagination import KeysetPagination
+from .serializers import InscriptionSerializer, PublicInscriptionSerializer
+
+
+class InscriptionListQueryPlanTests(TestCase):
+    """
+    Les filtres et tris de la liste back-office (filters.py + pagination par
+    curseur) doivent passer par les index de Inscription, sur SQLite comme sur
+    PostgreSQL.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.evenement = Evenement.objects.create(nom="Ecofest")
+        participant = Participant.objects.create()
+        profils = [value for value, _ in Inscription.PROFILE_CHOICES]
+        statuts = [value for value, _ in Inscription.STATUS_CHOICES]
+        Inscription.objects.bulk_create([
+            Inscription(
+                participant=participant, evenement=cls.evenement if i % 2 else None,
+                nom=f"Nom{i:04d}", prenom="Prénom", email=f"plan-{i}@example.com",
+                nationalite="Sénégalaise" if i % 3 else "Ivoirienne",
+                type_profil=profils[i % len(profils)], statut=statuts[i % len(statuts)],
+            )
+            for i in range(300)
+        ])
+
+    def page_sql_plan(self, params, after=True):
+        """Plan de la requête d'une page (avec position de curseur si after=True)."""
+        ordering = ordering_for(params)
+        queryset = filter_inscriptions(Inscription.objects.all(), params).order_by(*ordering)
+        if after:
+            anchor = queryset[queryset.count() // 2]
+            values = [getattr(anchor, f) for f in KeysetPagination.key_fields(ordering)]
+            queryset = queryset.filter(KeysetPagination.after(ordering, values))
+        if connection.vendor == "postgresql":
+            # table minuscule : sans cela PostgreSQL préfère toujours un seq scan
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset[:KeysetPagination.page_size + 1].explain()
+
+    def test_list_queries_use_indexes(self):
+        cases = [
+            ({}, "inscription_created_id_idx"),
+            ({"ordering": "created_at"}, "inscription_created_id_idx"),
+            ({"statut": "Validé"}, "inscription_statut_created_idx"),
+            ({"type_profil": "Presse"}, "inscription_profil_created_idx"),
+            ({"evenement": str(self.evenement.pk), "statut": "Validé"}, "inscription_event_statut_idx"),
+            ({"nationalite": "Ivoirienne"}, "inscription_nation_created_idx"),
+            ({"ordering": "nom"}, "inscription_nom_prenom_idx"),
+            ({"ordering": "-nom"}, "inscription_nom_prenom_idx"),
+            ({"date_from": date.today().isoformat()}, "inscription_created_id_idx"),
+        ]
+        for params, index in cases:
+            for after in (False, True):
+                with self.subTest(params=params, after=after):
+                    plan = self.page_sql_plan(params, after=after)
+                    self.assertIn(index, plan)
+                    if connection.vendor == "sqlite":
+                        # tri servi par l'index, pas de B-tree temporaire
+                        self.assertNotIn("USE TEMP B-TREE", plan)
+
+    def test_unknown_ordering_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ordering_for({"ordering": "telephone"})
+
+
+
+class KeysetPaginationTests(TestCase):
+    """Parcours de la liste back-office par curseur, dans les deux sens."""
+    url = "/api/admin/inscriptions/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user("staff", password="x", is_staff=True)
+        participant = Participant.objects.create()
+        Inscription.objects.bulk_create([
+            Inscription(participant=participant, nom=f"Nom{i % 4}", prenom="Awa" if i % 3 else "Binta",
+                        email=f"page-{i}@example.com", type_profil="Festivaliers")
+            for i in range(23)
+        ])
+        # plusieurs lignes par created_at : seul l'id départage
+        start = timezone.now()
+        for index, pk in enumerate(Inscription.objects.order_by("id").values_list("id", flat=True)):
+            Inscription.objects.filter(pk=pk).update(created_at=start - timedelta(minutes=index // 5))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def walk(self, url, direction="next"):
+        """Ids rencontrés en suivant les liens `direction` ; dernier lien de l'autre sens."""
+        pages = []
+        while url:
+            # un curseur qui n'avance pas bouclerait indéfiniment
+            self.assertLessEqual(len(pages), Inscription.objects.count())
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["id"] for row in response.data["results"]])
+            url = response.data[direction]
+            last = response.data
+        if direction == "previous":
+            pages.reverse()
+        return [pk for page in pages for pk in page], last
+
+    def test_pages_have_no_duplicates_or_gaps(self):
+        for ordering, key in ORDERINGS.items():
+            with self.subTest(ordering=ordering):
+                expected = list(Inscription.objects.order_by(*key).values_list("id", flat=True))
+                forward, last_page = self.walk(f"{self.url}?ordering={ordering}&page_size=4")
+                self.assertEqual(forward, expected)
+                # retour depuis la dernière page : mêmes lignes, même ordre
+                backward, _ = self.walk(last_page["previous"], direction="previous")
+                self.assertEqual(backward + [row["id"] for row in last_page["results"]], expected)
+
+    def first_cursor(self):
+        next_url = self.client.get(f"{self.url}?page_size=4").data["next"]
+        return parse_qs(urlsplit(next_url).query)["cursor"][0]
+
+    def test_tampered_cursor_is_rejected(self):
+        token = self.first_cursor()
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        payload["v"][0] = "pas une date"
+        forged = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+        for cursor in (forged, token[:-3], "%%%"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.url, {"cursor": cursor}).status_code, 404)
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        response = self.client.get(self.url, {"cursor": self.first_cursor(), "ordering": "nom"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_fields_limit_the_output_and_keep_paging(self):
+        expected = list(Inscription.objects.order_by("nom", "prenom", "id").values_list("id", flat=True))
+        url = f"{self.url}?ordering=nom&fields=id,email&page_size=5"
+        ids = []
+        while url:
+            self.assertLessEqual(len(ids), len(expected))
+            response = self.client.get(url)
+            self.assertTrue(all(set(row) == {"id", "email"} for row in response.data["results"]))
+            ids += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.client.get(self.url, {"fields": "id,inconnu"}).status_code, 400)
+
+
+class InscriptionFilterValidationTests(TestCase):
+    """Paramètres invalides : 400 (ValidationError), jamais 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user("staff", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_impossible_date_is_rejected(self):
+        for param in ("date_from", "date_to"):
+            with self.subTest(param=param), self.assertRaises(ValidationError):
+                filter_inscriptions(Inscription.objects.all(), {param: "2025-02-30"})
+
+    def test_non_ascii_digits_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            filter_inscriptions(Inscription.objects.all(), {"evenement": "²"})
+
+    def test_endpoints_answer_400(self):
+        for url in (
+            "/api/admin/inscriptions/?date_from=2025-02-30",
+            "/api/admin/inscriptions/?evenement=%C2%B2",
+            "/api/admin/inscriptions/export/?date_to=2025-02-30",
+            "/api/admin/inscriptions/search/?q=diop&limit=%C2%B2",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class BadgePreviewCacheTests(TestCase):
+    """Les aperçus ne créent qu'un nombre borné d'échelles, hors du cache d'impression."""
+
+    def setUp(self):
+        utils_badges.clear_badge_template_cache()
+        self.addCleanup(utils_badges.clear_badge_template_cache)
+
+    def test_width_is_snapped_to_steps(self):
+        self.assertEqual(utils_badges.preview_width(1), 240)
+        self.assertEqual(utils_badges.preview_width(241), 360)
+        self.assertEqual(utils_badges.preview_width(480), 480)
+        self.assertEqual(utils_badges.preview_width(5000), 720)
+        self.assertEqual(utils_badges.preview_width(None), utils_badges.BADGE_PREVIEW_WIDTH)
+
+    def test_previews_do_not_evict_print_templates(self):
+        path = utils_badges.background_path_for("Participant")
+        utils_badges.get_background(path)
+        utils_badges.get_font(utils_badges.FONT_BOLD, utils_badges.FONT_BOLD_SIZE)
+        print_keys = list(utils_badges._registry._items)
+        for width in range(120, 721, 7):
+            scale = utils_badges.preview_width(width) / utils_badges.BADGE_BASE_WIDTH
+            utils_badges.get_background(path, scale)
+            utils_badges.get_font(utils_badges.FONT_BOLD, round(utils_badges.FONT_BOLD_SIZE * scale), preview=True)
+        self.assertEqual(list(utils_badges._registry._items), print_keys)
+        self.assertLessEqual(len(utils_badges._preview_registry._items), 2 * len(utils_badges.BADGE_PREVIEW_WIDTHS))
+
+
+@override_settings(LETTER_PDF_BACKEND="pydyf")
+class LetterBackendTests(TestCase):
+    """Backend pydyf (WinAnsi) : les noms hors cp1252 passent par WeasyPrint."""
+
+    def inscription(self, pk, nom):
+        return SimpleNamespace(id=pk, nom=nom, prenom="Awa", nationalite="Sénégalaise",
+                               provenance="Dakar", type_profil="Festivaliers")
+
+    def test_backend_follows_context(self):
+        latin, other = self.inscription(1, "Diop"), self.inscription(2, "Łukasz")
+        with mock.patch.object(utils_letters, "weasy_available", return_value=True):
+            self.assertEqual(utils_letters.letter_backend(utils_letters.letter_context(latin)), "pydyf")
+            self.assertEqual(utils_letters.letter_backend(utils_letters.letter_context(other)), "weasyprint")
+        # sans WeasyPrint : lettre pydyf quand même (caractères remplacés) plutôt qu'aucune lettre
+        with mock.patch.object(utils_letters, "weasy_available", return_value=False):
+            self.assertEqual(utils_letters.letter_backend(utils_letters.letter_context(other)), "pydyf")
+
+    def test_batch_renders_only_unencodable_letters_with_weasyprint(self):
+        inscriptions = [self.inscription(1, "Diop"), self.inscription(2, "Şahin"), self.inscription(3, "Ndiaye")]
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        with self.settings(MEDIA_ROOT=media_root.name), \
+                mock.patch.object(utils_letters, "weasy_available", return_value=True), \
+                mock.patch.object(utils_letters, "render_batch", return_value=[b"%PDF-weasy"]) as render_batch:
+            paths = utils_letters.generate_invitation_letters_pdf(inscriptions)
+            contents = {pk: open(path, "rb").read() for pk, path in paths.items()}
+        self.assertEqual(render_batch.call_count, 1)
+        self.assertIn("Şahin", render_batch.call_args.args[0])
+        self.assertEqual(contents[2], b"%PDF-weasy")
+        self.assertTrue(contents[1].startswith(b"%PDF-1.7"))
+        self.assertTrue(contents[3].startswith(b"%PDF-1.7"))
+
+
+@override_settings(SENDGRID_API_KEY=None, LETTER_PDF_BACKEND="pydyf", INVITATION_SHARED_ATTACHMENTS=[],
+                   EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxDispatchTests(TestCase):
+    """Dispatcher de l'outbox sur le backend email locmem : envoi, nouvel essai, dead-letter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        participant = Participant.objects.create()
+        cls.inscription = Inscription.objects.create(
+            participant=participant, nom="Diop", prenom="Awa",
+            email="awa@example.com", type_profil="Festivaliers", statut="Validé",
+        )
+        # Profil "Presse" : fond de badge absent de static/badges, le badge ne peut pas être rendu
+        cls.press = Inscription.objects.create(
+            participant=participant, nom="Sow", prenom="Moussa",
+            email="moussa@example.com", type_profil="Presse", statut="Validé",
+        )
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.row = outbox.queue_email("invitation_package", self.inscription.email, inscription=self.inscription)
+
+    def dispatch(self, row=None):
+        return outbox.dispatch_outbox(ids=[(row or self.row).pk], rate=0)
+
+    def failing_backend(self):
+        return mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                          side_effect=SMTPException("connexion refusée"))
+
+    def test_package_is_sent(self):
+        stats = self.dispatch()
+        self.row.refresh_from_db()
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual((self.row.status, self.row.attempts, self.row.provider), ("sent", 1, "django"))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.inscription.email])
+        names = [attachment[0] for attachment in mail.outbox[0].attachments]
+        self.assertEqual(names, [f"badge_{self.inscription.id}.png", f"invitation_{self.inscription.id}.pdf"])
+
+    def test_package_is_sent_without_the_missing_badge(self):
+        row = outbox.queue_email("invitation_package", self.press.email, inscription=self.press)
+        with self.assertLogs("inscriptions.tasks", "ERROR"):
+            stats = self.dispatch(row)
+        row.refresh_from_db()
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(row.status, "sent")
+        names = [attachment[0] for attachment in mail.outbox[0].attachments]
+        self.assertEqual(names, [f"invitation_{self.press.id}.pdf"])
+
+    def test_package_already_dispatched_is_not_sent_again(self):
+        # le dispatcher périodique passe avant la tâche lancée par la validation
+        job = AccreditationJob.objects.create(inscription=self.inscription)
+        row = outbox.queue_email("invitation_package", self.inscription.email, inscription=self.inscription, job=job)
+        outbox.dispatch_outbox(ids=[row.pk], rate=0)
+        self.assertEqual(len(mail.outbox), 1)
+
+        result = tasks.send_invitation_package(self.inscription.id, job.pk)
+        # relivraison de la tâche (acks_late) après un envoi réussi
+        tasks.send_invitation_package(self.inscription.id, job.pk)
+        self.assertEqual(result, {"ok": True})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.filter(job=job).count(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.email_state), ("done", "done"))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        before = timezone.now()
+        with self.failing_backend():
+            stats = self.dispatch()
+        self.row.refresh_from_db()
+        self.assertEqual(stats["pending"], 1)
+        self.assertEqual((self.row.status, self.row.attempts), ("pending", 1))
+        self.assertGreater(self.row.next_attempt_at, before + timedelta(seconds=20))
+        self.assertIn("connexion refusée", self.row.last_error)
+        # pas encore dû : un nouveau passage ne le reprend pas
+        self.assertEqual(self.dispatch()["claimed"], 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_email_is_dead_lettered_after_max_attempts(self):
+        with self.failing_backend():
+            for _ in range(3):
+                OutboundEmail.objects.filter(pk=self.row.pk).update(next_attempt_at=timezone.now())
+                self.dispatch()
+        self.row.refresh_from_db()
+        self.assertEqual((self.row.status, self.row.attempts), ("dead", 3))
+        # ligne morte : plus jamais reprise
+        OutboundEmail.objects.filter(pk=self.row.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.dispatch()["claimed"], 0)
+
+
+class BadgeNameWrapTests(TestCase):
+    """
+    split_name_by_pixels (une passe, largeurs mémorisées) coupe au même endroit
+    que l'implémentation d'origine, gardée comme référence dans benchmark.py.
+    """
+
+    def setUp(self):
+        self.font = utils_badges.get_font(utils_badges.FONT_BOLD, utils_badges.FONT_BOLD_SIZE)
+        self.draw = ImageDraw.Draw(Image.new("RGBA", (10, 10)))
+
+    def split(self, prenom, nom):
+        return utils_badges.split_name_by_pixels(prenom, nom, self.font, self.draw, utils_badges.MAX_NAME_WIDTH)
+
+    def test_same_break_as_legacy(self):
+        for prenom in SAMPLE_FIRST_NAMES:
+            for count in range(1, 7):
+                nom = " ".join(SAMPLE_LAST_NAMES[count:count * 2 + 1])
+                with self.subTest(prenom=prenom, nom=nom):
+                    legacy = _split_name_by_pixels_legacy(prenom, nom, self.font, self.draw, utils_badges.MAX_NAME_WIDTH)
+                    lines = self.split(prenom, nom)
+                    self.assertEqual(lines[0], legacy[0])
+                    self.assertEqual(" ".join(lines), f"{prenom} {nom}")
+
+    def test_repeated_words_are_not_duplicated(self):
+        # l'ancienne version recommençait la 2e ligne au premier "Diop" (words.index)
+        nom = " ".join(["Diop"] * 12)
+        self.assertEqual(" ".join(self.split("Awa", nom)), f"Awa {nom}")
+
+
+class BadgeQRCodeTests(TestCase):
+    """
+    render_qr dessine, à l'échelle entière, le même symbole que qrcode.make (le
+    rendu d'origine) : mêmes modules, masque de moindre pénalité compris.
+    """
+
+    def assertDrawsMatrix(self, data, tile, version=utils_badges.QR_VERSION):
+        reference = qrcode.make(data, version=version, error_correction=utils_badges.QR_ERROR_CORRECTION,
+                                box_size=1, border=utils_badges.QR_BORDER).get_image().convert("L")
+        modules = reference.width
+        scale = tile.width // modules
+        offset = (tile.width - modules * scale) // 2
+        for y in range(modules):
+            for x in range(modules):
+                # centre de chaque module : même couleur que le module de référence
+                pixel = tile.getpixel((offset + x * scale + scale // 2, offset + y * scale + scale // 2))
+                self.assertEqual(pixel == 0, reference.getpixel((x, y)) == 0, f"module ({x}, {y}) de {data!r}")
+
+    def test_tile_matches_module_matrix(self):
+        for i in (1, 42, 9999):
+            data = f"ECOFEST2025-{i}-participant.{i}@example.com"
+            with self.subTest(data=data):
+                tile = utils_badges.render_qr(data)
+                self.assertEqual(tile.size, (utils_badges.QR_SIZE, utils_badges.QR_SIZE))
+                self.assertEqual(set(tile.getdata()), {0, 255})
+                self.assertDrawsMatrix(data, tile)
+
+    def test_long_payload_falls_back_to_a_larger_version(self):
+        data = "ECOFEST2025-1-" + "x" * 120 + "@example.com"
+        tile = utils_badges.render_qr(data)
+        self.assertDrawsMatrix(data, tile, version=None)
+
+
+@override_settings(LETTER_PDF_WORKERS=0)
+class LetterBatchTests(TestCase):
+    """Les lettres rendues en lot sont celles du rendu unitaire, aux mêmes chemins de cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        participant = Participant.objects.create()
+        cls.inscriptions = [
+            Inscription.objects.create(
+                participant=participant, nom=nom, prenom="Awa", email=f"lettre-{i}@example.com",
+                type_profil="Festivaliers", nationalite="Sénégalaise", provenance="Dakar",
+            )
+            for i, nom in enumerate(("Diop", "Ndiaye", "Mendes da Silva Cabral"))
+        ]
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    @override_settings(LETTER_PDF_BACKEND="pydyf")
+    def test_batch_writes_the_single_letter_files(self):
+        paths = utils_letters.generate_invitation_letters_pdf(self.inscriptions, chunk_size=2)
+        for inscription in self.inscriptions:
+            with self.subTest(inscription=inscription.pk):
+                self.assertEqual(paths[inscription.id], utils_letters.cached_letter_path(inscription))
+                with open(paths[inscription.id], "rb") as f:
+                    self.assertEqual(f.read(), utils_letters.render_letter_pdf(utils_letters.letter_context(inscription)))
+        # déjà en cache : ni le chemin unitaire ni un nouveau lot ne refont de rendu
+        with mock.patch.object(utils_letters, "render_letter_pdf", side_effect=AssertionError("rendu inattendu")):
+            for inscription in self.inscriptions:
+                self.assertEqual(utils_letters.get_or_generate_letter(inscription), paths[inscription.id])
+            self.assertEqual(utils_letters.generate_invitation_letters_pdf(self.inscriptions), paths)
+
+    @override_settings(LETTER_PDF_BACKEND="weasyprint")
+    def test_batch_layout_matches_single_letters(self):
+        if not utils_letters.weasy_available():
+            self.skipTest("WeasyPrint n'est pas disponible dans cet environnement.")
+        from weasyprint import CSS, HTML
+
+        def layout(template_name, context):
+            stylesheets = [CSS(filename=path) for path in utils_letters.LETTER_STYLESHEETS[template_name]]
+            html = utils_letters.render_template(template_name, context)
+            return HTML(string=html, base_url=str(settings.BASE_DIR)).render(stylesheets=stylesheets)
+
+        contexts = [utils_letters.letter_context(inscription) for inscription in self.inscriptions]
+        singles = [len(layout(utils_letters.DEFAULT_LETTER_TEMPLATE, context).pages) for context in contexts]
+        batch = layout(utils_letters.DEFAULT_LETTER_BATCH_TEMPLATE, {"letters": contexts})
+        # chaque lettre occupe autant de pages que seule et commence sur une nouvelle page
+        self.assertEqual(len(batch.pages), sum(singles))
+        starts = {}
+        for index, page in enumerate(batch.pages):
+            for anchor in page.anchors:
+                starts.setdefault(anchor, index)
+        self.assertEqual([starts[f"letter-{i}"] for i in range(len(contexts))],
+                         [sum(singles[:i]) for i in range(len(contexts))])
+
+        paths = utils_letters.generate_invitation_letters_pdf(self.inscriptions)
+        self.assertEqual(paths, {i.id: utils_letters.cached_letter_path(i) for i in self.inscriptions})
+        for path in paths.values():
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(5), b"%PDF-")
+
+
+class ExportFormulaInjectionTests(TestCase):
+    """Les valeurs saisies par le public ne sont jamais interprétées comme formules."""
+    columns = [("nom", "Nom", "nom")]
+    payloads = [
+        "=1+1", "@SUM(A1)", "\t=cmd", "\r=cmd",
+        "-2+3+cmd|' /C calc'!A0", '+1+HYPERLINK("http://x","y")', "-cmd", "+ 1 2 A1",
+    ]
+
+    def csv_cells(self, values):
+        data = b"".join(utils_export.iter_inscriptions_csv([(v,) for v in values], self.columns))
+        return [row[0] for row in csv.reader(io.StringIO(data.decode("utf-8-sig")), delimiter=";")][1:]
+
+    def test_formulas_are_prefixed(self):
+        self.assertEqual(self.csv_cells(self.payloads), ["'" + payload for payload in self.payloads])
+        for payload in self.payloads:
+            with self.subTest(payload=payload):
+                # cellule XLSX : même préfixe devant le texte
+                self.assertRegex(utils_export._xlsx_cell(payload), r"<t[^>]*>'")
+
+    def test_phone_numbers_stay_readable(self):
+        phones = ["+221 77 123 45 67", "+33 (0)6 12 34 56 78", "77-123-45-67", "Diop"]
+        self.assertEqual(self.csv_cells(phones), phones)
+
+
+class SendGridSessionTests(TestCase):
+    """POST /v3/mail/send n'est jamais rejoué une fois la requête partie."""
+
+    def serve(self, handle):
+        """Serveur HTTP minimal : handle(conn, numéro de requête) pour chaque requête reçue."""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+        self.requests = 0
+
+        def run():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                with conn, conn.makefile("rb") as reader:
+                    while True:
+                        headers = b""
+                        while not headers.endswith(b"\r\n\r\n"):
+                            line = reader.readline()
+                            if not line:
+                                break
+                            headers += line
+                        if not headers:
+                            break
+                        length = int(re.search(rb"Content-Length: (\d+)", headers).group(1))
+                        reader.read(length)
+                        self.requests += 1
+                        if not handle(conn, self.requests):
+                            break
+                    conn.shutdown(socket.SHUT_RDWR)
+
+        threading.Thread(target=run, daemon=True).start()
+        return tasks.SendGridSession("key", base_url=f"http://127.0.0.1:{server.getsockname()[1]}", timeout=2)
+
+    ok = b"HTTP/1.1 202 Accepted\r\nContent-Length: 0\r\n\r\n"
+
+    def answer_first_only(self, conn, number):
+        """1re requête servie (connexion gardée), la suivante lue puis coupée sans réponse."""
+        if number == 1:
+            conn.sendall(self.ok)
+            return True
+        return False
+
+    def test_no_retry_when_the_response_is_lost(self):
+        session = self.serve(self.answer_first_only)
+        self.assertEqual(session.post("/v3/mail/send", {"subject": "a"})[0], 202)
+        # connexion réutilisée, requête reçue, aucune réponse : pas de deuxième envoi
+        with self.assertRaises(tasks.SendGridResponseError):
+            session.post("/v3/mail/send", {"subject": "b"})
+        self.assertEqual(self.requests, 2)
+
+    def test_idle_connection_closed_by_server_is_reopened(self):
+        # une réponse par connexion, puis fermeture (keep-alive expiré côté serveur)
+        session = self.serve(lambda conn, n: conn.sendall(self.ok) and False)
+        self.assertEqual(session.post("/v3/mail/send", {"subject": "a"})[0], 202)
+        time.sleep(0.1)
+        self.assertEqual(session.post("/v3/mail/send", {"subject": "b"})[0], 202)
+        self.assertEqual((self.requests, session.connections_opened), (2, 2))
+
+    def test_broadcast_batch_is_not_resent_per_message(self):
+        session = self.serve(self.answer_first_only)
+        session.post("/v3/mail/send", {"subject": "a"})
+        mailer = mock.Mock(sendgrid=session)
+        recipients = [{"email": f"a{i}@example.com", "prenom": "", "nom": ""} for i in range(3)]
+        rendered = {"subject": "s", "text": "t", "html": "h"}
+        with mock.patch.object(broadcast, "substitutions", return_value={}):
+            sent, failed, _ = broadcast._send_batch(rendered, recipients, mailer)
+        self.assertEqual((sent, failed, self.requests), (0, 3, 2))
+        mailer.send.assert_not_called()
+
+
+class BadgeBulkRenderTests(TestCase):
+    """render_badges_bulk : rien n'est lu en base une fois le pool créé, progression complète."""
+
+    @classmethod
+    def setUpTestData(cls):
+        participant = Participant.objects.create()
+        for i in range(3):
+            Inscription.objects.create(participant=participant, nom=f"Nom{i}", prenom="Awa",
+                                       email=f"bulk-{i}@example.com", type_profil="Festivaliers")
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.calls = []
+        # close_all() réel annulerait la transaction du test : on ne fait qu'enregistrer l'ordre
+        close_all = mock.patch("django.db.connections.close_all", side_effect=lambda: self.calls.append("close"))
+        close_all.start()
+        self.addCleanup(close_all.stop)
+        # badges déjà en cache : tous sautés, aucun processus réellement lancé
+        for inscription in Inscription.objects.all():
+            utils_badges.get_or_generate_badge(inscription)
+
+    def render(self, **kwargs):
+        real_pool = utils_badges.ProcessPoolExecutor
+
+        def pool(*args, **options):
+            self.calls.append("pool")
+            return real_pool(*args, **options)
+
+        def record(execute, *args):
+            self.calls.append("query")
+            return execute(*args)
+
+        with mock.patch.object(utils_badges, "ProcessPoolExecutor", pool), connection.execute_wrapper(record):
+            return utils_badges.render_badges_bulk(Inscription.objects.all(), workers=1, **kwargs)
+
+    def test_rows_are_read_before_the_pool_is_created(self):
+        self.render()
+        self.assertIn("query", self.calls)
+        self.assertEqual(self.calls[self.calls.index("pool") - 1], "close")
+        self.assertNotIn("query", self.calls[self.calls.index("pool"):])
+
+    def test_skipped_badges_count_in_progress(self):
+        reports = []
+        stats = self.render(progress=reports.append, progress_every=1)
+        self.assertEqual(stats["skipped"], 3)
+        self.assertEqual([(r["skipped"], r["total"]) for r in reports[:3]], [(1, 3), (2, 3), (3, 3)])
+
+
+@override_settings(ADMIN_DIGEST_THRESHOLD=0)
+class AdminDigestOriginTests(TestCase):
+    """Le digest admin ne reprend que les inscriptions publiques."""
+
+    def data(self, email):
+        return {"nom": "Diallo", "prenom": "Awa", "email": email, "type_profil": "Festivaliers"}
+
+    def test_back_office_inscription_not_in_digest(self):
+        serializer = InscriptionSerializer(data={**self.data("staff@example.com"),
+                                                 "participant": Participant.objects.create().pk})
+        serializer.is_valid(raise_exception=True)
+        staff_row = serializer.save()
+        public = PublicInscriptionSerializer(data=self.data("public@example.com"))
+        public.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks():
+            public.save()
+
+        with self.captureOnCommitCallbacks():
+            email, count = admin_digest.send_admin_digest()
+        self.assertEqual(count, 1)
+        self.assertNotIn(admin_digest.admin_link(staff_row.pk), email.body_text)
+
+
+class InscriptionChangeTrackingTests(TestCase):
+    """Un save(update_fields=...) ne marque propres que les champs écrits."""
+
+    def test_partial_save_keeps_other_changes_pending(self):
+        participant = Participant.objects.create()
+        created = Inscription.objects.create(participant=participant, nom="Diop", prenom="Awa",
+                                             email="suivi@example.com", type_profil="Festivaliers")
+        inscription = Inscription.objects.get(pk=created.pk)
+        inscription.nom = "Ndiaye"
+        inscription.statut = "Validé"
+        with mock.patch.object(utils_letters, "invalidate_letter_cache") as invalidate:
+            inscription.save(update_fields=["statut"])
+            invalidate.assert_not_called()
+            self.assertEqual(inscription.changed_fields(("nom", "statut")), {"nom"})
+
+            inscription.save()
+            invalidate.assert_called_once_with(inscription)
+        self.assertEqual(inscription.changed_fields(("nom", "statut")), set())
@@ -10,8 +10,15 @@ urlpatterns = [
     path('', include(router.urls)),
 
     # Admin-only actions
+    path("admin/inscriptions/bulk/", views.bulk_inscriptions_action, name="inscriptions-bulk"),
+    path("admin/inscriptions/search/", views.InscriptionSearchView.as_view(), name="inscriptions-search"),
+    path("admin/inscriptions/export/", views.export_inscriptions, name="inscriptions-export"),
     path("admin/inscriptions/<int:pk>/validate/", views.validate_inscription),
     path("admin/inscriptions/<int:pk>/refuse/", views.refuse_inscription),
     path("admin/inscriptions/<int:pk>/badge/", views.get_badge_url),
+    path("admin/inscriptions/<int:pk>/badge/preview/", views.get_badge_preview),
     path("admin/inscriptions/<int:pk>/pieces/", views.get_pieces_urls),
+    path("admin/jobs/<uuid:job_id>/", views.accreditation_job_status, name="accreditation-job-status"),
+    path("admin/batches/<uuid:batch_id>/", views.accreditation_batch_status, name="accreditation-batch-status"),
+    path("admin/outbox/metrics/", views.get_outbox_metrics),
 ]
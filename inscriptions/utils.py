@@ -5,7 +5,6 @@ from django.core.files.storage import default_storage
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 import qrcode
-from weasyprint import HTML  # si tu utilises WeasyPrint
 
 
 # def generate_badge_png_for_inscription(inscription):
@@ -63,6 +62,8 @@ def generate_invitation_pdf_for_inscription(inscription):
         "evenement": inscription.evenement,
     }
     html_string = render_to_string('invitations/invitation_template.html', context)
+    # Import local : WeasyPrint (pango, fontconfig...) n'est chargé que si on génère un PDF
+    from weasyprint import HTML
     HTML(string=html_string).write_pdf(fullpath)
 
     return f"invitations/{filename}"
@@ -1,8 +1,159 @@
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, features
+import glob
+import hashlib
+import io
+import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
 from django.conf import settings
 
+from .utils_text import wrap_words
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+#  CONSTANTES DE MISE EN PAGE
+# ---------------------------------------------------------
+BADGE_BACKGROUNDS = {
+    "PRESSE": "Presse.png",
+    "PRESS": "Presse.png",
+    "FESTIVALIERS": "Festivaliers.png",
+    "FESTIVALIER": "Festivaliers.png",
+    "ARTISTES PROFESSIONNELS": "Artistes.png",
+    "ARTISTE PROFESSIONNELS": "Artistes.png",
+    "ARTISTE PROFESSIONNEL": "Artistes.png",
+}
+DEFAULT_BACKGROUND = "Festivaliers.png"
+
+FONT_BOLD = "DejaVuSans-Bold.ttf"
+FONT_NORMAL = "DejaVuSans.ttf"
+FONT_BOLD_SIZE = 30
+FONT_NORMAL_SIZE = 20
+
+QR_POSITION = (80, 80)
+QR_SIZE = 170
+# "ECOFEST2025-<id>-<email>" tient en version 4 / niveau M (62 octets) pour
+# la quasi-totalité des emails : 41 modules bordure comprise -> 4 px par module.
+QR_VERSION = 4
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+QR_BORDER = 4
+# Masque non fixé : qrcode garde le masque de moindre pénalité (lisibilité) pour chaque contenu
+
+MAX_NAME_WIDTH = 850  # largeur utile pour le texte nom/prénom
+TEXT_X = 400
+NAME_Y = 600
+LINE_SPACING = 60
+NAT_Y = 700
+PROV_Y = 780
+
+# Largeur des fonds (px) : référence pour l'échelle des aperçus
+BADGE_BASE_WIDTH = 1120
+BADGE_PREVIEW_WIDTH = getattr(settings, "BADGE_PREVIEW_WIDTH", 360)
+# Largeurs d'aperçu possibles : une largeur demandée est arrondie au palier
+# supérieur, le nombre d'échelles (et donc de gabarits réduits en cache) est borné
+BADGE_PREVIEW_WIDTHS = tuple(sorted(getattr(settings, "BADGE_PREVIEW_WIDTHS", (240, 360, 480, 720))))
+
+# À incrémenter à chaque modification du rendu : invalide tous les badges en cache
+BADGE_LAYOUT_VERSION = 2
+
+
+# ---------------------------------------------------------
+#  REGISTRE DES GABARITS (fonds + polices) — 1 chargement / worker
+# ---------------------------------------------------------
+class BadgeTemplateRegistry:
+    """
+    Cache LRU process-wide des ressources décodées (fonds PNG, polices).
+    Une entrée est rechargée si le mtime du fichier source change.
+    Les images retournées sont partagées : toujours travailler sur une .copy().
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, path, loader):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._items.move_to_end(key)
+                return entry[1]
+
+        value = loader(path)
+
+        with self._lock:
+            self._items[key] = (mtime, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_registry = BadgeTemplateRegistry(getattr(settings, "BADGE_TEMPLATE_CACHE_SIZE", 16))
+# Gabarits réduits des aperçus : cache séparé, les aperçus n'évincent jamais
+# les gabarits pleine taille de l'impression
+_preview_registry = BadgeTemplateRegistry(getattr(settings, "BADGE_PREVIEW_CACHE_SIZE", 20))
+
+
+def preview_width(width=None):
+    """Palier de BADGE_PREVIEW_WIDTHS pour une largeur demandée (le plus petit >= width)."""
+    width = width or BADGE_PREVIEW_WIDTH
+    for step in BADGE_PREVIEW_WIDTHS:
+        if width <= step:
+            return step
+    return BADGE_PREVIEW_WIDTHS[-1]
+
+
+def background_path_for(type_profil):
+    role = (type_profil or "").strip().upper()
+    filename = BADGE_BACKGROUNDS.get(role, DEFAULT_BACKGROUND)
+    return os.path.join(settings.BASE_DIR, "static", "badges", filename)
+
+
+def get_background(path, scale=1):
+    """
+    Fond décodé en RGBA, partagé entre les rendus (ne pas modifier).
+    scale < 1 : copie pré-réduite pour les aperçus, elle aussi mise en cache.
+    """
+    def load(p):
+        img = Image.open(p).convert("RGBA")
+        if scale != 1:
+            img = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+        return img
+    registry = _registry if scale == 1 else _preview_registry
+    return registry.get(("background", path, scale), path, load)
+
+
+def get_font(filename, size, preview=False):
+    path = os.path.join(settings.BASE_DIR, "static", "fonts", filename)
+    registry = _preview_registry if preview else _registry
+    return registry.get(("font", path, size), path, lambda p: ImageFont.truetype(p, size))
+
+
+def get_template_digest(path):
+    """Empreinte SHA-256 du fichier gabarit (recalculée si le mtime change)."""
+    def digest(p):
+        with open(p, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    return _registry.get(("digest", path), path, digest)
+
+
+def clear_badge_template_cache():
+    _registry.clear()
+    _preview_registry.clear()
+
 
 # ---------------------------------------------------------
 #  FONCTION DÉCOUPAGE PAR LARGEUR EN PIXELS
@@ -10,97 +161,103 @@ from django.conf import settings
 def split_name_by_pixels(prenom, nom, font, draw, max_width_px):
     """
     Coupe le texte prénom + nom en 1 ou 2 lignes SANS dépasser max_width_px.
-    Utilise la largeur réelle en pixels → 100% fiable.
+    Une seule passe sur les mots, largeurs mémorisées par police ; la largeur
+    réelle en pixels n'est mesurée qu'au voisinage de la limite.
     """
     full = (prenom or "").strip() + " " + (nom or "").strip()
-    words = full.split()
+    return wrap_words(full, font, max_width_px, max_lines=2, draw=draw)
 
-    line1 = ""
-    line2 = ""
 
-    for w in words:
-        test = (line1 + " " + w).strip()
 
-        # Mesurer la largeur réelle
-        bbox = draw.textbbox((0, 0), test, font=font)
-        width = bbox[2] - bbox[0]
+# ---------------------------------------------------------
+#  QR CODE : matrice dessinée directement à l'échelle entière
+# ---------------------------------------------------------
+def render_qr(data, size=QR_SIZE):
+    """
+    Construit la matrice du QR code une seule fois et la dessine dans une image
+    1 bit de `size` x `size` : chaque module fait un nombre entier de pixels
+    (agrandissement NEAREST exact, pas de rééchantillonnage), centré sur fond blanc.
+    """
+    qr = qrcode.QRCode(
+        version=QR_VERSION,
+        error_correction=QR_ERROR_CORRECTION,
+        box_size=1,
+        border=QR_BORDER,
+    )
+    qr.add_data(data)
+    try:
+        qr.make(fit=False)
+    except qrcode.exceptions.DataOverflowError:
+        # email exceptionnellement long : on laisse qrcode choisir la version
+        qr = qrcode.QRCode(
+            error_correction=QR_ERROR_CORRECTION,
+            box_size=1,
+            border=QR_BORDER,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
 
-        if width <= max_width_px:
-            line1 = test
-        else:
-            # Le mot ne rentre pas → ligne 2
-            line2 = " ".join(words[words.index(w):])
-            break
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    scale = max(1, size // modules)
 
-    return [line1] if not line2 else [line1, line2]
+    pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+    symbol = Image.frombytes("L", (modules, modules), pixels)
+    if scale > 1:
+        symbol = symbol.resize((modules * scale, modules * scale), Image.NEAREST)
 
+    size = max(size, symbol.width)  # aperçus très réduits : jamais moins d'1 px par module
+    tile = Image.new("L", (size, size), 255)
+    offset = (size - symbol.width) // 2
+    tile.paste(symbol, (offset, offset))
+    return tile.convert("1", dither=Image.Dither.NONE)
 
 
 # ---------------------------------------------------------
 #                  GÉNÉRATION DU BADGE
 # ---------------------------------------------------------
-def generate_badge(inscription):
-
-    # ------------ BACKGROUND ------------
-    role = (inscription.type_profil or "").strip().upper()
-
-    backgrounds = {
-        "PRESSE": "Presse.png",
-        "PRESS": "Presse.png",
-        "FESTIVALIERS": "Festivaliers.png",
-        "FESTIVALIER": "Festivaliers.png",
-        "ARTISTES PROFESSIONNELS": "Artistes.png",
-        "ARTISTE PROFESSIONNELS": "Artistes.png",
-        "ARTISTE PROFESSIONNEL": "Artistes.png",
-    }
+def render_badge_image(inscription, scale=1):
+    """
+    Dessine le badge et retourne l'image PIL (RGBA).
+    scale=1 : rendu d'impression ; scale < 1 : aperçu à partir des gabarits
+    pré-réduits, polices et positions mises à l'échelle.
+    """
+    def px(value):
+        return round(value * scale)
 
-    filename = backgrounds.get(role, "Festivaliers.png")
-    background_path = os.path.join(settings.BASE_DIR, "static", "badges", filename)
-    base = Image.open(background_path).convert("RGBA")
+    # ------------ BACKGROUND (copie du gabarit en cache) ------------
+    base = get_background(background_path_for(inscription.type_profil), scale).copy()
 
     # ------------ QR CODE 170px ------------
     qr_data = f"ECOFEST2025-{inscription.id}-{inscription.email}"
-    qr = qrcode.make(qr_data)
-    qr = qr.resize((170, 170))
-    base.paste(qr, (80, 80))
+    base.paste(render_qr(qr_data, size=px(QR_SIZE)), (px(QR_POSITION[0]), px(QR_POSITION[1])))
 
     # ------------ FONTS ------------
-    font_path_bold = os.path.join(settings.BASE_DIR, "static/fonts/DejaVuSans-Bold.ttf")
-    font_path = os.path.join(settings.BASE_DIR, "static/fonts/DejaVuSans.ttf")
-
-    font_bold = ImageFont.truetype(font_path_bold, 30)
-    font_normal = ImageFont.truetype(font_path, 20)
+    font_bold = get_font(FONT_BOLD, max(1, px(FONT_BOLD_SIZE)), preview=scale != 1)
+    font_normal = get_font(FONT_NORMAL, max(1, px(FONT_NORMAL_SIZE)), preview=scale != 1)
 
     draw = ImageDraw.Draw(base)
 
     # ------------ NOM : Découpage intelligent par pixels ------------
-    MAX_NAME_WIDTH = 850  # largeur utile pour le texte nom/prénom
-
     name_lines = split_name_by_pixels(
         inscription.prenom,
         inscription.nom,
         font_bold,
         draw,
-        MAX_NAME_WIDTH
+        px(MAX_NAME_WIDTH)
     )
 
     # ------------ TEXTES ANNEXES ------------
     nat_text = inscription.nationalite or ""
     prov_text = inscription.provenance or ""
 
-    TEXT_X = 400
-    NAME_Y = 600
-    LINE_SPACING = 60
-    NAT_Y = 700
-    PROV_Y = 780
-
     # --- Affichage du nom en 1 ou 2 lignes ---
-    draw.text((TEXT_X, NAME_Y), name_lines[0], fill="black", font=font_bold)
+    draw.text((px(TEXT_X), px(NAME_Y)), name_lines[0], fill="black", font=font_bold)
 
     extra_offset = 0
     if len(name_lines) > 1:
         draw.text(
-            (TEXT_X, NAME_Y + LINE_SPACING),
+            (px(TEXT_X), px(NAME_Y + LINE_SPACING)),
             name_lines[1],
             fill="black",
             font=font_bold
@@ -110,7 +267,7 @@ def generate_badge(inscription):
     # --- NATIONALITÉ ---
     if nat_text:
         draw.text(
-            (TEXT_X, NAT_Y + extra_offset),
+            (px(TEXT_X), px(NAT_Y + extra_offset)),
             nat_text,
             fill="black",
             font=font_normal
@@ -119,17 +276,202 @@ def generate_badge(inscription):
     # --- PROVENANCE ---
     if prov_text:
         draw.text(
-            (TEXT_X, PROV_Y + extra_offset),
+            (px(TEXT_X), px(PROV_Y + extra_offset)),
             prov_text,
             fill="black",
             font=font_normal
         )
 
-    # ------------ SAVE ------------
-    output_dir = os.path.join(settings.MEDIA_ROOT, "badges")
-    os.makedirs(output_dir, exist_ok=True)
+    return base
 
-    output_path = os.path.join(output_dir, f"badge_{inscription.id}.png")
-    base.save(output_path, dpi=(300, 300))
+
+def generate_badge(inscription, output_path=None):
+    base = render_badge_image(inscription)
+
+    # ------------ SAVE ------------
+    output_path = output_path or badge_output_path(inscription.id)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    base.save(output_path, format="PNG", dpi=(300, 300))
 
     return output_path
+
+
+def badge_output_path(inscription_id):
+    return os.path.join(settings.MEDIA_ROOT, "badges", f"badge_{inscription_id}.png")
+
+
+def generate_badge_preview(inscription, width=None, image_format="WEBP", quality=80):
+    """
+    Aperçu basse résolution pour le back-office, rendu et encodé en mémoire
+    (aucune écriture disque). Retourne (bytes, content_type).
+    Le rendu pleine résolution reste réservé à l'impression et aux emails.
+    """
+    width = preview_width(width)
+    scale = min(1, width / BADGE_BASE_WIDTH)
+    image = render_badge_image(inscription, scale=scale)
+
+    image_format = image_format.upper()
+    if image_format == "WEBP" and not features.check("webp"):
+        image_format = "JPEG"
+    if image_format == "JPEG":
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue(), f"image/{image_format.lower()}"
+
+
+# ---------------------------------------------------------
+#     CACHE ADRESSÉ PAR CONTENU (clé = champs affichés + gabarit)
+# ---------------------------------------------------------
+def badge_cache_key(inscription):
+    """
+    Hash des seules données qui influencent le rendu du badge :
+    texte affiché, données du QR code, gabarit de fond et version de mise en page.
+    """
+    payload = [
+        BADGE_LAYOUT_VERSION,
+        inscription.id,
+        inscription.email,
+        inscription.prenom,
+        inscription.nom,
+        inscription.nationalite,
+        inscription.provenance,
+        inscription.type_profil,
+        get_template_digest(background_path_for(inscription.type_profil)),
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def cached_badge_path(inscription, key=None):
+    key = key or badge_cache_key(inscription)
+    return os.path.join(settings.MEDIA_ROOT, "badges", f"badge_{inscription.id}_{key[:16]}.png")
+
+
+def get_or_generate_badge(inscription):
+    """
+    Retourne le chemin du badge correspondant à l'état actuel de l'inscription,
+    sans re-rendu si la clé n'a pas changé. Les anciennes versions sont supprimées.
+    """
+    path = cached_badge_path(inscription)
+    if os.path.exists(path):
+        return path
+
+    # écriture atomique : deux requêtes simultanées ne produisent jamais un fichier tronqué
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    generate_badge(inscription, output_path=tmp_path)
+    os.replace(tmp_path, path)
+
+    pattern = os.path.join(glob.escape(os.path.dirname(path)), f"badge_{inscription.id}_*.png")
+    for stale in glob.glob(pattern):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+# ---------------------------------------------------------
+#        RENDU EN MASSE (pool de processus)
+# ---------------------------------------------------------
+BULK_FIELDS = ("id", "email", "prenom", "nom", "nationalite", "provenance", "type_profil")
+
+
+def _init_bulk_worker():
+    # En mode "spawn" le processus fils doit initialiser Django lui-même
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _render_badge_row(row):
+    """Exécuté dans un worker : aucun accès DB, uniquement les champs utiles au rendu."""
+    try:
+        return row["id"], get_or_generate_badge(SimpleNamespace(**row)), None
+    except Exception as exc:
+        return row["id"], None, str(exc)
+
+
+def _badge_is_fresh(row):
+    try:
+        return os.path.exists(cached_badge_path(SimpleNamespace(**row)))
+    except OSError:
+        # fond de badge manquant, etc. : l'erreur est remontée par le worker pour cette ligne
+        return False
+
+
+def render_badges_bulk(queryset, workers=None, chunk_size=200, force=False, progress=None, progress_every=50,
+                       on_result=None, mp_context=None):
+    """
+    Rend les badges de toutes les inscriptions du queryset sur un pool de processus.
+    Les champs utiles au rendu (BULK_FIELDS) sont lus en entier avant la création
+    du pool, connexions DB fermées : aucun worker n'hérite d'une connexion ouverte.
+    Le nombre de rendus en vol est borné. Un badge dont la clé de cache existe déjà
+    est sauté (reprise après crash), sauf si force=True.
+    progress(stats) est appelé toutes les `progress_every` inscriptions traitées
+    (rendues, sautées ou en échec) ; stats["total"] est connu dès le départ.
+    on_result(inscription_id, chemin, erreur) est appelé pour chaque inscription
+    (badge rendu, déjà en cache ou en échec).
+    mp_context : contexte multiprocessing du pool ("spawn" si le processus
+    appelant a d'autres threads actifs).
+    Retourne un dict de statistiques.
+    """
+    from django.db import connections
+
+    workers = workers or os.cpu_count() or 1
+    stats = {"total": 0, "rendered": 0, "skipped": 0, "failed": 0, "errors": {}, "elapsed": 0.0, "rate": 0.0}
+    started = time.monotonic()
+
+    def report():
+        stats["elapsed"] = time.monotonic() - started
+        done = stats["rendered"] + stats["skipped"] + stats["failed"]
+        stats["rate"] = done / stats["elapsed"] if stats["elapsed"] else 0.0
+        if progress:
+            progress(dict(stats))
+
+    def processed():
+        if (stats["rendered"] + stats["skipped"] + stats["failed"]) % progress_every == 0:
+            report()
+
+    def collect(futures):
+        for fut in futures:
+            inscription_id, path, error = fut.result()
+            if error:
+                stats["failed"] += 1
+                stats["errors"][inscription_id] = error
+                logger.warning("Badge rendering failed for inscription %s: %s", inscription_id, error)
+            else:
+                stats["rendered"] += 1
+            if on_result:
+                on_result(inscription_id, path, error)
+            processed()
+
+    # Lecture complète avant le pool : avec un iterator() paresseux, la connexion
+    # serait ouverte au moment où les workers sont créés (fork) et partagée avec eux
+    rows = list(queryset.order_by("id").values(*BULK_FIELDS).iterator(chunk_size=chunk_size))
+    stats["total"] = len(rows)
+    connections.close_all()
+
+    pending = set()
+    max_in_flight = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_bulk_worker, mp_context=mp_context) as pool:
+        for row in rows:
+            if _badge_is_fresh(row):
+                if not force:
+                    stats["skipped"] += 1
+                    if on_result:
+                        on_result(row["id"], cached_badge_path(SimpleNamespace(**row)), None)
+                    processed()
+                    continue
+                os.remove(cached_badge_path(SimpleNamespace(**row)))
+            pending.add(pool.submit(_render_badge_row, row))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(pending)
+        collect(done)
+
+    report()
+    return stats
@@ -0,0 +1,258 @@
+import csv
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from .utils_badges import badge_output_path, cached_badge_path
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream:
+    """
+    Pseudo-fichier non seekable : zipfile y écrit, on vide le tampon à chaque
+    morceau. Sans seek(), zipfile passe en mode "data descriptor" et n'a jamais
+    besoin de revenir en arrière -> l'archive peut être envoyée au fil de l'eau.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._written = 0
+
+    def write(self, data):
+        self._buffer += data
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def find_badge_file(inscription):
+    """Badge déjà généré pour l'état actuel de l'inscription (ou ancien nommage), sinon None."""
+    for path in (cached_badge_path(inscription), badge_output_path(inscription.id)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def iter_badges_zip(inscriptions):
+    """
+    Génère une archive ZIP des badges existants, morceau par morceau.
+    Les PNG sont déjà compressés : ils sont stockés (ZIP_STORED), pas re-dégonflés.
+    La mémoire utilisée reste de l'ordre de STREAM_CHUNK_SIZE quelle que soit la taille.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as zf:
+        for inscription in inscriptions:
+            path = find_badge_file(inscription)
+            if not path:
+                continue
+            with open(path, "rb") as src, zf.open(f"badge_{inscription.id}.png", "w") as dst:
+                for chunk in iter(lambda: src.read(STREAM_CHUNK_SIZE), b""):
+                    dst.write(chunk)
+                    yield stream.pop()
+            yield stream.pop()
+    yield stream.pop()
+
+
+# ---------------------------------------------------------
+#  EXPORT TABLEUR DES INSCRIPTIONS (CSV / XLSX en streaming)
+# ---------------------------------------------------------
+# Colonnes exportables : clé (?fields=), en-tête, champ lu par values_list()
+EXPORT_COLUMNS = [
+    ("id", "ID", "id"),
+    ("nom", "Nom", "nom"),
+    ("prenom", "Prénom", "prenom"),
+    ("email", "Email", "email"),
+    ("telephone", "Téléphone", "telephone"),
+    ("nationalite", "Nationalité", "nationalite"),
+    ("provenance", "Provenance", "provenance"),
+    ("type_profil", "Profil", "type_profil"),
+    ("statut", "Statut", "statut"),
+    ("evenement", "Événement", "evenement__nom"),
+    ("created_at", "Inscrit le", "created_at"),
+]
+EXPORT_ITERATOR_CHUNK = 2000
+# lignes formatées avant chaque envoi d'un morceau de réponse
+EXPORT_ROWS_PER_CHUNK = 500
+
+
+def export_columns(keys=None):
+    """Colonnes demandées (clés de EXPORT_COLUMNS, dans l'ordre donné), toutes par défaut."""
+    if not keys:
+        return list(EXPORT_COLUMNS)
+    by_key = {column[0]: column for column in EXPORT_COLUMNS}
+    unknown = [key for key in keys if key not in by_key]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {', '.join(unknown)}.")
+    return [by_key[key] for key in keys]
+
+
+def export_rows(queryset, columns):
+    """Tuples de valeurs lus par paquets (pas d'instances de modèle, pas de cache du queryset)."""
+    return queryset.values_list(*[field for _, _, field in columns]).iterator(chunk_size=EXPORT_ITERATOR_CHUNK)
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d %H:%M") if hasattr(value, "hour") else value.isoformat()
+    return str(value)
+
+
+class _LineBuffer:
+    """Cible de csv.writer : garde les lignes jusqu'au prochain envoi."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def pop(self):
+        data = "".join(self.parts).encode("utf-8")
+        self.parts.clear()
+        return data
+
+
+_FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+# seule exception : un numéro de téléphone complet ("+221 77 123 45 67"), sans
+# opérateur ni fonction possible
+_PHONE_RE = re.compile(r"^\+?[\d\s().-]+$")
+
+
+def _formula_safe(text):
+    # données saisies par le public : toute cellule qui commence comme une formule
+    # est préfixée d'une apostrophe, le tableur l'affiche comme du texte
+    if text.startswith(_FORMULA_START) and not _PHONE_RE.match(text):
+        return "'" + text
+    return text
+
+
+def iter_inscriptions_csv(rows, columns):
+    """
+    CSV (UTF-8 avec BOM pour Excel, séparateur ;) écrit au fil de la lecture :
+    un morceau toutes les EXPORT_ROWS_PER_CHUNK lignes, mémoire constante.
+    """
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow([header for _, header, _ in columns])
+    yield "\ufeff".encode("utf-8") + buffer.pop()
+    count = 0
+    for row in rows:
+        writer.writerow([_formula_safe(_cell_text(value)) for value in row])
+        count += 1
+        if count % EXPORT_ROWS_PER_CHUNK == 0:
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+# XLSX minimal (SpreadsheetML) : une feuille, chaînes en ligne (pas de table de
+# chaînes partagées à garder en mémoire), en-tête en gras et figé.
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+        '<sheets><sheet name="Inscriptions" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": (
+        f'<styleSheet xmlns="{_MAIN_NS}">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+_XML_INVALID_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def _xlsx_cell(value, style=""):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"<c{style}><v>{value}</v></c>"
+    text = _formula_safe(_XML_INVALID_RE.sub("", _cell_text(value)))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c t="inlineStr"{style}><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def iter_inscriptions_xlsx(rows, columns):
+    """
+    Classeur XLSX écrit au fil de la lecture (même principe que iter_badges_zip :
+    zipfile sur _ZipStream, feuille compressée au fil de l'eau). Mémoire
+    constante quel que soit le nombre de lignes.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_PARTS.items():
+            zf.writestr(name, _XML_HEAD + xml)
+        yield stream.pop()
+
+        with zf.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            header = "".join(_xlsx_cell(title, ' s="1"') for _, title, _ in columns)
+            sheet.write((
+                f'{_XML_HEAD}<worksheet xmlns="{_MAIN_NS}"><sheetViews><sheetView workbookViewId="0">'
+                '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                f'</sheetView></sheetViews><sheetData><row r="1">{header}</row>'
+            ).encode("utf-8"))
+            parts = []
+            number = 1
+            for row in rows:
+                number += 1
+                parts.append(f'<row r="{number}">{"".join(_xlsx_cell(value) for value in row)}</row>')
+                if len(parts) == EXPORT_ROWS_PER_CHUNK:
+                    sheet.write("".join(parts).encode("utf-8"))
+                    parts.clear()
+                    yield stream.pop()
+            parts.append("</sheetData></worksheet>")
+            sheet.write("".join(parts).encode("utf-8"))
+        yield stream.pop()
+    yield stream.pop()
+
+
+# ?type= -> (générateur, type MIME, extension)
+EXPORT_FORMATS = {
+    "csv": (iter_inscriptions_csv, "text/csv; charset=utf-8", "csv"),
+    "xlsx": (iter_inscriptions_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
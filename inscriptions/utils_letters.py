@@ -31,63 +31,294 @@
 #     return output_path
 
 # inscriptions/utils_letters.py
+import glob
+import hashlib
+import json
 import logging
 import os
 from django.conf import settings
-from django.template.loader import render_to_string
 
 logger = logging.getLogger(__name__)
 
-# Lazy import WeasyPrint so that manage.py doesn't fail on machines without system libs
-try:
-    from weasyprint import HTML  # type: ignore
-    WEASY_AVAILABLE = True
-except Exception as exc:
-    WEASY_AVAILABLE = False
-    logger.warning("WeasyPrint not available in this environment: %s. PDF generation will be skipped.", exc)
+from .pdf_workers import get_pdf_service, render_batch, render_in_process
+from .templating import render as render_template
+from .utils_letters_pydyf import can_encode, render_letter_pdf, render_letters_pdf
 
+_weasy_available = None
 
-def generate_invitation_letter_pdf(inscription, output_path=None, template_name="letters/invitation.html"):
+
+def weasy_available():
+    """
+    Lazy import WeasyPrint on first HTML render, so that manage.py (and the pydyf
+    backend) don't load it or fail on machines without its system libs.
+    """
+    global _weasy_available
+    if _weasy_available is None:
+        try:
+            import weasyprint  # type: ignore  # noqa: F401
+            _weasy_available = True
+        except Exception as exc:
+            _weasy_available = False
+            logger.warning("WeasyPrint not available in this environment: %s. PDF generation will be skipped.", exc)
+    return _weasy_available
+
+LETTERS_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "letters")
+DEFAULT_LETTER_TEMPLATE = "letters/invitation.html"
+DEFAULT_LETTER_BATCH_TEMPLATE = "letters/invitation_batch.html"
+
+# Feuilles de style passées à part à WeasyPrint (analysées une fois par processus)
+LETTER_STYLESHEETS = {
+    DEFAULT_LETTER_TEMPLATE: (os.path.join(LETTERS_TEMPLATE_DIR, "invitation.css"),),
+    DEFAULT_LETTER_BATCH_TEMPLATE: (os.path.join(LETTERS_TEMPLATE_DIR, "invitation.css"),),
+}
+
+
+def letter_context(inscription):
+    return {
+        "nom": getattr(inscription, "nom", ""),
+        "prenom": getattr(inscription, "prenom", ""),
+        "nationalite": getattr(inscription, "nationalite", ""),
+        "provenance": getattr(inscription, "provenance", ""),
+        "role": getattr(inscription, "type_profil", ""),
+    }
+
+
+def letter_output_path(inscription):
+    output_dir = os.path.join(settings.MEDIA_ROOT, "letters")
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"invitation_{inscription.id}.pdf")
+
+
+# ---------------------------------------------------------
+# Cache des lettres (clé = contexte du gabarit + sources du gabarit)
+# ---------------------------------------------------------
+# Tous les fichiers qui composent la lettre par défaut (seule ou en lot)
+LETTER_TEMPLATE_FILES = (
+    os.path.join(LETTERS_TEMPLATE_DIR, "invitation.html"),
+    os.path.join(LETTERS_TEMPLATE_DIR, "invitation_batch.html"),
+    os.path.join(LETTERS_TEMPLATE_DIR, "_invitation_body.html"),
+    os.path.join(LETTERS_TEMPLATE_DIR, "invitation.css"),
+)
+
+# Avec LETTER_PDF_BACKEND = "pydyf", la lettre est décrite dans utils_letters_pydyf
+LETTER_PYDYF_FILES = (os.path.join(os.path.dirname(__file__), "utils_letters_pydyf.py"),)
+
+_digests = {}
+
+
+def _file_digest(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _digests.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest())
+        _digests[path] = cached
+    return cached[1]
+
+
+def letter_backend(context=None):
+    """
+    Moteur de rendu de la lettre par défaut : "weasyprint" (HTML) ou "pydyf" (dessin direct).
+    Avec "pydyf", une lettre dont le contexte contient des caractères hors cp1252
+    (Ł, Ŋ, Ş, Ɗ...) passe par WeasyPrint, s'il est installé, pour ne pas les
+    remplacer par "?".
+    """
+    backend = getattr(settings, "LETTER_PDF_BACKEND", "weasyprint")
+    if backend == "pydyf" and context is not None and not can_encode(context) and weasy_available():
+        return "weasyprint"
+    return backend
+
+
+def letter_cache_key(inscription):
+    context = letter_context(inscription)
+    backend = letter_backend(context)
+    sources = LETTER_PYDYF_FILES if backend == "pydyf" else LETTER_TEMPLATE_FILES
+    payload = [
+        context,
+        backend,
+        [_file_digest(path) for path in sources],
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cached_letter_path(inscription, key=None):
+    key = key or letter_cache_key(inscription)
+    output_dir = os.path.join(settings.MEDIA_ROOT, "letters")
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"invitation_{inscription.id}_{key[:16]}.pdf")
+
+
+def _remove_letters(inscription, keep=None):
+    pattern = os.path.join(glob.escape(os.path.join(settings.MEDIA_ROOT, "letters")), f"invitation_{inscription.id}_*.pdf")
+    for path in glob.glob(pattern):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_or_generate_letter(inscription):
+    """
+    Return the path of the invitation PDF matching the current inscription data,
+    rendering it only when no cached artifact exists for its key (re-sends and
+    retries reuse the existing bytes). Returns None if the PDF cannot be generated.
+    """
+    path = cached_letter_path(inscription)
+    if os.path.exists(path):
+        return path
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if generate_invitation_letter_pdf(inscription, output_path=tmp_path) is None:
+        return None
+    os.replace(tmp_path, path)
+    _remove_letters(inscription, keep=path)
+    return path
+
+
+def invalidate_letter_cache(inscription):
+    """Drop every cached letter of this inscription (called when a letter field changes)."""
+    _remove_letters(inscription)
+    logger.info("Invitation PDF cache invalidated for inscription %s", getattr(inscription, "id", None))
+
+
+def generate_invitation_letter_pdf(inscription, output_path=None, template_name=DEFAULT_LETTER_TEMPLATE):
     """
     Generate invitation PDF for a given inscription.
     Returns:
       - path to saved PDF if output_path is provided,
       - bytes if output_path is None and PDF could be generated,
       - None if WeasyPrint is not available or generation failed.
+    With LETTER_PDF_BACKEND = "pydyf" the default template is drawn directly with
+    pydyf (no WeasyPrint), unless the inscription has characters outside cp1252;
+    custom templates always go through WeasyPrint.
     """
-    if not WEASY_AVAILABLE:
+    context = letter_context(inscription)
+    use_pydyf = template_name == DEFAULT_LETTER_TEMPLATE and letter_backend(context) == "pydyf"
+    if not use_pydyf and not weasy_available():
         logger.info("Skipping PDF generation for inscription %s: WeasyPrint not available.", getattr(inscription, "id", None))
         return None
 
     try:
         # prepare output directory if saving to disk
         if output_path is None:
-            output_dir = os.path.join(settings.MEDIA_ROOT, "letters")
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"invitation_{inscription.id}.pdf")
+            output_path = letter_output_path(inscription)
             save_to_disk = True
         else:
             save_to_disk = True
 
-        context = {
-            "nom": getattr(inscription, "nom", ""),
-            "prenom": getattr(inscription, "prenom", ""),
-            "nationalite": getattr(inscription, "nationalite", ""),
-            "provenance": getattr(inscription, "provenance", ""),
-            "role": getattr(inscription, "type_profil", ""),
-        }
+        if use_pydyf:
+            pdf_bytes = render_letter_pdf(context)
+            with open(output_path, "wb") as f:
+                f.write(pdf_bytes)
+            logger.info("Invitation PDF (pydyf) written to %s for inscription %s", output_path, getattr(inscription, "id", None))
+            return output_path
+
+        html_string = render_template(template_name, context)
+        stylesheets = LETTER_STYLESHEETS.get(template_name, ())
 
-        html_string = render_to_string(template_name, context)
+        # Workers WeasyPrint chauds si LETTER_PDF_WORKERS > 0, sinon rendu local
+        service = get_pdf_service()
+        if service is not None:
+            pdf_bytes = service.render(html_string, str(settings.BASE_DIR), stylesheets)
+            if pdf_bytes is None:
+                logger.warning("Invitation PDF not generated for inscription %s (render service failure).", getattr(inscription, "id", None))
+                return None
+        else:
+            pdf_bytes = render_in_process(html_string, str(settings.BASE_DIR), stylesheets)
 
-        html = HTML(string=html_string, base_url=str(settings.BASE_DIR))
         if save_to_disk:
-            html.write_pdf(target=output_path)
+            with open(output_path, "wb") as f:
+                f.write(pdf_bytes)
             logger.info("Invitation PDF written to %s for inscription %s", output_path, getattr(inscription, "id", None))
             return output_path
         else:
-            pdf_bytes = html.write_pdf()
             logger.info("Invitation PDF generated in-memory for inscription %s", getattr(inscription, "id", None))
             return pdf_bytes
     except Exception as exc:
         logger.exception("Error generating invitation PDF for inscription %s: %s", getattr(inscription, "id", None), exc)
         return None
+
+
+def generate_invitation_letters_pdf(inscriptions, combined=False, output_path=None,
+                                    template_name=DEFAULT_LETTER_BATCH_TEMPLATE, chunk_size=100):
+    """
+    Generate invitation letters for many inscriptions with one WeasyPrint layout
+    pass per chunk (fonts, CSS and layout setup paid once instead of N times).
+    Returns:
+      - combined=True: path of one printable PDF with every letter (single pass,
+        written to output_path or MEDIA_ROOT/letters/invitations_lot.pdf),
+      - combined=False: dict {inscription id: path of the cached letter}, the same
+        files as get_or_generate_letter (already cached letters are not re-rendered),
+      - None if WeasyPrint is not available or rendering failed.
+    With LETTER_PDF_BACKEND = "pydyf" the default batch template is drawn with pydyf
+    (letters with characters outside cp1252 still go through WeasyPrint).
+    """
+    use_pydyf = template_name == DEFAULT_LETTER_BATCH_TEMPLATE and letter_backend() == "pydyf"
+    if not use_pydyf and not weasy_available():
+        logger.info("Skipping batch PDF generation: WeasyPrint not available.")
+        return None
+
+    inscriptions = list(inscriptions)
+    stylesheets = LETTER_STYLESHEETS.get(template_name, ())
+    base_url = str(settings.BASE_DIR)
+
+    def render_html(contexts, combined):
+        html_string = render_template(template_name, {"letters": contexts})
+        anchors = [f"letter-{index}" for index in range(len(contexts))]
+        return render_batch(html_string, base_url, stylesheets, anchors, combined=combined)
+
+    def render(chunk, combined):
+        contexts = [letter_context(i) for i in chunk]
+        if not use_pydyf:
+            return render_html(contexts, combined)
+        # lettres aux caractères hors cp1252 : WeasyPrint, les autres restent en pydyf
+        html_contexts = [c for c in contexts if letter_backend(c) != "pydyf"]
+        if combined:
+            return render_html(contexts, True) if html_contexts else render_letters_pdf(contexts)
+        html_letters = render_html(html_contexts, False) if html_contexts else []
+        if html_letters is None:
+            return None
+        html_letters = iter(html_letters)
+        return [render_letter_pdf(c) if letter_backend(c) == "pydyf" else next(html_letters) for c in contexts]
+
+    try:
+        if combined:
+            pdf_bytes = render(inscriptions, True)
+            if pdf_bytes is None:
+                return None
+            if output_path is None:
+                output_dir = os.path.join(settings.MEDIA_ROOT, "letters")
+                os.makedirs(output_dir, exist_ok=True)
+                output_path = os.path.join(output_dir, "invitations_lot.pdf")
+            with open(output_path, "wb") as f:
+                f.write(pdf_bytes)
+            logger.info("Combined invitation PDF (%s letters) written to %s", len(inscriptions), output_path)
+            return output_path
+
+        paths = {}
+        missing = []
+        for inscription in inscriptions:
+            path = cached_letter_path(inscription)
+            if os.path.exists(path):
+                paths[inscription.id] = path
+            else:
+                missing.append((inscription, path))
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            letters = render([inscription for inscription, _ in chunk], False)
+            if letters is None:
+                return None
+            for (inscription, path), pdf_bytes in zip(chunk, letters):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(pdf_bytes)
+                os.replace(tmp_path, path)
+                _remove_letters(inscription, keep=path)
+                paths[inscription.id] = path
+        logger.info("Batch invitation PDFs generated for %s inscriptions", len(paths))
+        return paths
+    except Exception as exc:
+        logger.exception("Error generating batch invitation PDFs: %s", exc)
+        return None
@@ -0,0 +1,371 @@
+"""
+Rendu direct (pydyf) de la lettre d'invitation par défaut, sans WeasyPrint.
+
+La mise en page de letters/_invitation_body.html + invitation.css est reproduite
+ici à la main : mêmes marges, corps 13px / interligne 1.5, titre 20px, liste à
+puces, signature en gras. Les polices DejaVu du dossier static/fonts sont
+embarquées en TrueType simple (encodage WinAnsi), sous-ensemblées une seule fois
+par processus ; les largeurs de glyphes viennent de la table hmtx.
+
+Toute modification du gabarit HTML par défaut doit être reportée dans LETTER_BLOCKS.
+Les gabarits personnalisés passent toujours par WeasyPrint (utils_letters), comme
+les lettres dont le contexte contient des caractères hors cp1252 (can_encode).
+"""
+import io
+import os
+import threading
+import zlib
+
+import pydyf
+from django.conf import settings
+
+# ---------------------------------------------------------
+# Mise en page (points PDF, 1px CSS = 0.75pt)
+# ---------------------------------------------------------
+PX = 0.75
+PAGE_WIDTH = 595.28   # A4
+PAGE_HEIGHT = 841.89
+# marge @page (75px) + marge du body (8px) + padding de .letter (40px)
+MARGIN = (75 + 8 + 40) * PX
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+FONT_SIZE = 13 * PX
+LINE_HEIGHT = 1.5
+TITLE_SIZE = 20 * PX
+PARAGRAPH_SPACING = FONT_SIZE          # p { margin: 1em 0 }
+HEADER_SPACING = 30 * PX               # .header { margin-bottom: 30px }
+LIST_INDENT = 40 * PX                  # ul { padding-left: 40px }
+SIGNATURE_SPACING = 40 * PX            # .signature { margin-top: 40px }
+TEXT_GRAY = 0x22 / 255                 # color: #222
+ITALIC_SKEW = 0.2                      # pas de DejaVu Oblique embarquée : oblique synthétique
+
+FONT_FILES = {
+    "regular": ("F1", "DejaVuSans.ttf"),
+    "bold": ("F2", "DejaVuSans-Bold.ttf"),
+}
+# Codes WinAnsi (cp1252) embarqués : 32-126 et 128-255 hors codes non définis
+WINANSI_FIRST, WINANSI_LAST = 32, 255
+
+# ---------------------------------------------------------
+# Contenu de la lettre (miroir de letters/_invitation_body.html)
+# Chaque bloc : (type, runs) ; un run = (style, texte), style None = saut de ligne
+# ---------------------------------------------------------
+LETTER_TITLE = "Lettre d’Invitation – ECOFEST 2025"
+
+LETTER_BLOCKS = (
+    ("p", (("bold", "Objet : ECOFEST 2025 – Votre accréditation est confirmée !"),)),
+    ("p", (("regular", "Cher/Chère "), ("bold", "{prenom} {nom}"), ("regular", ","))),
+    ("p", (("regular",
+            "Toute l'équipe d'organisation d’ECOFEST vous remercie de votre inscription et a le plaisir "
+            "de vous confirmer votre accréditation pour la première édition du Festival Ouest-Africain "
+            "des Arts et de la Culture !"),)),
+    ("p", (("regular",
+            "Du 30 novembre au 6 décembre 2025, Dakar vibrera au rythme de la créativité ouest-africaine "
+            "sous le thème :"),
+           (None, ""),
+           ("italic", "« Mutations et crises politiques en Afrique de l'Ouest : Que peut faire la culture ? »"),
+           ("regular", "."))),
+    ("p", (("regular",
+            "Votre badge d’accréditation est joint à ce courrier. Nous vous invitons à conserver "
+            "précieusement cet e-mail de confirmation."),)),
+    ("p", (("regular",
+            "Dans les semaines à venir, vous recevrez plus d'informations sur le programme détaillé, "
+            "les horaires des spectacles et les modalités pratiques pour profiter pleinement de votre "
+            "expérience au festival."),)),
+    ("p", (("regular", "Pour ne rien manquer :"),)),
+    ("ul", (
+        ("regular", "Site Web : https://www.ecofest-arts-culture.com/"),
+        ("regular", "Facebook : https://www.facebook.com/share/19aLVRr17R/?mibextid=wwXIfr"),
+        ("regular", "Instagram : https://www.instagram.com/ecofest.arts.culture"),
+    )),
+    ("p", (("regular",
+            "Nous sommes impatients de vous accueillir à Dakar pour partager ensemble des moments "
+            "inoubliables de célébration culturelle."),)),
+    ("signature", (("bold", "Chaleureusement,"), (None, ""), ("bold", "L'équipe d'organisation d’ECOFEST 2025"))),
+)
+
+
+# ---------------------------------------------------------
+# Polices (chargées et sous-ensemblées une fois par processus)
+# ---------------------------------------------------------
+class _Font:
+    def __init__(self, name, path):
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+
+        font = TTFont(path)
+        scale = 1000 / font["head"].unitsPerEm
+        cmap = font.getBestCmap()
+        hmtx = font["hmtx"]
+
+        self.widths = [0] * 256
+        unicodes = []
+        for code in range(WINANSI_FIRST, WINANSI_LAST + 1):
+            try:
+                char = bytes([code]).decode("cp1252")
+            except UnicodeDecodeError:
+                continue
+            glyph = cmap.get(ord(char))
+            if glyph is not None:
+                self.widths[code] = round(hmtx[glyph][0] * scale)
+                unicodes.append(ord(char))
+
+        self.ascent = font["hhea"].ascent * scale / 1000
+        self.descent = -font["hhea"].descent * scale / 1000
+        head = font["head"]
+        self.bbox = [round(v * scale) for v in (head.xMin, head.yMin, head.xMax, head.yMax)]
+        self.cap_height = round(getattr(font["OS/2"], "sCapHeight", 0) * scale) or self.bbox[3]
+
+        options = subset.Options()
+        options.layout_features = []
+        options.name_IDs = [1, 2, 3, 4, 6]
+        options.notdef_outline = True
+        options.drop_tables += ["FFTM"]
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=unicodes)
+        subsetter.subset(font)
+        buffer = io.BytesIO()
+        font.save(buffer)
+        self.data = buffer.getvalue()
+        self.compressed = zlib.compress(self.data, 9)
+        # Préfixe de sous-ensemble (6 majuscules) exigé par la spec PDF
+        self.base_name = f"ECOFST+{name}"
+
+    def width(self, encoded, size):
+        return sum(self.widths[b] for b in encoded) * size / 1000
+
+
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+
+def get_fonts():
+    with _fonts_lock:
+        if not _fonts:
+            fonts_dir = os.path.join(settings.BASE_DIR, "static", "fonts")
+            for style, (key, filename) in FONT_FILES.items():
+                _fonts[style] = _Font(os.path.splitext(filename)[0], os.path.join(fonts_dir, filename))
+        return _fonts
+
+
+def encode(text):
+    """Texte -> octets WinAnsi (les caractères hors cp1252 deviennent '?')."""
+    return text.encode("cp1252", errors="replace")
+
+
+def can_encode(context):
+    """
+    Toutes les valeurs du contexte s'écrivent en WinAnsi. Sinon (Ł, Ŋ, Ş, Ɗ...)
+    la lettre doit passer par WeasyPrint, voir utils_letters.letter_backend().
+    """
+    try:
+        for value in _text_context(context).values():
+            value.encode("cp1252")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+# ---------------------------------------------------------
+# Composition des lignes
+# ---------------------------------------------------------
+def _words(runs, context):
+    """Runs -> mots (style, octets) ; None marque un saut de ligne forcé."""
+    for style, text in runs:
+        if style is None:
+            yield None
+            continue
+        text = text.format(**context)
+        # Les espaces en bord de run restent attachés aux mots voisins (« Cher/Chère Awa, »)
+        pieces = text.split(" ")
+        for index, piece in enumerate(pieces):
+            if piece:
+                yield style, encode(piece), index > 0, index < len(pieces) - 1
+
+
+def _font_style(style):
+    return "bold" if style == "bold" else "regular"
+
+
+def layout_lines(runs, context, fonts, size, max_width):
+    """
+    Coupe le paragraphe en lignes ; chaque ligne est une liste de segments
+    (style, octets, x). Un mot plus long que la ligne reste seul sur sa ligne.
+    """
+    lines, line, x = [], [], 0.0
+    space_before = False
+    for word in _words(runs, context):
+        if word is None:
+            lines.append(line)
+            line, x, space_before = [], 0.0, False
+            continue
+        style, encoded, leading_space, trailing_space = word
+        font = fonts[_font_style(style)]
+        gap = font.width(b" ", size) if line and (leading_space or space_before) else 0.0
+        width = font.width(encoded, size)
+        if line and x + gap + width > max_width:
+            lines.append(line)
+            line, x, gap = [], 0.0, 0.0
+        line.append((style, encoded, x + gap))
+        x += gap + width
+        space_before = trailing_space
+    if line:
+        lines.append(line)
+    return lines
+
+
+# ---------------------------------------------------------
+# Dessin
+# ---------------------------------------------------------
+class _Page:
+    def __init__(self, fonts):
+        self.fonts = fonts
+        self.content = pydyf.Stream(compress=True)
+        self.content.set_color_rgb(TEXT_GRAY, TEXT_GRAY, TEXT_GRAY)
+        self.cursor = MARGIN  # distance depuis le haut de la page
+
+    def fits(self, height):
+        return self.cursor + height <= PAGE_HEIGHT - MARGIN
+
+    def draw_line(self, segments, size, x0):
+        line_height = size * LINE_HEIGHT
+        regular = self.fonts["regular"]
+        # Ligne de base centrée dans la boîte de ligne comme en CSS (demi-interlignage)
+        baseline = self.cursor + (line_height - (regular.ascent + regular.descent) * size) / 2 + regular.ascent * size
+        y = PAGE_HEIGHT - baseline
+        content = self.content
+        content.begin_text()
+        for style, encoded, x in segments:
+            key = FONT_FILES[_font_style(style)][0]
+            content.set_font_size(key, size)
+            skew = ITALIC_SKEW if style == "italic" else 0
+            content.set_text_matrix(1, 0, skew, 1, x0 + x, y)
+            content.stream.append(pydyf.String(encoded).data + b" Tj")
+        content.end_text()
+        self.cursor += line_height
+
+
+class _LetterWriter:
+    """Accumule les pages d'une ou plusieurs lettres dans un même pydyf.PDF."""
+
+    def __init__(self):
+        self.fonts = get_fonts()
+        self.pdf = pydyf.PDF()
+        self.font_refs = pydyf.Dictionary()
+        for style, (key, _) in FONT_FILES.items():
+            self.font_refs[key] = self._embed_font(self.fonts[style])
+        self.page = None
+
+    def _embed_font(self, font):
+        pdf = self.pdf
+        # Flux déjà compressé une fois pour toutes (pas de zlib à chaque document)
+        file_stream = pydyf.Stream([font.compressed], {"Filter": "/FlateDecode", "Length1": len(font.data)})
+        pdf.add_object(file_stream)
+        descriptor = pydyf.Dictionary({
+            "Type": "/FontDescriptor",
+            "FontName": "/" + font.base_name,
+            "Flags": 32,
+            "FontBBox": pydyf.Array(font.bbox),
+            "ItalicAngle": 0,
+            "Ascent": round(font.ascent * 1000),
+            "Descent": -round(font.descent * 1000),
+            "CapHeight": font.cap_height,
+            "StemV": 80,
+            "FontFile2": file_stream.reference,
+        })
+        pdf.add_object(descriptor)
+        font_dict = pydyf.Dictionary({
+            "Type": "/Font",
+            "Subtype": "/TrueType",
+            "BaseFont": "/" + font.base_name,
+            "FirstChar": WINANSI_FIRST,
+            "LastChar": WINANSI_LAST,
+            "Widths": pydyf.Array(font.widths[WINANSI_FIRST:WINANSI_LAST + 1]),
+            "FontDescriptor": descriptor.reference,
+            "Encoding": "/WinAnsiEncoding",
+        })
+        pdf.add_object(font_dict)
+        return font_dict.reference
+
+    def new_page(self):
+        self._finish_page()
+        self.page = _Page(self.fonts)
+
+    def _finish_page(self):
+        if self.page is None:
+            return
+        self.pdf.add_object(self.page.content)
+        self.pdf.add_page(pydyf.Dictionary({
+            "Type": "/Page",
+            "Parent": self.pdf.pages.reference,
+            "MediaBox": pydyf.Array([0, 0, PAGE_WIDTH, PAGE_HEIGHT]),
+            "Contents": self.page.content.reference,
+            "Resources": pydyf.Dictionary({"Font": self.font_refs}),
+        }))
+        self.page = None
+
+    def space(self, height):
+        self.page.cursor += height
+
+    def lines(self, lines, size, x0=MARGIN):
+        for segments in lines:
+            if not self.page.fits(size * LINE_HEIGHT):
+                self.new_page()
+            self.page.draw_line(segments, size, x0)
+
+    def title(self, text):
+        font = self.fonts["bold"]
+        encoded = encode(text)
+        x = (CONTENT_WIDTH - font.width(encoded, TITLE_SIZE)) / 2
+        self.space(0.67 * TITLE_SIZE)
+        self.lines([[("bold", encoded, x)]], TITLE_SIZE)
+        # marge basse du h1 fusionnée avec celle de .header
+        self.space(max(0.67 * TITLE_SIZE, HEADER_SPACING))
+
+    def letter(self, context):
+        self.new_page()
+        self.title(LETTER_TITLE)
+        fonts = self.fonts
+        previous_margin = HEADER_SPACING
+        for kind, runs in LETTER_BLOCKS:
+            margin = SIGNATURE_SPACING if kind == "signature" else PARAGRAPH_SPACING
+            # marges verticales fusionnées (la plus grande des deux l'emporte)
+            self.space(max(0.0, margin - previous_margin))
+            if kind == "ul":
+                bullet = encode("•")
+                for run in runs:
+                    lines = layout_lines((run,), context, fonts, FONT_SIZE, CONTENT_WIDTH - LIST_INDENT)
+                    bullet_x = -fonts["regular"].width(bullet + b"  ", FONT_SIZE)
+                    lines[0].insert(0, ("regular", bullet, bullet_x))
+                    self.lines(lines, FONT_SIZE, MARGIN + LIST_INDENT)
+            else:
+                if kind == "signature":
+                    runs = tuple((style and "bold", text) for style, text in runs)
+                self.lines(layout_lines(runs, context, fonts, FONT_SIZE, CONTENT_WIDTH), FONT_SIZE)
+            self.space(margin)
+            previous_margin = margin
+
+    def write(self):
+        self._finish_page()
+        output = io.BytesIO()
+        self.pdf.write(output, version=b"1.7", compress=False)
+        return output.getvalue()
+
+
+def _text_context(context):
+    return {key: "" if value is None else str(value) for key, value in context.items()}
+
+
+def render_letter_pdf(context):
+    """Octets du PDF d'une lettre (context = utils_letters.letter_context)."""
+    writer = _LetterWriter()
+    writer.letter(_text_context(context))
+    return writer.write()
+
+
+def render_letters_pdf(contexts):
+    """Un seul PDF imprimable : chaque lettre commence sur une nouvelle page."""
+    writer = _LetterWriter()
+    for context in contexts:
+        writer.letter(_text_context(context))
+    return writer.write()
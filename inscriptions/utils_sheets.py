@@ -0,0 +1,238 @@
+"""
+Planches de badges N-up (A4/A3, traits de coupe) pour l'imprimeur.
+
+Le PDF est écrit au fil de l'eau : chaque page (images + contenu) est sérialisée
+avec les objets pydyf puis émise immédiatement ; seuls les numéros d'objets et
+leurs positions sont gardés pour la table xref finale. Une série de 5 000 badges
+n'a donc jamais plus d'une page en mémoire.
+"""
+import io
+import zlib
+
+import pydyf
+from PIL import Image
+
+from .utils_badges import get_or_generate_badge
+from .utils_export import find_badge_file
+
+MM = 72 / 25.4  # points PDF par millimètre
+
+PAGE_SIZES_MM = {
+    "A4": (210, 297),
+    "A3": (297, 420),
+}
+
+# Ratio des fonds de badge (1120 x 1600 px)
+BADGE_ASPECT = 1600 / 1120
+
+
+class SheetLayout:
+    """
+    Paramètres d'imposition d'un travail d'impression.
+    cols / rows sont calculés pour remplir la page s'ils ne sont pas fournis ;
+    la grille est centrée sur la page.
+    """
+
+    def __init__(self, page_size="A4", landscape=False, badge_width_mm=95, badge_height_mm=None,
+                 cols=None, rows=None, margin_mm=5, gutter_mm=4, crop_marks=True,
+                 crop_mark_length_mm=3, crop_mark_offset_mm=1, jpeg_quality=92):
+        if isinstance(page_size, str):
+            if page_size.upper() not in PAGE_SIZES_MM:
+                raise ValueError(f"Format de page inconnu : {page_size}")
+            page_size = PAGE_SIZES_MM[page_size.upper()]
+        width, height = page_size
+        if landscape:
+            width, height = height, width
+
+        self.page_width_mm = width
+        self.page_height_mm = height
+        self.badge_width_mm = badge_width_mm
+        self.badge_height_mm = badge_height_mm or round(badge_width_mm * BADGE_ASPECT, 2)
+        self.margin_mm = margin_mm
+        self.gutter_mm = gutter_mm
+        self.crop_marks = crop_marks
+        self.crop_mark_length_mm = crop_mark_length_mm
+        self.crop_mark_offset_mm = crop_mark_offset_mm
+        # None -> images sans perte (FlateDecode), sinon JPEG (DCTDecode)
+        self.jpeg_quality = jpeg_quality
+
+        usable_w = width - 2 * margin_mm + gutter_mm
+        usable_h = height - 2 * margin_mm + gutter_mm
+        self.cols = cols or int(usable_w // (self.badge_width_mm + gutter_mm))
+        self.rows = rows or int(usable_h // (self.badge_height_mm + gutter_mm))
+        if self.cols < 1 or self.rows < 1:
+            raise ValueError("Le badge ne tient pas sur la page avec ces marges.")
+
+        grid_w = self.cols * self.badge_width_mm + (self.cols - 1) * gutter_mm
+        grid_h = self.rows * self.badge_height_mm + (self.rows - 1) * gutter_mm
+        if grid_w > width or grid_h > height:
+            raise ValueError("La grille demandée dépasse la page.")
+        self.origin_x_mm = (width - grid_w) / 2
+        self.origin_y_mm = (height - grid_h) / 2
+
+    @property
+    def per_page(self):
+        return self.cols * self.rows
+
+    def slot(self, index):
+        """Coin bas-gauche (en points) de la case `index`, remplie de gauche à droite puis de haut en bas."""
+        col = index % self.cols
+        row = index // self.cols
+        x = self.origin_x_mm + col * (self.badge_width_mm + self.gutter_mm)
+        top = self.origin_y_mm + row * (self.badge_height_mm + self.gutter_mm)
+        y = self.page_height_mm - top - self.badge_height_mm
+        return x * MM, y * MM
+
+    def cut_lines(self):
+        """Positions (en points) des coupes verticales et horizontales de la grille."""
+        xs, ys = [], []
+        for col in range(self.cols):
+            x = self.origin_x_mm + col * (self.badge_width_mm + self.gutter_mm)
+            xs += [x * MM, (x + self.badge_width_mm) * MM]
+        for row in range(self.rows):
+            top = self.origin_y_mm + row * (self.badge_height_mm + self.gutter_mm)
+            y = self.page_height_mm - top
+            ys += [y * MM, (y - self.badge_height_mm) * MM]
+        return sorted(set(xs)), sorted(set(ys))
+
+
+class _StreamingPDFWriter:
+    """Numérote les objets pydyf et les sérialise un par un, en notant leur position."""
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.next_number = 1
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def _emit(self, data):
+        self.position += len(data)
+        return data
+
+    def header(self):
+        return self._emit(b"%PDF-1.7\n%\xf0\x9f\x96\xa4\n")
+
+    def write(self, obj, number=None):
+        obj.number = number or self.reserve()
+        self.offsets[obj.number] = self.position
+        return self._emit(obj.indirect + b"\n")
+
+    def trailer(self, root):
+        xref_position = self.position
+        lines = [b"xref", f"0 {self.next_number}".encode(), b"0000000000 65535 f "]
+        for number in range(1, self.next_number):
+            lines.append(f"{self.offsets[number]:010d} 00000 n ".encode())
+        trailer = pydyf.Dictionary({"Size": self.next_number, "Root": root.reference})
+        lines += [b"trailer", trailer.data, b"startxref", str(xref_position).encode(), b"%%EOF"]
+        return self._emit(b"\n".join(lines) + b"\n")
+
+
+def _image_xobject(path, layout):
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        width, height = img.size
+        if layout.jpeg_quality:
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=layout.jpeg_quality)
+            data, filter_ = buffer.getvalue(), "/DCTDecode"
+        else:
+            data, filter_ = zlib.compress(img.tobytes(), 6), "/FlateDecode"
+    return pydyf.Stream([data], {
+        "Type": "/XObject",
+        "Subtype": "/Image",
+        "Width": width,
+        "Height": height,
+        "ColorSpace": "/DeviceRGB",
+        "BitsPerComponent": 8,
+        "Filter": filter_,
+    })
+
+
+def _crop_marks(content, layout):
+    xs, ys = layout.cut_lines()
+    offset = layout.crop_mark_offset_mm * MM
+    length = layout.crop_mark_length_mm * MM
+    top = layout.page_height_mm * MM - layout.origin_y_mm * MM
+    bottom = layout.origin_y_mm * MM
+    left = layout.origin_x_mm * MM
+    right = layout.page_width_mm * MM - layout.origin_x_mm * MM
+
+    content.set_line_width(0.25)
+    for x in xs:
+        content.move_to(x, top + offset)
+        content.line_to(x, top + offset + length)
+        content.move_to(x, bottom - offset)
+        content.line_to(x, bottom - offset - length)
+    for y in ys:
+        content.move_to(left - offset, y)
+        content.line_to(left - offset - length, y)
+        content.move_to(right + offset, y)
+        content.line_to(right + offset + length, y)
+    content.stroke()
+
+
+def iter_badge_sheets_pdf(inscriptions, layout=None, render_missing=True):
+    """
+    Génère le PDF des planches, morceau par morceau (bytes).
+    inscriptions : itérable (idéalement queryset.iterator()).
+    render_missing : rendre les badges absents du cache ; sinon ils sont ignorés.
+    """
+    layout = layout or SheetLayout()
+    writer = _StreamingPDFWriter()
+    pages_number = writer.reserve()
+    kids = []
+
+    yield writer.header()
+
+    def flush(paths):
+        images = []
+        for path in paths:
+            image = _image_xobject(path, layout)
+            chunk = writer.write(image)
+            images.append(image)
+            yield chunk
+
+        content = pydyf.Stream(compress=True)
+        for index, image in enumerate(images):
+            x, y = layout.slot(index)
+            content.push_state()
+            content.transform(layout.badge_width_mm * MM, 0, 0, layout.badge_height_mm * MM, x, y)
+            content.draw_x_object(f"Im{index}")
+            content.pop_state()
+        if layout.crop_marks:
+            _crop_marks(content, layout)
+        yield writer.write(content)
+
+        page = pydyf.Dictionary({
+            "Type": "/Page",
+            "Parent": f"{pages_number} 0 R",
+            "MediaBox": pydyf.Array([0, 0, layout.page_width_mm * MM, layout.page_height_mm * MM]),
+            "Contents": content.reference,
+            "Resources": pydyf.Dictionary({
+                "XObject": pydyf.Dictionary({f"Im{i}": image.reference for i, image in enumerate(images)}),
+            }),
+        })
+        yield writer.write(page)
+        kids.append(page.reference)
+
+    batch = []
+    for inscription in inscriptions:
+        path = get_or_generate_badge(inscription) if render_missing else find_badge_file(inscription)
+        if not path:
+            continue
+        batch.append(path)
+        if len(batch) == layout.per_page:
+            yield from flush(batch)
+            batch = []
+    if batch or not kids:
+        yield from flush(batch)
+
+    pages = pydyf.Dictionary({"Type": "/Pages", "Kids": pydyf.Array(kids), "Count": len(kids)})
+    yield writer.write(pages, number=pages_number)
+    catalog = pydyf.Dictionary({"Type": "/Catalog", "Pages": pages.reference})
+    yield writer.write(catalog)
+    yield writer.trailer(catalog)
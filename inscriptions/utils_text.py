@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+
+# ---------------------------------------------------------
+#  MESURE DU TEXTE (avances mémorisées par police)
+# ---------------------------------------------------------
+@lru_cache(maxsize=8192)
+def text_advance(font, text):
+    """
+    Avance horizontale de `text` pour cette police, mémorisée.
+    Les polices venant du registre de gabarits sont partagées : le cache
+    profite donc à tous les badges rendus par le worker.
+    """
+    return font.getlength(text)
+
+
+def exact_width(font, text, draw=None):
+    """Largeur réelle (boîte englobante), identique à la mesure historique."""
+    if draw is not None:
+        bbox = draw.textbbox((0, 0), text, font=font)
+    else:
+        bbox = font.getbbox(text)
+    return bbox[2] - bbox[0]
+
+
+def _fits(font, words, start, end, estimate, max_width_px, draw):
+    """
+    words[start:end] tient-il dans max_width_px ? `estimate` est la somme des avances.
+    La boîte englobante réelle ne diffère de cette estimation que par les
+    approches du premier et du dernier glyphe (< 1 em) : on ne mesure donc
+    exactement que les lignes proches de la limite.
+    """
+    margin = getattr(font, "size", 0) or max_width_px
+    if estimate + margin <= max_width_px:
+        return True
+    if estimate - margin > max_width_px:
+        return False
+    return exact_width(font, " ".join(words[start:end]), draw) <= max_width_px
+
+
+def wrap_words(text, font, max_width_px, max_lines=2, draw=None):
+    """
+    Découpe glouton en une seule passe : chaque ligne prend des mots tant que
+    la largeur reste <= max_width_px, la dernière ligne reçoit le reste.
+    Un mot qui ne tient pas termine la ligne courante (même vide), comme
+    le découpage historique des badges.
+    """
+    words = (text or "").split()
+    space = text_advance(font, " ")
+    lines = []
+    pos = 0
+    while pos < len(words) and len(lines) < max_lines - 1:
+        end = pos
+        estimate = -space
+        # la largeur est croissante : on s'arrête au premier mot qui déborde
+        while end < len(words):
+            candidate = estimate + space + text_advance(font, words[end])
+            if not _fits(font, words, pos, end + 1, candidate, max_width_px, draw):
+                break
+            estimate = candidate
+            end += 1
+        lines.append(" ".join(words[pos:end]))
+        pos = end
+    if pos < len(words):
+        lines.append(" ".join(words[pos:]))
+    while len(lines) > 1 and not lines[-1]:
+        lines.pop()
+    return lines or [""]
+
+
+def fit_lines(text, font_for_size, size, max_width_px, max_lines=2, min_size=None, step=2, draw=None):
+    """
+    Mise en page sur au plus `max_lines` lignes, en réduisant la taille de
+    police (de `step` en `step`, jusqu'à `min_size`) tant qu'une ligne déborde.
+    font_for_size(size) doit retourner la police (idéalement depuis un cache).
+    Retourne (lignes, police).
+    """
+    min_size = min_size or size
+    while True:
+        font = font_for_size(size)
+        lines = wrap_words(text, font, max_width_px, max_lines=max_lines, draw=draw)
+        if size - step < min_size or all(
+            exact_width(font, line, draw) <= max_width_px for line in lines if line
+        ):
+            return lines, font
+        size -= step
@@ -1,17 +1,20 @@
+import logging
 import os
-import zipfile
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAdminUser, AllowAny, IsAuthenticated
 from rest_framework.generics import ListAPIView
-from django.http import Http404, HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
 
-from .models import Inscription, Participant, Badge, Evenement
+from .models import Inscription, Participant, Badge, Evenement, AccreditationBatch, AccreditationJob
 from .serializers import (
     InscriptionSerializer,
     RegisterSerializer,
@@ -20,11 +23,22 @@ from .serializers import (
     BadgeSerializer,
     EvenementSerializer,
     PublicInscriptionSerializer,
+    AccreditationBatchSerializer,
+    AccreditationJobSerializer,
+    BulkActionSerializer,
 )
-from .tasks import send_confirmation_email, send_invitation_package
-from .utils_badges import generate_badge
+from .bulk_actions import apply_bulk_action, batch_progress, select_inscriptions
+from .filters import filter_inscriptions, ordering_for
+from .outbox import outbox_metrics, queue_email
+from .pagination import KeysetPagination
+from .search import search_inscriptions
+from .tasks import enqueue, send_confirmation_email, send_invitation_package
+from .utils_badges import BULK_FIELDS, generate_badge_preview, get_or_generate_badge, preview_width
+from .utils_export import EXPORT_FORMATS, export_columns, export_rows, iter_badges_zip
+from .utils_sheets import SheetLayout, iter_badge_sheets_pdf
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 from rest_framework.exceptions import ValidationError
 
@@ -48,10 +62,71 @@ class InscriptionPublicViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)     
 
 
-class InscriptionViewSet(viewsets.ModelViewSet):
-    queryset = Inscription.objects.all().order_by('-created_at')
+class SparseFieldsetsViewMixin:
+    """
+    ?fields=id,nom,statut sur les lectures : seuls ces champs sont sérialisés et
+    seules les colonnes correspondantes sont lues (only()). Les champs de la clé
+    de pagination sont toujours lus.
+    """
+    fields_query_param = "fields"
+
+    def get_requested_fields(self):
+        if self.request is None or self.request.method != "GET":
+            return None
+        value = self.request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        fields = [name.strip() for name in value.split(",") if name.strip()]
+        allowed = self.get_serializer_class().Meta.fields
+        unknown = [name for name in fields if name not in allowed]
+        if unknown or not fields:
+            raise ValidationError({self.fields_query_param: f"Champs inconnus : {', '.join(unknown)}." if unknown
+                                   else "Aucun champ demandé."})
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        model_fields = {f.name for f in queryset.model._meta.concrete_fields}
+        columns = {name for name in fields if name in model_fields}
+        paginator = self.paginator
+        if isinstance(paginator, KeysetPagination):
+            columns.update(paginator.key_fields(paginator.get_ordering(self)))
+        columns.add("id")
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class InscriptionListFilterMixin:
+    """
+    Filtres côté serveur (filters.filter_inscriptions : evenement, type_profil,
+    statut, nationalite, date_from, date_to) et ?ordering= (filters.ORDERINGS)
+    sur les listes ; appuyés sur les index composites de Inscription.
+    """
+
+    def get_ordering(self):
+        return ordering_for(self.request.query_params)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # get_object() passe aussi par ici : filtres réservés à la liste
+        if getattr(self, "action", "list") == "list":
+            queryset = filter_inscriptions(queryset, self.request.query_params)
+        return queryset
+
+
+class InscriptionViewSet(InscriptionListFilterMixin, SparseFieldsetsViewMixin, viewsets.ModelViewSet):
+    queryset = Inscription.objects.all().order_by('-created_at', '-id')
     serializer_class = InscriptionSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = KeysetPagination
 
     def create(self, request, *args, **kwargs):
         email = request.data.get("email")
@@ -70,43 +145,107 @@ class InscriptionViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
 
-class AdminInscriptionListView(ListAPIView):
-    queryset = Inscription.objects.all().order_by('-created_at')
+class AdminInscriptionListView(InscriptionListFilterMixin, SparseFieldsetsViewMixin, ListAPIView):
+    queryset = Inscription.objects.all().order_by('-created_at', '-id')
     serializer_class = InscriptionSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = KeysetPagination
+
+
+class InscriptionSearchView(SparseFieldsetsViewMixin, ListAPIView):
+    """
+    Recherche back-office : ?q= (nom, prénom, email, téléphone ou provenance ;
+    partielle, sans accents), ?limit= (20 par défaut, 100 max), ?fields= comme
+    la liste. Résultats classés par pertinence (voir search.py), avec leur score.
+    """
+    queryset = Inscription.objects.all()
+    serializer_class = InscriptionSerializer
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "Recherche vide."})
+        limit = request.query_params.get("limit") or "20"
+        if not limit.isdecimal():
+            raise ValidationError({"limit": "Nombre attendu."})
+
+        results = search_inscriptions(query, int(limit), queryset=self.get_queryset())
+        data = self.get_serializer(results, many=True).data
+        for row, inscription in zip(data, results):
+            row["rank"] = round(inscription.search_rank, 4) if inscription.search_rank is not None else None
+        return Response({"query": query, "count": len(results), "results": data})
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def validate_inscription(request, pk):
+    """
+    Valide l'inscription et met en file le package d'accréditation (badge + lettre + email).
+    Répond 202 tout de suite ; l'avancement se lit sur admin/jobs/<job_id>/.
+    """
     inscription = get_object_or_404(Inscription, pk=pk)
 
-    inscription.statut = "Validé"
-    inscription.save(update_fields=["statut"])
+    with transaction.atomic():
+        inscription.statut = "Validé"
+        inscription.save(update_fields=["statut"])
+        job = AccreditationJob.objects.create(inscription=inscription, kind="invitation_package")
+        # Email écrit dans l'outbox avec le changement de statut : jamais perdu, même si l'envoi échoue
+        queue_email("invitation_package", inscription.email, inscription=inscription, job=job)
+        # La tâche ne part qu'une fois le statut et le job enregistrés
+        transaction.on_commit(
+            lambda: enqueue(send_invitation_package, inscription.id, str(job.id), job_id=job.id)
+        )
 
-    # LOG 100% FORCE
-    print("---- VALIDATE INSCRIPTION START ----")
-    print("Inscription ID:", inscription.id)
-    print("Email to send:", inscription.email)
-    print("SendGrid Key Loaded:", settings.SENDGRID_API_KEY[:10] + "...")
-    print("------------------------------------")
+    logger.info("Inscription %s validated, accreditation job %s queued", inscription.id, job.id)
+    return Response(
+        {"message": "OK", "job_id": str(job.id), "status_url": reverse("accreditation-job-status", args=[job.id])},
+        status=status.HTTP_202_ACCEPTED,
+    )
 
-    try:
-        send_invitation_package(inscription.id)
-        print("SEND INVITATION PACKAGE: SUCCESS")
-    except Exception as e:
-        import traceback
-        print("SEND INVITE ERROR:", str(e))
-        traceback.print_exc()
 
-        return Response(
-            {"error": str(e)},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def accreditation_job_status(request, job_id):
+    job = get_object_or_404(AccreditationJob, pk=job_id)
+    return Response(AccreditationJobSerializer(job).data)
 
-    print("---- VALIDATE INSCRIPTION END ----")
 
-    return Response({"message": "OK"}, status=200)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def bulk_inscriptions_action(request):
+    """
+    Valide ou refuse un lot d'inscriptions ({"action", "ids"} et/ou {"filters"}).
+    Statut mis à jour en un seul UPDATE ; une validation met en file un seul job
+    pour tout le lot (202, avancement par inscription sur admin/batches/<batch_id>/).
+    """
+    serializer = BulkActionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    queryset = select_inscriptions(ids=data.get("ids"), filters=data.get("filters"))
+    max_items = getattr(settings, "BULK_ACTION_MAX_ITEMS", 2000)
+    count = queryset.count()
+    if count > max_items:
+        raise ValidationError({"detail": f"{count} inscriptions sélectionnées, {max_items} au maximum par lot."})
+
+    batch, updated, unchanged = apply_bulk_action(data["action"], queryset, user=request.user)
+    body = {"action": data["action"], "updated": updated, "unchanged": unchanged}
+    if batch is None:
+        return Response(body)
+    body.update({
+        "batch_id": str(batch.id),
+        "status_url": reverse("accreditation-batch-status", args=[batch.id]),
+    })
+    return Response(body, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def accreditation_batch_status(request, batch_id):
+    batch = get_object_or_404(AccreditationBatch, pk=batch_id)
+    return Response({**AccreditationBatchSerializer(batch).data, **batch_progress(batch)})
 
 
 # @api_view(["POST"])
@@ -190,6 +329,12 @@ def validate_inscription(request, pk):
 
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_outbox_metrics(request):
+    return Response(outbox_metrics())
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def refuse_inscription(request, pk):
@@ -206,7 +351,8 @@ def get_badge_url(request, pk):
     participant = inscription.participant  # 🔥 correction
 
     try:
-        badge_path = generate_badge(inscription)
+        # re-rendu uniquement si un champ affiché ou le gabarit a changé
+        badge_path = get_or_generate_badge(inscription)
     except Exception as e:
         return Response(
             {"error": f"Erreur badge : {str(e)}"},
@@ -219,6 +365,34 @@ def get_badge_url(request, pk):
     return Response({"badge_url": badge_url})
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_badge_preview(request, pk):
+    """
+    Vignette du badge pour le back-office (WebP par défaut, ?image_format=jpeg possible),
+    rendue en mémoire à basse résolution. ?width= arrondi au palier supérieur
+    de BADGE_PREVIEW_WIDTHS (240, 360, 480 ou 720 px).
+    """
+    inscription = get_object_or_404(Inscription, pk=pk)
+    try:
+        width = preview_width(int(request.query_params.get("width", settings.BADGE_PREVIEW_WIDTH)))
+    except ValueError:
+        raise ValidationError({"width": "Largeur invalide."})
+    image_format = "JPEG" if request.query_params.get("image_format", "").lower() in ("jpg", "jpeg") else "WEBP"
+
+    try:
+        data, content_type = generate_badge_preview(inscription, width=width, image_format=image_format)
+    except Exception as e:
+        return Response(
+            {"error": f"Erreur aperçu badge : {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    resp = HttpResponse(data, content_type=content_type)
+    resp["Cache-Control"] = "private, max-age=60"
+    return resp
+
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsAdminUser])
@@ -255,20 +429,73 @@ def get_pieces_urls(request, pk):
 
 @staff_member_required
 def download_badges_zip(request):
-    badges_dir = os.path.join(settings.MEDIA_ROOT, "badges")
-    if not os.path.isdir(badges_dir):
-        raise Http404("Badges directory not found.")
-
-    # create an in-memory zip? For simplicity we write a temp file in MEDIA_ROOT
-    zip_path = os.path.join(settings.MEDIA_ROOT, "badges_export.zip")
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for root, dirs, files in os.walk(badges_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, badges_dir)
-                zf.write(file_path, arcname)
-
-    with open(zip_path, "rb") as f:
-        resp = HttpResponse(f.read(), content_type="application/zip")
-        resp["Content-Disposition"] = 'attachment; filename="badges_ecofest.zip"'
-        return resp
\ No newline at end of file
+    """
+    Archive ZIP des badges générés, envoyée en streaming (pas de fichier temporaire).
+    Filtres GET optionnels : evenement, type_profil, statut, date_from, date_to.
+    """
+    try:
+        qs = filter_inscriptions(Inscription.objects.all(), request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+
+    inscriptions = qs.order_by("id").only(*BULK_FIELDS).iterator(chunk_size=500)
+    resp = StreamingHttpResponse(iter_badges_zip(inscriptions), content_type="application/zip")
+    resp["Content-Disposition"] = 'attachment; filename="badges_ecofest.zip"'
+    return resp
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def export_inscriptions(request):
+    """
+    Export tableur des inscriptions, envoyé au fil de la lecture : ?type=csv
+    (défaut) ou xlsx. Mêmes filtres et ?ordering= que la liste back-office ;
+    ?fields= choisit les colonnes (voir utils_export.EXPORT_COLUMNS).
+    """
+    export_type = request.query_params.get("type") or "csv"
+    if export_type not in EXPORT_FORMATS:
+        raise ValidationError({"type": f"Format inconnu (valeurs possibles : {', '.join(EXPORT_FORMATS)})."})
+    fields = [name.strip() for name in request.query_params.get("fields", "").split(",") if name.strip()]
+    try:
+        columns = export_columns(fields)
+    except ValueError as exc:
+        raise ValidationError({"fields": str(exc)})
+
+    # filtres validés ici : une erreur donne un 400, pas un fichier tronqué
+    queryset = filter_inscriptions(Inscription.objects.all(), request.query_params)
+    queryset = queryset.order_by(*ordering_for(request.query_params))
+
+    writer, content_type, extension = EXPORT_FORMATS[export_type]
+    resp = StreamingHttpResponse(writer(export_rows(queryset, columns), columns), content_type=content_type)
+    resp["Content-Disposition"] = (
+        f'attachment; filename="inscriptions_ecofest_{timezone.localdate():%Y%m%d}.{extension}"'
+    )
+    return resp
+
+
+@staff_member_required
+def download_badge_sheets(request):
+    """
+    Planches PDF N-up des badges déjà générés, en streaming.
+    Filtres GET : ceux de download_badges_zip + page_size (A4/A3), landscape, cols, rows.
+    """
+    try:
+        qs = filter_inscriptions(Inscription.objects.all(), request.GET)
+        layout = SheetLayout(
+            page_size=request.GET.get("page_size", "A4"),
+            landscape=request.GET.get("landscape") in ("1", "true"),
+            cols=int(request.GET["cols"]) if request.GET.get("cols") else None,
+            rows=int(request.GET["rows"]) if request.GET.get("rows") else None,
+        )
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    inscriptions = qs.order_by("id").only(*BULK_FIELDS).iterator(chunk_size=200)
+    resp = StreamingHttpResponse(
+        iter_badge_sheets_pdf(inscriptions, layout, render_missing=False),
+        content_type="application/pdf",
+    )
+    resp["Content-Disposition"] = 'attachment; filename="planches_badges_ecofest.pdf"'
+    return resp